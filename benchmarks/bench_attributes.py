@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+'''Compares the table driven attribute decoder against the original if/elif
+chain, on a document made of attribute heavy objects.'''
+
+import sys
+import time
+from xml.etree import ElementTree
+
+import site
+site.addsitedir('src')
+from dia_parser import NS, attributes
+
+OBJECT = '''
+<dia:object type="Flowchart - Box" version="0" id="O{n}">
+  <dia:attribute name="obj_pos"><dia:point val="{n}.5,2.25"/></dia:attribute>
+  <dia:attribute name="obj_bb"><dia:rectangle val="1.5,2.5;{n}.5,4.5"/></dia:attribute>
+  <dia:attribute name="elem_width"><dia:real val="4.2"/></dia:attribute>
+  <dia:attribute name="elem_height"><dia:real val="2.1"/></dia:attribute>
+  <dia:attribute name="show_background"><dia:boolean val="true"/></dia:attribute>
+  <dia:attribute name="line_style"><dia:enum val="0"/></dia:attribute>
+  <dia:attribute name="border_color"><dia:color val="#000000ff"/></dia:attribute>
+  <dia:attribute name="inner_color"><dia:color val="#ffffffff"/></dia:attribute>
+  <dia:attribute name="numcp"><dia:int val="1"/></dia:attribute>
+  <dia:attribute name="text">
+    <dia:composite type="text">
+      <dia:attribute name="string"><dia:string>#Box {n}#</dia:string></dia:attribute>
+      <dia:attribute name="font"><dia:font family="sans" style="0" name="Helvetica"/></dia:attribute>
+      <dia:attribute name="height"><dia:real val="0.8"/></dia:attribute>
+      <dia:attribute name="pos"><dia:point val="{n}.5,3.1"/></dia:attribute>
+      <dia:attribute name="color"><dia:color val="#000000ff"/></dia:attribute>
+      <dia:attribute name="alignment"><dia:enum val="1"/></dia:attribute>
+    </dia:composite>
+  </dia:attribute>
+</dia:object>
+'''
+
+def build_document(count):
+    return '<dia:layer xmlns:dia="http://www.lysator.liu.se/~alla/dia/">{}</dia:layer>'.format(
+        ''.join(OBJECT.format(n=n) for n in range(count))
+    )
+
+def legacy_parse_attribute_value(attrib_node):
+    '''The if/elif chain used before the decoder table was introduced'''
+
+    if len(attrib_node) == 0:
+        return None
+
+    value_node = list(attrib_node)[0]
+
+    tag = value_node.tag[len(NS):]
+    if tag == 'real':
+        return attributes.parse_real(value_node)
+    elif tag == 'boolean':
+        return attributes.parse_boolean(value_node)
+    elif tag == 'point':
+        return attributes.parse_point(value_node)
+    elif tag == 'rectangle':
+        return attributes.parse_rectangle(value_node)
+    elif tag == 'enum':
+        return attributes.parse_enum(value_node)
+    elif tag == 'composite':
+        return legacy_parse_attributes(value_node)
+    elif tag == 'string':
+        return attributes.parse_string(value_node)
+    elif tag == 'color':
+        return attributes.parse_color(value_node)
+    elif tag == 'font':
+        return attributes.parse_font(value_node)
+    elif tag == 'int':
+        return attributes.parse_int(value_node)
+    return ''
+
+def legacy_parse_attributes(parent_node):
+    return {
+        attrib_node.attrib['name'] : legacy_parse_attribute_value(attrib_node)
+        for attrib_node in parent_node.findall(NS + 'attribute')
+    }
+
+def best_time(func, nodes, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for node in nodes:
+            func(node)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(count, repeat=5):
+    layer = ElementTree.fromstring(build_document(count))
+    nodes = layer.findall(NS + 'object')
+    assert all(
+        legacy_parse_attributes(node) == attributes.parse_attributes(node)
+        for node in nodes
+    )
+
+    legacy = best_time(legacy_parse_attributes, nodes, repeat)
+    table = best_time(attributes.parse_attributes, nodes, repeat)
+    print('objects: {}'.format(count))
+    print('if/elif chain: {:.3f}s'.format(legacy))
+    print('decoder table: {:.3f}s ({:.2f}x)'.format(table, legacy / table))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+'''Reports the memory used per node by the object model (excluding attribute
+values) for a large synthetic diagram of boxes, lines and groups.'''
+
+import sys
+import tracemalloc
+
+import site
+site.addsitedir('src')
+from dia_parser import Diagram, DiagramData, Layer, Group, Object, Connection
+
+def build_diagram(count):
+    # Shared attribute dicts so that only the model itself is measured
+    box_attributes = {}
+    line_attributes = {'conn_endpoints': [(0.0, 0.0), (1.0, 1.0)]}
+
+    groups = []
+    children = []
+    for n in range(count // 2):
+        children.append(Object(
+            obj_id='B{}'.format(n),
+            obj_type='Flowchart - Box',
+            version='0',
+            attributes=box_attributes,
+        ))
+        children.append(Object(
+            obj_id='L{}'.format(n),
+            obj_type='Standard - Line',
+            version='0',
+            attributes=line_attributes,
+            connections=[
+                Connection(handle=0, to_id='B{}'.format(n)),
+                Connection(handle=1, to_id='B{}'.format(max(n - 1, 0))),
+            ]
+        ))
+        if len(children) >= 100:
+            groups.append(Group(children, attributes={}))
+            children = []
+
+    return Diagram(DiagramData(), [Layer(groups + children)])
+
+def main(count):
+    tracemalloc.start()
+    diagram = build_diagram(count)
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    nodes = sum(1 for _ in diagram.nodes)
+    print('nodes: {}'.format(nodes))
+    print('total: {:.1f} MB'.format(used / 1e6))
+    print('per node: {:.0f} bytes'.format(used / nodes))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
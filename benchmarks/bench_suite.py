@@ -0,0 +1,243 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+'''Runs the benchmark scenarios on synthetic diagrams (see generate_diagram)
+and compares the results with stored baselines.
+
+    python benchmarks/bench_suite.py                # run and compare
+    python benchmarks/bench_suite.py --check        # exit with status 1 on a regression
+    python benchmarks/bench_suite.py --update       # store the results as the new baselines
+    python benchmarks/bench_suite.py --scale 0.1    # quick run on smaller diagrams
+
+For each scenario it reports the parse time (full tree and streaming), the
+peak memory while parsing, the cost of each parse phase (reading and
+decompressing, XML parsing, building the model, building the connection
+graph), the time to load a binary snapshot of the diagram and the latency of
+the per-object lookups. The deep and wide scenarios check that deeply nested
+and very wide group trees still cost time in proportion to their size. A
+metric regresses when it exceeds its baseline by more than the threshold
+factor (and, for the lookup latencies, by more than LATENCY_FLOOR_US as well).
+Baselines depend on the machine, so refresh them with --update when moving to
+another one.
+'''
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from xml.etree import ElementTree
+
+import site
+site.addsitedir(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from dia_parser import parse_dia_file, parse_diagram, iter_xml_chunks, save_snapshot, load_snapshot
+
+from generate_diagram import write_diagram
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+# Each scenario gives the arguments of write_diagram
+SCENARIOS = {
+    'flat' : dict(objects=10000, line_density=1.0, attributes='normal'),
+    'dense-lines' : dict(objects=10000, line_density=4.0, attributes='minimal'),
+    'grouped-rich' : dict(objects=10000, line_density=1.0, group_depth=4, attributes='rich', layers=4),
+    'compressed' : dict(objects=10000, line_density=1.0, attributes='normal', compress=True),
+    # Pathological shapes: one chain of groups nested 10000 deep, and 20000
+    # groups side by side. Only the object counts are scaled.
+    'deep' : dict(objects=10, line_density=1.0, group_depth=10000, group_size=10, attributes='minimal'),
+    'wide' : dict(objects=20000, line_density=0.0, group_depth=1, group_size=1, attributes='minimal'),
+}
+
+# Allowed slowdown factor before a metric counts as a regression
+DEFAULT_THRESHOLD = 1.5
+THRESHOLDS = {
+    'peak_mb' : 1.2,
+    # Lookups take around a microsecond, so timer and scheduling noise is a
+    # large part of each result
+    'outbound_us' : 2.0,
+    'inbound_us' : 2.0,
+    'connected_to_this_us' : 2.0,
+    'objects_lookup_us' : 2.0,
+}
+
+# A lookup latency (the *_us metrics) only regresses when it is also this many
+# microseconds slower than its baseline
+LATENCY_FLOOR_US = 0.5
+
+# The number of objects sampled for the lookup latencies
+LOOKUP_SAMPLE = 2000
+
+
+def best_time(func, repeat):
+    '''Returns the fastest of several timed calls to func'''
+
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def peak_memory(func):
+    '''Returns the peak memory (in MB) allocated while calling func'''
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1e6
+
+
+def lookup_latency(func, objects, repeat):
+    '''Returns the mean time (in microseconds) of func over the objects, from
+    the fastest of several passes'''
+
+    def lookups():
+        for obj in objects:
+            func(obj)
+    return best_time(lookups, repeat) / len(objects) * 1e6
+
+
+def run_scenario(path, repeat):
+    results = {}
+
+    results['parse_s'] = best_time(lambda: parse_dia_file(path), repeat)
+    results['stream_parse_s'] = best_time(lambda: parse_dia_file(path, stream=True), repeat)
+    results['peak_mb'] = peak_memory(lambda: parse_dia_file(path))
+
+    # The phases of parse_dia_file, one at a time
+    data = b''.join(iter_xml_chunks(path))
+    results['read_s'] = best_time(lambda: b''.join(iter_xml_chunks(path)), repeat)
+    results['xml_s'] = best_time(lambda: ElementTree.fromstring(data), repeat)
+    root = ElementTree.fromstring(data)
+    results['build_s'] = best_time(lambda: parse_diagram(root), repeat)
+
+    diagram = parse_diagram(root)
+
+    snapshot = path + '.snapshot'
+    save_snapshot(diagram, snapshot)
+    results['snapshot_load_s'] = best_time(lambda: load_snapshot(snapshot), repeat)
+
+    def build_graph():
+        diagram.graph.invalidate()
+        diagram.graph.nodes()
+    results['graph_s'] = best_time(build_graph, repeat)
+
+    objects = list(diagram.objects)
+    step = max(1, len(objects) // LOOKUP_SAMPLE)
+    sample = objects[::step]
+    ids = [obj.id for obj in sample]
+    results['outbound_us'] = lookup_latency(lambda obj: obj.outbound, sample, repeat)
+    results['inbound_us'] = lookup_latency(lambda obj: obj.inbound, sample, repeat)
+    results['connected_to_this_us'] = lookup_latency(lambda obj: obj.connected_to_this, sample, repeat)
+    results['objects_lookup_us'] = lookup_latency(lambda obj_id: diagram.objects[obj_id], ids, repeat)
+
+    results['objects'] = len(objects)
+    results['file_mb'] = os.path.getsize(path) / 1e6
+    return results
+
+
+def run(scale, repeat, names):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name in names:
+            kwargs = dict(SCENARIOS[name])
+            kwargs['objects'] = max(1, int(kwargs['objects'] * scale))
+            path = os.path.join(directory, name + '.dia')
+            write_diagram(path, **kwargs)
+            results[name] = run_scenario(path, repeat)
+            print_results(name, results[name])
+    return results
+
+
+def print_results(name, results):
+    print('{}:'.format(name))
+    for metric, value in results.items():
+        print('  {:<22} {:>12.4f}'.format(metric, value))
+
+
+def compare(results, baselines):
+    '''Returns a list of (scenario, metric, value, baseline, threshold) tuples for each regression'''
+
+    regressions = []
+    thresholds = dict(THRESHOLDS, **baselines.get('thresholds', {}))
+    default = thresholds.pop('default', DEFAULT_THRESHOLD)
+    for name, metrics in results.items():
+        expected = baselines.get('results', {}).get(name)
+        if expected is None or expected.get('objects') != metrics['objects']:
+            # Not comparable (new scenario, or run at another scale)
+            continue
+        for metric, value in metrics.items():
+            if metric in ('objects', 'file_mb') or metric not in expected:
+                continue
+            threshold = thresholds.get(metric, default)
+            if metric.endswith('_us') and value - expected[metric] <= LATENCY_FLOOR_US:
+                continue
+            if value > expected[metric] * threshold:
+                regressions.append((name, metric, value, expected[metric], threshold))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs the dia_parser benchmarks')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier for the object counts')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per metric (the best is kept)')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='run only these scenarios')
+    parser.add_argument('--baselines', default=BASELINES)
+    parser.add_argument('--check', action='store_true', help='exit with status 1 if anything regressed')
+    parser.add_argument('--update', action='store_true', help='store the results as the baselines')
+    args = parser.parse_args()
+
+    results = run(args.scale, args.repeat, args.scenario or list(SCENARIOS))
+
+    try:
+        with open(args.baselines) as fp:
+            baselines = json.load(fp)
+    except FileNotFoundError:
+        baselines = {}
+
+    if args.update:
+        baselines.setdefault('thresholds', dict(THRESHOLDS, default=DEFAULT_THRESHOLD))
+        baselines.setdefault('results', {}).update(results)
+        with open(args.baselines, 'w') as fp:
+            json.dump(baselines, fp, indent=2, sort_keys=True)
+            fp.write('\n')
+        print('baselines written to {}'.format(args.baselines))
+        return 0
+
+    regressions = compare(results, baselines)
+    for name, metric, value, expected, threshold in regressions:
+        print('REGRESSION {} {}: {:.4f} (baseline {:.4f}, allowed x{})'.format(
+            name, metric, value, expected, threshold
+        ))
+    if not regressions:
+        print('no regressions')
+    return 1 if regressions and args.check else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
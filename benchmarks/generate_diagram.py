@@ -0,0 +1,315 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+'''Writes synthetic .dia files for benchmarking: a grid of boxes joined by
+random lines, optionally nested in groups and spread over several layers.
+
+    python benchmarks/generate_diagram.py out.dia --objects 50000 --line-density 1.5 \\
+        --group-depth 3 --attributes rich --compress
+'''
+
+import argparse
+import gzip
+import random
+
+NS_URI = 'http://www.lysator.liu.se/~alla/dia/'
+
+# How much is written for each object
+ATTRIBUTE_LEVELS = ('minimal', 'normal', 'rich')
+
+HEADER = '''<?xml version="1.0" encoding="UTF-8"?>
+<dia:diagram xmlns:dia="{ns}">
+  <dia:diagramdata>
+    <dia:attribute name="background">
+      <dia:color val="#ffffffff"/>
+    </dia:attribute>
+    <dia:attribute name="paper">
+      <dia:composite type="paper">
+        <dia:attribute name="name">
+          <dia:string>#A4#</dia:string>
+        </dia:attribute>
+        <dia:attribute name="is_portrait">
+          <dia:boolean val="true"/>
+        </dia:attribute>
+        <dia:attribute name="scaling">
+          <dia:real val="1"/>
+        </dia:attribute>
+      </dia:composite>
+    </dia:attribute>
+  </dia:diagramdata>
+'''
+
+FOOTER = '</dia:diagram>\n'
+
+BOX_GEOMETRY = '''
+      <dia:attribute name="obj_pos">
+        <dia:point val="{x},{y}"/>
+      </dia:attribute>
+      <dia:attribute name="obj_bb">
+        <dia:rectangle val="{x},{y};{right},{bottom}"/>
+      </dia:attribute>
+      <dia:attribute name="elem_corner">
+        <dia:point val="{x},{y}"/>
+      </dia:attribute>
+      <dia:attribute name="elem_width">
+        <dia:real val="{width}"/>
+      </dia:attribute>
+      <dia:attribute name="elem_height">
+        <dia:real val="{height}"/>
+      </dia:attribute>'''
+
+BOX_TEXT = '''
+      <dia:attribute name="show_background">
+        <dia:boolean val="true"/>
+      </dia:attribute>
+      <dia:attribute name="padding">
+        <dia:real val="0.5"/>
+      </dia:attribute>
+      <dia:attribute name="text">
+        <dia:composite type="text">
+          <dia:attribute name="string">
+            <dia:string>#Box {n}#</dia:string>
+          </dia:attribute>
+          <dia:attribute name="font">
+            <dia:font family="sans" style="0" name="Helvetica"/>
+          </dia:attribute>
+          <dia:attribute name="height">
+            <dia:real val="0.8"/>
+          </dia:attribute>
+          <dia:attribute name="pos">
+            <dia:point val="{text_x},{text_y}"/>
+          </dia:attribute>
+          <dia:attribute name="color">
+            <dia:color val="#000000ff"/>
+          </dia:attribute>
+          <dia:attribute name="alignment">
+            <dia:enum val="1"/>
+          </dia:attribute>
+        </dia:composite>
+      </dia:attribute>'''
+
+BOX_STYLE = '''
+      <dia:attribute name="border_width">
+        <dia:real val="0.1"/>
+      </dia:attribute>
+      <dia:attribute name="border_color">
+        <dia:color val="#000000ff"/>
+      </dia:attribute>
+      <dia:attribute name="inner_color">
+        <dia:color val="#ffffffff"/>
+      </dia:attribute>
+      <dia:attribute name="line_style">
+        <dia:enum val="0"/>
+      </dia:attribute>
+      <dia:attribute name="dashlength">
+        <dia:real val="1"/>
+      </dia:attribute>
+      <dia:attribute name="corner_radius">
+        <dia:real val="0.25"/>
+      </dia:attribute>
+      <dia:attribute name="meta">
+        <dia:composite type="dict">
+          <dia:attribute name="owner">
+            <dia:string>#team {owner}#</dia:string>
+          </dia:attribute>
+          <dia:attribute name="step">
+            <dia:string>#{n}#</dia:string>
+          </dia:attribute>
+        </dia:composite>
+      </dia:attribute>'''
+
+LINE_STYLE = '''
+      <dia:attribute name="numcp">
+        <dia:int val="1"/>
+      </dia:attribute>
+      <dia:attribute name="line_color">
+        <dia:color val="#000000ff"/>
+      </dia:attribute>
+      <dia:attribute name="line_width">
+        <dia:real val="0.1"/>
+      </dia:attribute>
+      <dia:attribute name="end_arrow">
+        <dia:enum val="22"/>
+      </dia:attribute>
+      <dia:attribute name="end_arrow_length">
+        <dia:real val="0.5"/>
+      </dia:attribute>
+      <dia:attribute name="end_arrow_width">
+        <dia:real val="0.5"/>
+      </dia:attribute>'''
+
+# Boxes are laid out on a grid with this spacing
+SPACING = 6.0
+WIDTH = 4.0
+HEIGHT = 2.0
+
+
+def box_xml(n, obj_id, x, y, attributes):
+    parts = [
+        '    <dia:object type="Flowchart - Box" version="0" id="{}">'.format(obj_id),
+        BOX_GEOMETRY.format(x=x, y=y, right=x + WIDTH, bottom=y + HEIGHT, width=WIDTH, height=HEIGHT),
+    ]
+    if attributes != 'minimal':
+        parts.append(BOX_TEXT.format(n=n, text_x=x + WIDTH / 2, text_y=y + HEIGHT / 2))
+    if attributes == 'rich':
+        parts.append(BOX_STYLE.format(n=n, owner=n % 7))
+    parts.append('\n    </dia:object>\n')
+    return ''.join(parts)
+
+
+def line_xml(obj_id, from_id, from_pos, to_id, to_pos, attributes):
+    (x1, y1), (x2, y2) = from_pos, to_pos
+    parts = [
+        '    <dia:object type="Standard - Line" version="0" id="{}">'.format(obj_id),
+        '''
+      <dia:attribute name="obj_pos">
+        <dia:point val="{x1},{y1}"/>
+      </dia:attribute>
+      <dia:attribute name="obj_bb">
+        <dia:rectangle val="{left},{top};{right},{bottom}"/>
+      </dia:attribute>
+      <dia:attribute name="conn_endpoints">
+        <dia:point val="{x1},{y1}"/>
+        <dia:point val="{x2},{y2}"/>
+      </dia:attribute>'''.format(
+            x1=x1, y1=y1, x2=x2, y2=y2,
+            left=min(x1, x2), top=min(y1, y2), right=max(x1, x2), bottom=max(y1, y2),
+        ),
+    ]
+    if attributes != 'minimal':
+        parts.append(LINE_STYLE)
+    parts.append('''
+      <dia:connections>
+        <dia:connection handle="0" to="{}" connection="16"/>
+        <dia:connection handle="1" to="{}" connection="16"/>
+      </dia:connections>
+    </dia:object>
+'''.format(from_id, to_id))
+    return ''.join(parts)
+
+
+def iter_diagram_xml(
+    objects=1000,
+    line_density=1.0,
+    group_depth=0,
+    group_size=10,
+    attributes='normal',
+    layers=1,
+    seed=0
+):
+    '''Returns an iterator over the pieces of a synthetic diagram document.
+
+    objects -- the number of boxes
+    line_density -- the number of lines per box, each joining two random boxes in the same layer
+    group_depth -- how deeply the boxes are nested in groups (0 for none)
+    group_size -- the number of boxes in each innermost group
+    attributes -- one of ATTRIBUTE_LEVELS
+    layers -- the number of layers the boxes are spread over
+    seed -- the random seed, so that the same arguments give the same file
+    '''
+
+    if attributes not in ATTRIBUTE_LEVELS:
+        raise ValueError('attributes must be one of {}'.format(', '.join(ATTRIBUTE_LEVELS)))
+
+    rng = random.Random(seed)
+    columns = max(1, int(objects ** 0.5))
+    next_id = 0
+
+    yield HEADER.format(ns=NS_URI)
+
+    per_layer = -(-objects // layers) if objects else 0
+    for layer in range(layers):
+        first = layer * per_layer
+        count = max(0, min(per_layer, objects - first))
+
+        yield '  <dia:layer name="{}" visible="true" connectable="true"{}>\n'.format(
+            'Background' if layer == 0 else 'Layer {}'.format(layer),
+            ' active="true"' if layer == 0 else '',
+        )
+
+        ids = []
+        positions = []
+        for n in range(first, first + count):
+            ids.append('O{}'.format(next_id))
+            next_id += 1
+            positions.append(((n % columns) * SPACING, (n // columns) * SPACING))
+
+        # Boxes, in nested groups of group_size if asked
+        chunk = max(1, group_size) if group_depth else max(1, count)
+        for start in range(0, count, chunk):
+            yield '    <dia:group>\n' * group_depth
+            for n in range(start, min(start + chunk, count)):
+                x, y = positions[n]
+                yield box_xml(first + n, ids[n], x, y, attributes)
+            yield '    </dia:group>\n' * group_depth
+
+        if count:
+            for _ in range(int(count * line_density)):
+                a = rng.randrange(count)
+                b = rng.randrange(count)
+                (ax, ay), (bx, by) = positions[a], positions[b]
+                yield line_xml(
+                    'O{}'.format(next_id),
+                    ids[a], (ax + WIDTH / 2, ay + HEIGHT / 2),
+                    ids[b], (bx + WIDTH / 2, by + HEIGHT / 2),
+                    attributes
+                )
+                next_id += 1
+
+        yield '  </dia:layer>\n'
+
+    yield FOOTER
+
+
+def write_diagram(path, compress=False, **kwargs):
+    '''Writes a synthetic diagram to the given path (gzip compressed if
+    compress is true). See iter_diagram_xml for the other arguments.'''
+
+    opener = gzip.open if compress else open
+    with opener(path, 'wt', encoding='utf-8') as fp:
+        for piece in iter_diagram_xml(**kwargs):
+            fp.write(piece)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Writes a synthetic .dia file')
+    parser.add_argument('path')
+    parser.add_argument('--objects', type=int, default=1000, help='number of boxes')
+    parser.add_argument('--line-density', type=float, default=1.0, help='lines per box')
+    parser.add_argument('--group-depth', type=int, default=0, help='group nesting depth')
+    parser.add_argument('--group-size', type=int, default=10, help='boxes per innermost group')
+    parser.add_argument('--attributes', choices=ATTRIBUTE_LEVELS, default='normal')
+    parser.add_argument('--layers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--compress', action='store_true', help='gzip the output')
+    args = parser.parse_args()
+
+    write_diagram(
+        args.path,
+        compress=args.compress,
+        objects=args.objects,
+        line_density=args.line_density,
+        group_depth=args.group_depth,
+        group_size=args.group_size,
+        attributes=args.attributes,
+        layers=args.layers,
+        seed=args.seed,
+    )
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,20 @@
-
 from .ns import *
+from .options import *
 from .attributes import *
+from .stats import *
 from .obj import *
 from .layer import *
+from .graph import *
+from .geometry import *
+from .spatial import *
+from .text import *
+from .query import *
 from .diagram import *
+from .source import *
+from .stream import *
+from .cache import *
+from .reparse import *
 from .parse import *
+from .write import *
+from .snapshot import *
+from .batch import *
@@ -16,7 +16,11 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
+import base64
+from collections.abc import MutableMapping
+
 from .ns import NS
+from .options import DEFAULT_OPTIONS
 
 def parse_real(value_node):
     return float(value_node.attrib['val'])
@@ -61,52 +65,237 @@ def parse_font(value_node):
         value_node.attrib['name']
     )
 
+def parse_bezpoint(value_node):
+    '''Returns a tuple (type, p1, p2, p3) where type is eg "moveto" or "curveto"
+    and each point is an (x, y) tuple, or None when not given'''
+
+    def point(name):
+        val = value_node.attrib.get(name)
+        if val is None:
+            return None
+        args = val.split(',')
+        return (float(args[0]), float(args[1]))
+
+    return (
+        value_node.attrib['type'],
+        point('p1'),
+        point('p2'),
+        point('p3'),
+    )
+
+def parse_composite(value_node):
+    return parse_attributes(value_node)
+
+def parse_dict(value_node):
+    return parse_attributes(value_node)
+
+# The decoders whose values parse_attributes fills in itself. A composite tag
+# registered with another decoder is decoded by calling it as usual.
+_NESTED_DECODERS = (parse_composite, parse_dict)
+
+def parse_pixbuf(value_node):
+    '''Returns the (base64 decoded) image data, or None if the image is not embedded'''
+
+    data = value_node.attrib.get('data')
+    if data is None:
+        return None
+    return base64.b64decode(data)
+
+# Maps the namespaced tag of each value node to the function decoding it
+ATTRIBUTE_DECODERS = {}
+
+def register_attribute_decoder(tag, decoder):
+    '''Registers the function used to decode attribute values of the given type.
+
+    The tag is the name of the value element (eg "point"), optionally with the
+    namespace already applied. The decoder is called with the value element
+    and returns the Python value. An existing decoder for the tag is replaced.'''
+
+    if not tag.startswith('{'):
+        tag = NS + tag
+    ATTRIBUTE_DECODERS[tag] = decoder
+
+for _tag, _decoder in (
+    ('real', parse_real),
+    ('boolean', parse_boolean),
+    ('point', parse_point),
+    ('rectangle', parse_rectangle),
+    ('enum', parse_enum),
+    ('composite', parse_composite),
+    ('string', parse_string),
+    ('color', parse_color),
+    ('font', parse_font),
+    ('int', parse_int),
+    ('bezpoint', parse_bezpoint),
+    ('dict', parse_dict),
+    ('pixbuf', parse_pixbuf),
+):
+    register_attribute_decoder(_tag, _decoder)
+del _tag, _decoder
+
+# Attributes holding a list of values (eg the points of a line, or the
+# operations of a UML class), which are decoded as a list even when there are
+# fewer than two
+LIST_ATTRIBUTES = frozenset((
+    'conn_endpoints',
+    'orth_points',
+    'bez_points',
+    'poly_points',
+    'corner_types',
+    'attributes',
+    'operations',
+    'parameters',
+    'templates',
+))
+
+def _decode_value(value_node):
+    try:
+        decoder = ATTRIBUTE_DECODERS[value_node.tag]
+    except KeyError:
+        print('unknown tag', value_node.tag[len(NS):])
+        return ''
+
+    return decoder(value_node)
+
 def parse_attribute_value(attrib_node):
+    '''Returns the value of an attribute node. An attribute with several
+    value elements (or one of LIST_ATTRIBUTES) gives a list of values.'''
+
+    if len(attrib_node) > 1 or attrib_node.attrib.get('name') in LIST_ATTRIBUTES:
+        return [_decode_value(value_node) for value_node in attrib_node]
     if len(attrib_node) == 0:
         return None
+    return _decode_value(attrib_node[0])
 
-    value_node = list(attrib_node)[0]
-
-    tag = value_node.tag[len(NS):]
-    if tag == 'real':
-        return parse_real(value_node)
-    elif tag == 'boolean':
-        return parse_boolean(value_node)
-    elif tag == 'point':
-        return parse_point(value_node)
-    elif tag == 'rectangle':
-        return parse_rectangle(value_node)
-    elif tag == 'enum':
-        return parse_enum(value_node)
-    elif tag == 'composite':
-        return parse_attributes(value_node)
-    elif tag == 'string':
-        return parse_string(value_node)
-    elif tag == 'color':
-        return parse_color(value_node)
-    elif tag == 'font':
-        return parse_font(value_node)
-    elif tag == 'int':
-        return parse_int(value_node)
-
-    print('unknown tag', tag)
-
-    return ''
-
-def parse_attributes(parent_node):
-    '''Return a dictionary representing the attributes/values found under the given dia XML node'''
+def _decode_attribute(name, attrib_node):
+    try:
+        return parse_attribute_value(attrib_node)
+    except Exception as ex:
+        print('error parsing attribute value for', name, ':', ex)
+        raise
+
+def parse_attributes(parent_node, names=None):
+    '''Return a dictionary representing the attributes/values found under the given dia XML node.
+    If names is given, only attributes with those names are decoded.'''
 
     attributes = {}
 
-    for attrib_node in parent_node.findall(NS + 'attribute'):
-        name = attrib_node.attrib['name']
+    # Nested composites are filled in from an explicit stack rather than by
+    # recursion, so there is no limit on how deeply they can be nested
+    stack = [(parent_node, attributes, names)]
+    while stack:
+        node, target, wanted = stack.pop()
+        for attrib_node in node.findall(NS + 'attribute'):
+            name = attrib_node.attrib['name']
+            if wanted is not None and name not in wanted:
+                continue
+            # The common case of a single value is decoded here directly
+            if len(attrib_node) == 1 and name not in LIST_ATTRIBUTES:
+                value_node = attrib_node[0]
+                decoder = ATTRIBUTE_DECODERS.get(value_node.tag)
+                if decoder in _NESTED_DECODERS:
+                    value = target[name] = {}
+                    stack.append((value_node, value, None))
+                    continue
+                if decoder is not None:
+                    try:
+                        target[name] = decoder(value_node)
+                    except Exception as ex:
+                        print('error parsing attribute value for', name, ':', ex)
+                        raise
+                    continue
+            target[name] = _decode_attribute(name, attrib_node)
+
+    return attributes
+
+def decode_attributes(parent_node, options=None):
+    '''Return the attributes found under the given dia XML node, either as a
+    dictionary or as a LazyAttributes mapping, depending on the parse options'''
+
+    if options is None: options = DEFAULT_OPTIONS
+
+    stats = options.collector
+    if stats is not None:
+        stats.count_attributes(parent_node)
+        # Entered once per node, so only timed (see ParseStats.phase)
+        with stats.phase('attributes', blocks=False):
+            return _decode_attributes_node(parent_node, options)
+    return _decode_attributes_node(parent_node, options)
+
+
+def _decode_attributes_node(parent_node, options):
+    if options.lazy:
+        return LazyAttributes(parent_node, options.attributes)
+    return parse_attributes(parent_node, options.attributes)
+
+
+class LazyAttributes(MutableMapping):
+    '''A dictionary of attributes which decodes each value from its XML node the
+    first time it is read, and caches the result.
+
+    The attribute nodes are indexed by name up front, so membership tests,
+    iteration and len() never decode anything. Values can be assigned and
+    deleted as with a normal dictionary. If names is given, only attributes
+    with those names are kept.
+    '''
+
+    __slots__ = ('_nodes', '_values')
+
+    def __init__(self, parent_node, names=None):
+        self._nodes = {
+            attrib_node.attrib['name'] : attrib_node
+            for attrib_node in parent_node.findall(NS + 'attribute')
+            if names is None or attrib_node.attrib['name'] in names
+        }
+        self._values = {}
+
+    def __getitem__(self, name):
         try:
-            avalue = parse_attribute_value(attrib_node)
-        except Exception as ex:
-            print('error parsing attribute value for', name, ':', ex)
-            raise
+            return self._values[name]
+        except KeyError:
+            pass
 
-        attributes[name] = avalue
+        attrib_node = self._nodes[name]
+        value = _decode_attribute(name, attrib_node)
+        self._values[name] = value
+        # The XML is no longer needed once the value is decoded
+        self._nodes[name] = None
+        return value
 
-    return attributes
+    def __setitem__(self, name, value):
+        self._nodes.setdefault(name, None)
+        self._values[name] = value
+
+    def __delitem__(self, name):
+        del self._nodes[name]
+        self._values.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self._nodes
+
+    def __iter__(self):
+        return iter(self._nodes)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __repr__(self):
+        return '<LazyAttributes {}>'.format(list(self._nodes))
+
+    def decoded(self):
+        '''Returns a dictionary of the values decoded so far'''
+
+        return dict(self._values)
+
+    def raw_node(self, name):
+        '''Returns the XML attribute node of a value that has not been decoded
+        (or assigned) yet, or None'''
+
+        if name in self._values:
+            return None
+        return self._nodes.get(name)
+
+    def __reduce__(self):
+        # Pickle as a plain (fully decoded) dictionary rather than XML nodes
+        return (dict, (dict(self),))
 
@@ -0,0 +1,120 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import os
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+
+from .options import ParseOptions
+from .parse import parse_dia_file
+
+
+class BatchResult:
+    '''The outcome of parsing one file in a batch.
+
+    Attributes:
+    src -- the source as passed to parse_dia_files
+    diagram -- the Diagram instance, or None if parsing failed
+    error -- the exception raised while parsing, or None
+    traceback -- the formatted traceback of the error, or None
+    '''
+
+    def __init__(self, src, diagram=None, error=None, traceback=None):
+        self.src = src
+        self.diagram = diagram
+        self.error = error
+        self.traceback = traceback
+
+    def __bool__(self):
+        '''True iff the file parsed successfully'''
+
+        return self.error is None
+
+    def __repr__(self):
+        return '<BatchResult src={!r} ok={}>'.format(self.src, self.error is None)
+
+
+def _parse_one(src, stream, options):
+    try:
+        return BatchResult(src, diagram=parse_dia_file(src, stream=stream, options=options))
+    except Exception as ex:
+        return BatchResult(src, error=ex, traceback=traceback.format_exc())
+
+
+def _collect(future, src):
+    try:
+        return future.result()
+    except Exception as ex:
+        # The worker died, or the result could not be sent back
+        return BatchResult(src, error=ex, traceback=traceback.format_exc())
+
+
+def parse_dia_files(srcs, workers=None, ordered=False, stream=False, options=None, **kwargs):
+    '''Parses many .dia files in a pool of worker processes, yielding a
+    BatchResult for each.
+
+    Results are yielded as soon as each file is done, or in the order of srcs
+    if ordered is true. An error parsing one file is recorded on its result
+    and does not stop the batch. workers defaults to the number of CPUs; with
+    workers=1 the files are parsed in this process instead. srcs can be any
+    iterable, and is consumed as the batch goes: only a few files per worker
+    are queued at a time, and nothing is kept of a result once it has been
+    yielded.
+
+    The remaining arguments are passed on to parse_dia_file. Diagrams are
+    pickled to return them from the workers, so lazy attributes arrive fully
+    decoded.'''
+
+    if options is None:
+        options = ParseOptions(**kwargs)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1:
+        for src in srcs:
+            yield _parse_one(src, stream, options)
+        return
+
+    sources = iter(srcs)
+    limit = workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Maps each future to its source, in the order submitted
+        pending = {}
+        # Results waiting to be yielded. Finished futures are dropped as soon
+        # as their result is taken, so each diagram lives only as long as the
+        # caller keeps it.
+        ready = deque()
+
+        def submit():
+            for src in islice(sources, limit - len(pending)):
+                pending[executor.submit(_parse_one, src, stream, options)] = src
+
+        submit()
+        while pending or ready:
+            if not ready:
+                if ordered:
+                    done = (next(iter(pending)),)
+                else:
+                    done = wait(pending, return_when=FIRST_COMPLETED).done
+                for future in done:
+                    ready.append(_collect(future, pending.pop(future)))
+                done = future = None
+                submit()
+            yield ready.popleft()
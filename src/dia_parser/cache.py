@@ -0,0 +1,313 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+from .attributes import LazyAttributes
+
+# Bump whenever the pickled form of the model changes, to orphan old entries
+CACHE_VERSION = 5
+
+_SUFFIX = '.diagram'
+
+
+def _file_identity(src):
+    '''Returns a (path, mtime, size) tuple for a filename source, or None for other sources'''
+
+    if not isinstance(src, (str, os.PathLike)):
+        return None
+    stat = os.stat(src)
+    return (os.path.abspath(src), stat.st_mtime_ns, stat.st_size)
+
+
+def _hash_content(src):
+    digest = hashlib.sha256()
+    if isinstance(src, (str, os.PathLike)):
+        with open(src, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(1024 * 1024), b''):
+                digest.update(chunk)
+    else:
+        digest.update(src)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    '''A persistent cache of parsed diagrams, stored as pickles in a directory.
+
+    Entries are keyed by the file path, modification time and size (or by a
+    hash of the file content, if use_hash is true) together with the parse
+    options. Bytes sources are always keyed by content. Other sources (eg
+    open files) are not cached. When the directory grows past max_bytes the
+    least recently used entries are removed.
+
+    Only point this at a directory you trust, since entries are unpickled.
+
+    Pass an instance to parse_dia_file (cache=...) to use it.
+    '''
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, use_hash=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.use_hash = use_hash
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, src, options):
+        '''Returns the cache key for the given source and options, or None if it cannot be cached'''
+
+        if isinstance(src, (bytes, bytearray, memoryview)) or (
+            self.use_hash and isinstance(src, (str, os.PathLike))
+        ):
+            identity = ('content', _hash_content(src))
+        else:
+            identity = _file_identity(src)
+            if identity is None:
+                return None
+
+        text = repr((CACHE_VERSION, identity, options.cache_key()))
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def load(self, src, options, parse):
+        '''Returns the cached diagram for src, or calls parse() and caches the result'''
+
+        key = self.key(src, options)
+        if key is None:
+            return parse()
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fp:
+                diagram = pickle.load(fp)
+        except FileNotFoundError:
+            pass
+        except Exception:
+            # A damaged or outdated entry, replace it
+            self._remove(path)
+        else:
+            self._touch(path)
+            return diagram
+
+        diagram = parse()
+        self.store(key, diagram)
+        return diagram
+
+    def store(self, key, diagram):
+        '''Writes the diagram under the given key, then evicts old entries if needed'''
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                pickle.dump(diagram, fp, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+
+        self.evict()
+
+    def entries(self):
+        '''Returns a list of (mtime, size, path) tuples for the entries, oldest first'''
+
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        '''Removes least recently used entries until the cache fits in max_bytes'''
+
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        '''Removes every entry'''
+
+        for _, _, path in self.entries():
+            self._remove(path)
+
+    @staticmethod
+    def _touch(path):
+        # The modification time doubles as the last use time
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def approximate_size(diagram):
+    '''Returns a rough estimate of the memory (in bytes) used by a diagram,
+    counting its nodes, connections and attribute values'''
+
+    getsizeof = sys.getsizeof
+
+    def attributes_size(attributes):
+        size = 0
+        # Nested composites are measured from a stack rather than by recursion
+        stack = [attributes]
+        while stack:
+            attributes = stack.pop()
+            if not attributes:
+                continue
+            size += getsizeof(attributes)
+            # Do not force lazy attributes to decode just to measure them
+            values = attributes.decoded() if isinstance(attributes, LazyAttributes) else attributes
+            for value in values.values():
+                if isinstance(value, dict):
+                    stack.append(value)
+                else:
+                    size += getsizeof(value)
+        return size
+
+    size = getsizeof(diagram)
+    for node in diagram.nodes:
+        size += getsizeof(node) + attributes_size(node.attributes)
+        for conn in getattr(node, 'connections', ()):
+            size += getsizeof(conn)
+    return size
+
+
+class MemoryCache:
+    '''An in-process LRU cache of parsed diagrams, for long running processes
+    that load the same files over and over.
+
+    Entries are keyed by file path and parse options. On every lookup the
+    file's modification time and size are checked, and the file is parsed
+    again if either changed. The least recently used entries are evicted to
+    stay within max_entries and (if given) max_bytes, as measured by sizeof
+    (approximate_size by default). Sources that are not filenames are always
+    parsed.
+
+    Pass an instance to parse_dia_file (cache=...) to use it. It is safe to
+    share between threads.
+
+    Attributes:
+    hits -- lookups answered from the cache
+    misses -- lookups that had to parse the file
+    reloads -- misses caused by a file changing since it was cached
+    evictions -- entries dropped to make room
+    '''
+
+    def __init__(self, max_entries=32, max_bytes=None, sizeof=approximate_size):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        '''Returns a dictionary of the counters and current size'''
+
+        with self._lock:
+            return {
+                'entries' : len(self._entries),
+                'bytes' : self.total_bytes,
+                'hits' : self.hits,
+                'misses' : self.misses,
+                'reloads' : self.reloads,
+                'evictions' : self.evictions,
+            }
+
+    def load(self, src, options, parse):
+        '''Returns the cached diagram for src, or calls parse() and caches the result'''
+
+        identity = _file_identity(src)
+        if identity is None:
+            return parse()
+
+        path, mtime, size = identity
+        key = (path, options.cache_key())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == (mtime, size):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self.reloads += 1
+                self._discard(key)
+            self.misses += 1
+
+        diagram = parse()
+        nbytes = self.sizeof(diagram) if self.max_bytes is not None else 0
+
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = ((mtime, size), diagram, nbytes)
+            self.total_bytes += nbytes
+            self._evict()
+
+        return diagram
+
+    def clear(self):
+        '''Removes every entry (the counters are kept)'''
+
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[2]
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries or
+            (self.max_bytes is not None and self.total_bytes > self.max_bytes)
+        ):
+            # Always keep the newest entry, even if it alone is too large
+            if len(self._entries) == 1:
+                break
+            _, entry = self._entries.popitem(last=False)
+            self.total_bytes -= entry[2]
+            self.evictions += 1
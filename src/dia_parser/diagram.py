@@ -16,16 +16,57 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
-from .attributes import parse_attributes
+from .attributes import decode_attributes
 from .obj import parse_object
 from .layer import parse_layer
+from .graph import ConnectionGraph
+from .geometry import GeometryComponent
+from .spatial import SpatialComponent
+from .text import TextComponent
+from .query import Selector
 from .ns import NS
 
 class ObjectsComponent:
-    '''Used to lookup objects by ID in a diagram, or list them'''
+    '''Used to lookup objects by ID in a diagram, or list them.
+
+    The objects are sorted into per-type buckets, and into lines and other
+    objects, in a single pass the first time one of those lists is asked for.
+    The lists returned are shared, so do not modify them. Call invalidate()
+    after changing the diagram.
+    '''
 
     def __init__(self, diagram):
         self.diagram = diagram
+        self.invalidate()
+
+    def invalidate(self):
+        '''Discards the buckets so they are rebuilt on next use'''
+
+        self._by_type = None
+        self._lines = None
+        self._non_lines = None
+        self._positions = None
+
+    def _build(self):
+        by_type = {}
+        lines = []
+        non_lines = []
+        positions = {}
+        for obj in self:
+            positions[obj] = len(positions)
+            objects = by_type.get(obj.obj_type)
+            if objects is None:
+                objects = by_type[obj.obj_type] = []
+            objects.append(obj)
+            if obj.is_line:
+                lines.append(obj)
+            else:
+                non_lines.append(obj)
+
+        self._by_type = by_type
+        self._lines = lines
+        self._non_lines = non_lines
+        self._positions = positions
 
     def __iter__(self):
         '''Iterates over all objects in the diagram'''
@@ -39,37 +80,96 @@ class ObjectsComponent:
         return self.diagram.object_map[obj_name]
 
     def filter_lines(self):
-        '''Returns an iterator over all line type objects in the diagram'''
+        '''Returns the list of line type objects in the diagram'''
 
-        return filter(
-            lambda obj : hasattr(obj, 'is_line') and obj.is_line,  self
-        )
+        if self._lines is None:
+            self._build()
+        return self._lines
+
+    def filter_non_lines(self):
+        '''Returns the list of objects in the diagram that are not lines'''
+
+        if self._non_lines is None:
+            self._build()
+        return self._non_lines
+
+    def by_type(self, obj_type):
+        '''Returns the list of objects of the given type (eg "Flowchart - Box")'''
+
+        if self._by_type is None:
+            self._build()
+        return self._by_type.get(obj_type, [])
+
+    def position(self, obj):
+        '''Returns the index of the given object in diagram order'''
+
+        if self._positions is None:
+            self._build()
+        return self._positions[obj]
+
+    def types(self):
+        '''Returns the list of object types used in the diagram'''
+
+        if self._by_type is None:
+            self._build()
+        return list(self._by_type)
 
 class Diagram:
     '''Represents a dia diagram node.
 
     Attributes:
+    diagram_data -- a DiagramData instance holding the diagram attributes
     layers -- list of Layer instances
     objects -- an ObjectsComponent instance used to access objects in the diagram
+    link_report -- a LinkReport listing dangling connections and duplicate object IDs
+    graph -- a ConnectionGraph instance indexing the connections between objects
+    geometry -- a GeometryComponent holding object positions and bounding boxes as arrays
+    spatial -- a SpatialComponent for region, point and nearest object queries
+    text -- a TextComponent for finding objects by their text
+    stats -- a ParseStats instance measuring the parse, when asked for with
+             ParseOptions(stats=True), otherwise None
     '''
 
+    diagram_data = None
     layers = None
     object_map = None
     layer_map = None
+    link_report = None
+    # Filled in by reparse
+    fingerprints = None
+    # Filled in by parse_dia_file
+    stats = None
 
     def __init__(self, diagram_data, layers):
         self.objects = ObjectsComponent(self)
+        self.graph = ConnectionGraph(self)
+        self.geometry = GeometryComponent(self)
+        self.spatial = SpatialComponent(self)
+        self.text = TextComponent(self)
+        self.object_map = {}
+        self.set_content(diagram_data, layers)
+
+    def set_content(self, diagram_data, layers, link_report=None):
+        '''Replaces the diagram data and layers, relinking the connections and
+        discarding any indexes built so far.
+
+        If a LinkReport is given, the connections are taken to be linked
+        already and object_map to be filled in (as done by load_snapshot).'''
+
+        self.diagram_data = diagram_data
         self.layers = list(layers)
         for layer in self.layers:
             layer.diagram = self
-        self.object_map = {
-            obj.obj_id : obj
-            for obj in self.objects
-        }
+        self.link_report = link_report if link_report is not None else link_connections(self)
         self.layer_map = {
             layer.name : layer
             for layer in self.layers
         }
+        self.objects.invalidate()
+        self.graph.invalidate()
+        self.geometry.invalidate()
+        self.spatial.invalidate()
+        self.text.invalidate()
 
     def __iter__(self):
         '''Returns an iterator over the layers in this diagram'''
@@ -85,6 +185,14 @@ class Diagram:
             pass
         raise KeyError('no such layer: ' + name)
 
+    def select(self, **criteria):
+        '''Returns the list of objects matching the given criteria (see Selector), eg
+
+        diagram.select(type='UML - Class', layer='Background', where={'text.string' : '#Order#'})
+        '''
+
+        return Selector(**criteria).select(self)
+
     @property
     def nodes(self):
         '''An iterator over all nodes (objects and groups) in this diagram'''
@@ -93,6 +201,56 @@ class Diagram:
             yield from layer.iter_nodes()
 
 
+class LinkReport:
+    '''The outcome of linking the connections in a diagram.
+
+    Attributes:
+    dangling -- list of Connection instances whose to_id matches no object
+    duplicate_ids -- dictionary mapping each object ID used more than once to the objects sharing it
+    '''
+
+    def __init__(self, dangling=None, duplicate_ids=None):
+        self.dangling = dangling or []
+        self.duplicate_ids = duplicate_ids or {}
+
+    def __bool__(self):
+        '''True iff the diagram linked cleanly'''
+
+        return not self.dangling and not self.duplicate_ids
+
+    def __repr__(self):
+        return '<LinkReport dangling={} duplicate_ids={}>'.format(
+            len(self.dangling),
+            len(self.duplicate_ids)
+        )
+
+
+def link_connections(diagram):
+    '''Fills diagram.object_map and points every Connection.target at the
+    object it is attached to, so that Connection.to needs no lookup.
+
+    When an ID is shared by several objects the last one wins (as it does for
+    lookups by ID). Returns a LinkReport.'''
+
+    object_map = diagram.object_map
+    object_map.clear()
+    duplicate_ids = {}
+    for obj in diagram.objects:
+        other = object_map.get(obj.obj_id)
+        if other is not None:
+            duplicate_ids.setdefault(obj.obj_id, [other]).append(obj)
+        object_map[obj.obj_id] = obj
+
+    dangling = []
+    for obj in diagram.objects:
+        for conn in obj.connections_by_handle.values():
+            conn.target = object_map.get(conn.to_id)
+            if conn.target is None:
+                dangling.append(conn)
+
+    return LinkReport(dangling, duplicate_ids)
+
+
 class DiagramData:
     attributes = None
 
@@ -101,28 +259,38 @@ class DiagramData:
         self.attributes = attributes
 
 
-def parse_diagramdata(diagramdata_node):
+def parse_diagramdata(diagramdata_node, options=None):
     return DiagramData(
-        parse_attributes(diagramdata_node)
+        decode_attributes(diagramdata_node, options)
     )
 
 
-def parse_diagram(diagram_node):
+def parse_diagram(diagram_node, options=None):
     '''Return a Diagram instance given an XML node'''
 
     node = diagram_node.find(NS + 'diagramdata')
     if node:
-        diagram_data = parse_diagramdata(node)
+        diagram_data = parse_diagramdata(node, options)
     else:
         diagram_data = DiagramData({})
 
     layers = (
-        parse_layer(node)
+        parse_layer(node, options)
         for node in diagram_node.findall(NS + 'layer')
     )
 
-    return Diagram(
-        diagram_data,
-        layers
-    )
+    stats = options and options.collector
+    if stats is None:
+        return Diagram(
+            diagram_data,
+            layers
+        )
+
+    with stats.phase('build'):
+        layers = list(layers)
+    with stats.phase('link'):
+        return Diagram(
+            diagram_data,
+            layers
+        )
 
@@ -0,0 +1,204 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import math
+from array import array
+
+_NAN = float('nan')
+
+
+class GeometryComponent:
+    '''A struct-of-arrays view of the geometry of the objects in a diagram.
+
+    Row i of every array describes the object objects[i]. Only objects with an
+    obj_pos or obj_bb attribute get a row. Missing values are stored as NaN.
+    The arrays are built in a single pass the first time they are used (call
+    invalidate() after changing the diagram).
+
+    Attributes:
+    objects -- list of the objects having a row
+    index -- array of ints, the position of each object in diagram.objects
+    positions -- array of doubles, two (x, y) per row, from obj_pos
+    bboxes -- array of doubles, four (left, top, right, bottom) per row, from obj_bb
+    widths -- array of doubles, from elem_width
+    heights -- array of doubles, from elem_height
+
+    The arrays are contiguous, so as_numpy() can wrap them without copying.
+    '''
+
+    def __init__(self, diagram):
+        self.diagram = diagram
+        self._built = False
+
+    def invalidate(self):
+        '''Discards the arrays so they are rebuilt on next use'''
+
+        self._built = False
+
+    def _build(self):
+        objects = []
+        index = array('q')
+        positions = array('d')
+        bboxes = array('d')
+        widths = array('d')
+        heights = array('d')
+
+        for n, obj in enumerate(self.diagram.objects):
+            attributes = obj.attributes
+            if not attributes:
+                continue
+            pos = attributes.get('obj_pos')
+            bb = attributes.get('obj_bb')
+            if pos is None and bb is None:
+                continue
+
+            objects.append(obj)
+            index.append(n)
+            positions.extend(pos if pos is not None else (_NAN, _NAN))
+            bboxes.extend(bb if bb is not None else (_NAN, _NAN, _NAN, _NAN))
+            width = attributes.get('elem_width')
+            widths.append(width if width is not None else _NAN)
+            height = attributes.get('elem_height')
+            heights.append(height if height is not None else _NAN)
+
+        self._objects = objects
+        self._index = index
+        self._positions = positions
+        self._bboxes = bboxes
+        self._widths = widths
+        self._heights = heights
+        self._built = True
+
+    def __getstate__(self):
+        # The arrays are rebuilt after unpickling, since they may be views of
+        # a memory-mapped snapshot (see set_arrays)
+        return {'diagram' : self.diagram, '_built' : False}
+
+    def set_arrays(self, objects, index, positions, bboxes, widths, heights):
+        '''Installs arrays built elsewhere (eg loaded from a snapshot) instead
+        of building them from the attributes. Any buffer of the right item
+        type will do in place of an array.'''
+
+        self._objects = objects
+        self._index = index
+        self._positions = positions
+        self._bboxes = bboxes
+        self._widths = widths
+        self._heights = heights
+        self._built = True
+
+    def _get(self, name):
+        if not self._built:
+            self._build()
+        return getattr(self, name)
+
+    @property
+    def objects(self):
+        return self._get('_objects')
+
+    @property
+    def index(self):
+        return self._get('_index')
+
+    @property
+    def positions(self):
+        return self._get('_positions')
+
+    @property
+    def bboxes(self):
+        return self._get('_bboxes')
+
+    @property
+    def widths(self):
+        return self._get('_widths')
+
+    @property
+    def heights(self):
+        return self._get('_heights')
+
+    def __len__(self):
+        return len(self.objects)
+
+    def bbox(self, row):
+        '''Returns the (left, top, right, bottom) tuple for the given row'''
+
+        return tuple(self.bboxes[row * 4:row * 4 + 4])
+
+    def bounds(self):
+        '''Returns the (left, top, right, bottom) box enclosing every bounding
+        box, or None if no object has one'''
+
+        bboxes = self.bboxes
+        rows = [
+            row for row in range(len(bboxes) // 4)
+            if not math.isnan(bboxes[row * 4])
+        ]
+        if not rows:
+            return None
+        return (
+            min(bboxes[row * 4] for row in rows),
+            min(bboxes[row * 4 + 1] for row in rows),
+            max(bboxes[row * 4 + 2] for row in rows),
+            max(bboxes[row * 4 + 3] for row in rows),
+        )
+
+    def areas(self):
+        '''Returns an array holding the bounding box area of each row (NaN if missing)'''
+
+        bboxes = self.bboxes
+        return array('d', (
+            (right - left) * (bottom - top)
+            for left, top, right, bottom in zip(bboxes[0::4], bboxes[1::4], bboxes[2::4], bboxes[3::4])
+        ))
+
+    def filter_area(self, min_area=None, max_area=None):
+        '''Returns the objects whose bounding box area lies within the given
+        (inclusive) limits. Objects without a bounding box are left out.'''
+
+        if min_area is None: min_area = float('-inf')
+        if max_area is None: max_area = float('inf')
+        objects = self.objects
+        return [
+            objects[row]
+            for row, area in enumerate(self.areas())
+            if min_area <= area <= max_area
+        ]
+
+    def as_numpy(self):
+        '''Returns a dictionary of numpy arrays sharing memory with the arrays
+        here: index (n), positions (n x 2), bboxes (n x 4), widths and heights
+        (n). Requires numpy to be installed.'''
+
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError('numpy is required for GeometryComponent.as_numpy()') from None
+
+        def wrap(data, dtype, columns=None):
+            values = numpy.frombuffer(data, dtype=dtype) if len(data) else numpy.empty(0, dtype)
+            if columns:
+                values = values.reshape(-1, columns)
+            return values
+
+        return {
+            'index' : wrap(self.index, numpy.int64),
+            'positions' : wrap(self.positions, numpy.float64, 2),
+            'bboxes' : wrap(self.bboxes, numpy.float64, 4),
+            'widths' : wrap(self.widths, numpy.float64),
+            'heights' : wrap(self.heights, numpy.float64),
+        }
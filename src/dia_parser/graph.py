@@ -0,0 +1,339 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+from collections import deque
+
+
+class CycleError(ValueError):
+    '''Raised when a topological order is asked for a graph with a cycle.
+
+    Attributes:
+    cycle -- list of the objects on one cycle, in order
+    '''
+
+    def __init__(self, cycle):
+        super().__init__('the diagram contains a cycle of {} objects'.format(len(cycle)))
+        self.cycle = cycle
+
+
+class ConnectionGraph:
+    '''Adjacency tables for the connections in a diagram.
+
+    The tables are built in a single pass over the diagram objects the first
+    time they are needed, after which each query costs O(degree). Call
+    invalidate() after changing the objects or connections of the diagram.
+
+    The graph algorithms treat the diagram as a directed graph. The vertices
+    are the objects that are not lines, plus any line that another line is
+    connected to. Each line connected at both ends is an edge from the object
+    at its tail to the object at its head. They all run in time linear in the
+    number of objects and lines, without recursion.
+    '''
+
+    def __init__(self, diagram):
+        self.diagram = diagram
+        self.invalidate()
+
+    def invalidate(self):
+        '''Discards the tables so they are rebuilt on next use'''
+
+        self._outbound = None
+        self._inbound = None
+        self._attached = None
+        self._nodes = None
+        self._successors = None
+        self._predecessors = None
+
+    def _build(self):
+        object_map = self.diagram.object_map
+        outbound = {}
+        inbound = {}
+        attached = {}
+        # Dictionaries with None values serve as ordered sets
+        nodes = {}
+        successors = {}
+        predecessors = {}
+
+        def resolve(conn):
+            if not conn:
+                return None
+            return object_map.get(conn.to_id)
+
+        for obj in self.diagram.objects:
+            for conn in obj.connections_by_handle.values():
+                target = resolve(conn)
+                if target is None:
+                    continue
+                sources = attached.get(target)
+                if sources is None:
+                    attached[target] = [obj]
+                elif sources[-1] is not obj:
+                    sources.append(obj)
+
+            if not obj.is_line:
+                nodes[obj] = None
+                continue
+
+            line = obj.as_line
+            from_obj = resolve(line.connection_from)
+            to_obj = resolve(line.connection_to)
+            if from_obj is not None:
+                entries = outbound.get(from_obj)
+                if entries is None:
+                    entries = outbound[from_obj] = []
+                entries.append((obj, to_obj))
+            if to_obj is not None:
+                entries = inbound.get(to_obj)
+                if entries is None:
+                    entries = inbound[to_obj] = []
+                entries.append((obj, from_obj))
+            if from_obj is not None and to_obj is not None:
+                targets = successors.get(from_obj)
+                if targets is None:
+                    targets = successors[from_obj] = {}
+                targets[to_obj] = None
+                sources = predecessors.get(to_obj)
+                if sources is None:
+                    sources = predecessors[to_obj] = {}
+                sources[from_obj] = None
+
+        # Lines connected to other lines take part as vertices too
+        for obj in list(successors) + list(predecessors):
+            nodes[obj] = None
+
+        self._outbound = outbound
+        self._inbound = inbound
+        self._attached = attached
+        self._nodes = nodes
+        self._successors = successors
+        self._predecessors = predecessors
+
+    def outbound(self, obj):
+        '''A list of (line, to_obj) tuples where line connects from obj to to_obj'''
+
+        if self._outbound is None:
+            self._build()
+        return list(self._outbound.get(obj, ()))
+
+    def inbound(self, obj):
+        '''A list of (line, from_obj) tuples where line connects from from_obj to obj'''
+
+        if self._inbound is None:
+            self._build()
+        return list(self._inbound.get(obj, ()))
+
+    def outbound_lines(self, obj):
+        '''A list of lines connected to obj via their tails'''
+
+        return [line for line, _ in self.outbound(obj)]
+
+    def inbound_lines(self, obj):
+        '''A list of lines connected to obj via their heads'''
+
+        return [line for line, _ in self.inbound(obj)]
+
+    def connected_to(self, obj):
+        '''The list of objects having a connection attached to obj'''
+
+        if self._attached is None:
+            self._build()
+        return list(self._attached.get(obj, ()))
+
+    def _adjacency(self, reverse=False):
+        if self._nodes is None:
+            self._build()
+        return self._predecessors if reverse else self._successors
+
+    def nodes(self):
+        '''The list of vertices of the graph, in diagram order'''
+
+        if self._nodes is None:
+            self._build()
+        return list(self._nodes)
+
+    def successors(self, obj):
+        '''The distinct objects reached from obj by one line'''
+
+        return list(self._adjacency().get(obj, ()))
+
+    def predecessors(self, obj):
+        '''The distinct objects reaching obj by one line'''
+
+        return list(self._adjacency(reverse=True).get(obj, ()))
+
+    def bfs(self, start, reverse=False):
+        '''Returns an iterator over the objects reachable from start (itself
+        included) in breadth first order. With reverse=True the lines are
+        followed backwards.'''
+
+        adjacency = self._adjacency(reverse)
+        seen = {start}
+        queue = deque((start,))
+        while queue:
+            obj = queue.popleft()
+            yield obj
+            for other in adjacency.get(obj, ()):
+                if other not in seen:
+                    seen.add(other)
+                    queue.append(other)
+
+    def dfs(self, start, reverse=False):
+        '''Returns an iterator over the objects reachable from start (itself
+        included) in depth first pre-order. With reverse=True the lines are
+        followed backwards.'''
+
+        adjacency = self._adjacency(reverse)
+        seen = set()
+        stack = [start]
+        while stack:
+            obj = stack.pop()
+            if obj in seen:
+                continue
+            seen.add(obj)
+            yield obj
+            # Reversed, so that the first successor is visited first
+            stack.extend(reversed(list(adjacency.get(obj, ()))))
+
+    def descendants(self, obj):
+        '''The set of objects reachable from obj (not counting obj itself,
+        unless it is on a cycle)'''
+
+        return self._reach(obj, False)
+
+    def ancestors(self, obj):
+        '''The set of objects from which obj is reachable (not counting obj
+        itself, unless it is on a cycle)'''
+
+        return self._reach(obj, True)
+
+    def _reach(self, start, reverse):
+        adjacency = self._adjacency(reverse)
+        found = set()
+        stack = [start]
+        while stack:
+            for other in adjacency.get(stack.pop(), ()):
+                if other not in found:
+                    found.add(other)
+                    stack.append(other)
+        return found
+
+    def has_path(self, source, target):
+        '''True iff target can be reached from source (always true when they are the same)'''
+
+        return self.shortest_path(source, target) is not None
+
+    def shortest_path(self, source, target):
+        '''Returns a list of objects from source to target along the fewest
+        lines, or None if target cannot be reached'''
+
+        adjacency = self._adjacency()
+        previous = {source: None}
+        queue = deque((source,))
+        while queue:
+            obj = queue.popleft()
+            if obj is target:
+                path = []
+                while obj is not None:
+                    path.append(obj)
+                    obj = previous[obj]
+                path.reverse()
+                return path
+            for other in adjacency.get(obj, ()):
+                if other not in previous:
+                    previous[other] = obj
+                    queue.append(other)
+        return None
+
+    def topological_sort(self):
+        '''Returns the vertices ordered so that every line points forward.
+        Ties are broken by diagram order. Throws CycleError if there is no such
+        order.'''
+
+        successors = self._adjacency()
+        nodes = self._nodes
+        in_degree = {obj : 0 for obj in nodes}
+        for targets in successors.values():
+            for obj in targets:
+                in_degree[obj] += 1
+
+        ready = deque(obj for obj in nodes if in_degree[obj] == 0)
+        order = []
+        while ready:
+            obj = ready.popleft()
+            order.append(obj)
+            for other in successors.get(obj, ()):
+                in_degree[other] -= 1
+                if in_degree[other] == 0:
+                    ready.append(other)
+
+        if len(order) < len(nodes):
+            raise CycleError(self._cycle_among(
+                [obj for obj in nodes if in_degree[obj] > 0]
+            ))
+        return order
+
+    def find_cycle(self):
+        '''Returns the list of objects on a cycle, or None if the graph has none'''
+
+        try:
+            self.topological_sort()
+        except CycleError as ex:
+            return ex.cycle
+        return None
+
+    def _cycle_among(self, candidates):
+        '''Finds a cycle among the vertices left over by a topological sort.
+        Every one of them has a predecessor that is also left over, so walking
+        backwards must run into a vertex already seen.'''
+
+        predecessors = self._adjacency(reverse=True)
+        remaining = set(candidates)
+        position = {}
+        path = []
+        obj = candidates[0]
+        while obj not in position:
+            position[obj] = len(path)
+            path.append(obj)
+            obj = next(other for other in predecessors[obj] if other in remaining)
+        cycle = path[position[obj]:]
+        cycle.reverse()
+        return cycle
+
+    def connected_components(self):
+        '''Returns a list of the (weakly) connected components, each a list of
+        objects. Lines are followed in either direction.'''
+
+        successors = self._adjacency()
+        predecessors = self._adjacency(reverse=True)
+        seen = set()
+        components = []
+        for start in self._nodes:
+            if start in seen:
+                continue
+            seen.add(start)
+            component = [start]
+            stack = [start]
+            while stack:
+                obj = stack.pop()
+                for adjacency in (successors, predecessors):
+                    for other in adjacency.get(obj, ()):
+                        if other not in seen:
+                            seen.add(other)
+                            component.append(other)
+                            stack.append(other)
+            components.append(component)
+        return components
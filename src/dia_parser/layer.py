@@ -19,14 +19,43 @@
 import typing
 
 from .ns import NS
+from .options import DEFAULT_OPTIONS
 from .obj import parse_object, Node
-from .attributes import parse_attributes
+from .attributes import decode_attributes
+
+_OBJECT_TAG = NS + 'object'
+_GROUP_TAG = NS + 'group'
+
 
 class GroupBase:
+    __slots__ = ('children',)
+
     def __init__(self, children):
+        self.set_children(children)
+
+    def set_children(self, children):
+        '''Replaces the children, making this node their parent and pointing
+        them (and everything under them) at the layer containing this node'''
+
         self.children = list(children)
-        for node in self.children:
+        for z, node in enumerate(self.children):
             node.parent = self
+            node._z = z
+        _set_layer(self.children, self._own_layer())
+
+    def replace_child(self, old, new):
+        '''Puts new in the place of the child old, making this node its parent'''
+
+        z = self.children.index(old)
+        self.children[z] = new
+        new.parent = self
+        new._z = z
+        _set_layer((new,), self._own_layer())
+
+    def _own_layer(self):
+        '''The layer containing this node (None when it is not in one)'''
+
+        return None
 
     def __iter__(self):
         '''Returns an iterator over all children'''
@@ -34,41 +63,90 @@ class GroupBase:
         return iter(self.children)
 
     def iter_nodes(self):
-        '''Returns an iterator over all nodes (objects and groups)'''
+        '''Returns an iterator over all nodes (objects and groups) below this
+        one, each group followed by its contents'''
 
-        for child in self.children:
-            yield child
-            if hasattr(child, 'children'):
-                yield from child.iter_objects()
+        # A stack of iterators rather than nested generators, so the cost of
+        # each node does not grow with the depth of the groups
+        stack = [iter(self.children)]
+        while stack:
+            for child in stack[-1]:
+                yield child
+                children = getattr(child, 'children', None)
+                if children is not None:
+                    stack.append(iter(children))
+                    break
+            else:
+                stack.pop()
 
     def iter_objects(self):
-        for child in self.children:
-            if hasattr(child, 'children'):
-                yield from child.iter_objects()
-            else:
+        '''Returns an iterator over all objects below this node, at any depth'''
+
+        stack = [iter(self.children)]
+        while stack:
+            for child in stack[-1]:
+                children = getattr(child, 'children', None)
+                if children is not None:
+                    stack.append(iter(children))
+                    break
                 yield child
+            else:
+                stack.pop()
+
+
+def _set_layer(nodes, layer):
+    '''Points the given nodes and everything under them at a layer. A node
+    already pointing there is taken to have its contents pointing there too.'''
+
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        if node._layer is layer:
+            continue
+        node._layer = layer
+        children = getattr(node, 'children', None)
+        if children:
+            stack.extend(children)
 
 
 class Group(GroupBase, Node):
     '''Represents a dia group node.'''
 
-    attributes = None
-    parent = None
+    __slots__ = ('parent', '_layer', '_z', 'attributes')
 
     def __init__(self, children, attributes=None):
+        self.parent = None
+        self._layer = None
+        self._z = 0
         super().__init__(children)
         if not attributes: attributes = {}
         self.attributes = attributes
 
+    def _own_layer(self):
+        return self._layer
+
+    def __getstate__(self):
+        # Inside a layer the parent and children are restored by the layer
+        # (see Layer.__getstate__), so deep nesting is not pickled by recursion
+        if self._layer is not None:
+            return (self._layer, self.attributes)
+        return (self._layer, self.attributes, self.parent, self.children)
+
+    def __setstate__(self, state):
+        self._layer, self.attributes = state[:2]
+        if len(state) > 2:
+            self.parent, self.children = state[2:]
+            self._z = 0
+
 
 class Layer(GroupBase):
     '''Represents a dia layer node.'''
 
-    name = ''
-    diagram = None
+    __slots__ = ('name', 'diagram', 'visible', 'connectable', 'active')
 
     def __init__(self, children, name='', visible=False, connectable=False, active=False):
         super().__init__(children=children)
+        self.diagram = None
         self.name = name
         self.visible = visible
         self.connectable = connectable
@@ -78,32 +156,108 @@ class Layer(GroupBase):
     def is_layer(self):
         return True
 
+    def _own_layer(self):
+        return self
 
-def parse_group_base(parent_node):
-    '''Returns a tuple (Object list, Group list, Attribute dict) from the given top-level XML node'''
+    def __getstate__(self):
+        # The nodes in pre-order, with the number of children of each (-1 for
+        # objects), rather than the nested lists of children
+        nodes = list(self.iter_nodes())
+        counts = [
+            len(node.children) if isinstance(node, Group) else -1
+            for node in nodes
+        ]
+        return (
+            self.name,
+            self.diagram,
+            self.visible,
+            self.connectable,
+            self.active,
+            len(self.children),
+            nodes,
+            counts,
+        )
 
-    children = []
+    def __setstate__(self, state):
+        (
+            self.name,
+            self.diagram,
+            self.visible,
+            self.connectable,
+            self.active,
+            count,
+            nodes,
+            counts,
+        ) = state
 
-    for node in parent_node.findall(NS + 'object'):
-        children.append(
-            parse_object(node)
-        )
+        # Each entry is (node, its number of children, the children found so far)
+        stack = [(self, count, [])]
+        for node, count in zip(nodes, counts):
+            while len(stack[-1][2]) == stack[-1][1]:
+                self._restore_children(*stack.pop())
+            stack[-1][2].append(node)
+            if count >= 0:
+                stack.append((node, count, []))
+        while stack:
+            self._restore_children(*stack.pop())
 
-    for node in parent_node.findall(NS + 'group'):
-        children.append(
-            parse_group(node)
-        )
+    def _restore_children(self, parent, count, children):
+        # Set directly rather than with set_children, since the groups may not
+        # have been given their own state yet
+        parent.children = children
+        for z, node in enumerate(children):
+            node.parent = parent
+            node._layer = self
+            node._z = z
+
+
+def parse_group_base(parent_node, options=None):
+    '''Returns a tuple (children, Attribute dict) from the given top-level XML
+    node, where children is the list of objects and groups in document order
+    (ie stacking order, from the bottom up)'''
+
+    if options is None: options = DEFAULT_OPTIONS
 
     return (
-        children,
-        parse_attributes(parent_node),
+        _parse_children(parent_node, options),
+        decode_attributes(parent_node, options),
     )
 
 
-def parse_layer(layer_node):
+def _parse_children(parent_node, options):
+    '''Returns the objects and groups under an XML node, in document order.
+    Nested groups are built with an explicit stack rather than by recursion,
+    so there is no limit on how deeply they can be nested.'''
+
+    children = []
+    # Each entry is (iterator over the remaining child elements, the children
+    # found so far, the group element or None for the top level)
+    stack = [(iter(parent_node), children, None)]
+    while stack:
+        nodes, found, group_node = stack[-1]
+        for node in nodes:
+            tag = node.tag
+            if tag == _OBJECT_TAG:
+                if options.wants_type(node.attrib['type']):
+                    found.append(parse_object(node, options))
+            elif tag == _GROUP_TAG:
+                stack.append((iter(node), [], node))
+                break
+        else:
+            stack.pop()
+            if group_node is not None:
+                stack[-1][1].append(Group(
+                    children=found,
+                    attributes=decode_attributes(group_node, options),
+                ))
+
+    return children
+
+
+def parse_layer(layer_node, options=None):
     '''Returns a Layer instance given a layer XML node'''
 
-    children, _ = parse_group_base(layer_node)
+    children, _ = parse_group_base(layer_node, options)
 
     return Layer(
         children=children,
@@ -114,10 +268,10 @@ def parse_layer(layer_node):
     )
 
 
-def parse_group(group_node):
+def parse_group(group_node, options=None):
     '''Returns a Group instance given a group XML node'''
 
-    children, attributes = parse_group_base(group_node)
+    children, attributes = parse_group_base(group_node, options)
 
     return Group(
         children=children,
@@ -16,13 +16,20 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
+from types import MappingProxyType
+
 from .ns import NS
-from .attributes import parse_attributes
+from .attributes import decode_attributes
+
+# Shared by every object without connections, rather than an empty dict each
+_NO_CONNECTIONS = MappingProxyType({})
 
 
 class LineComponent:
     '''Provides methods for interpreting/treating a dia object as a line'''
 
+    __slots__ = ('obj',)
+
     def __init__(self, obj):
         self.obj = obj
 
@@ -67,13 +74,46 @@ class LineComponent:
 class Node:
     '''A node is the common base class to a dia object, and a dia group'''
 
-    parent = None
+    # Subclasses provide the 'parent', '_layer' and '_z' slots, which are
+    # kept up to date by GroupBase.set_children
+    __slots__ = ()
 
     @property
-    def layer(self):
-        '''The layer containing this object'''
+    def z_index(self):
+        '''The stacking position of this node among the children of its parent
+        (0 is at the bottom, drawn first), or None if it has no parent'''
 
-        node = self.parent
+        parent = self.parent
+        if parent is None:
+            return None
+        children = parent.children
+        z = self._z
+        if z < len(children) and children[z] is self:
+            return z
+        # The children were changed by hand
+        z = self._z = children.index(self)
+        return z
+
+    @property
+    def layer(self):
+        '''The layer containing this object.
+
+        Nodes remember their layer when attached with set_children or
+        replace_child. The remembered layer is used while it agrees with the
+        parent, so a node moved by hand (by changing its parent) is found by
+        walking up instead. Moving a group by hand leaves the nodes below it
+        pointing at its old layer; call set_children on the new parent to
+        bring them up to date.'''
+
+        layer = self._layer
+        parent = self.parent
+        if layer is not None and parent is not None and (
+            parent is layer or getattr(parent, '_layer', None) is layer
+        ):
+            return layer
+
+        # Not attached with set_children (eg appended by hand), so walk up
+        node = parent
         while node:
             if hasattr(node, 'is_layer') and node.is_layer:
                 return node
@@ -86,8 +126,9 @@ class Node:
     def diagram(self):
         '''The diagram containing this object'''
 
-        if self.layer:
-            return self.layer.diagram
+        layer = self.layer
+        if layer is not None:
+            return layer.diagram
         return None
 
 
@@ -98,16 +139,21 @@ class Object(Node):
     id -- the object ID (unique across the diagram)
     type -- a string describing the type (eg "Flowchart - Box")
     version -- the version
-    attributes -- a dictionary of attributes on the object
+    attributes -- a dictionary (or LazyAttributes mapping) of attributes on the object
     parent -- the parent to this object (ie Layer or Group instance)
     '''
 
-    obj_id = ''
-    obj_type = ''
-    version = ''
-    attributes = None
-    connection_by_handle = None
-    _line = None
+    __slots__ = (
+        'parent',
+        '_layer',
+        '_z',
+        'obj_id',
+        'obj_type',
+        'version',
+        'attributes',
+        'connections_by_handle',
+        '_line',
+    )
 
     def __init__(
         self,
@@ -117,20 +163,52 @@ class Object(Node):
         attributes=None,
         connections=None
     ):
+        self.parent = None
+        self._layer = None
+        self._z = 0
         self.obj_id = obj_id
         self.obj_type = obj_type
         self.version = version
         self.attributes = attributes
+        self._line = None
 
-        if not connections: connections = []
+        if not connections:
+            self.connections_by_handle = _NO_CONNECTIONS
+            return
 
         self.connections_by_handle = {}
         for conn in connections:
             conn.obj = self
             self.connections_by_handle[conn.handle] = conn
 
-        if self.is_line:
-            self._line = LineComponent(self)
+    def __getstate__(self):
+        # A plain tuple keeps pickles small (see parse_dia_files)
+        connections_by_handle = self.connections_by_handle
+        if connections_by_handle is _NO_CONNECTIONS:
+            connections_by_handle = None
+        return (
+            self.parent,
+            self._layer,
+            self.obj_id,
+            self.obj_type,
+            self.version,
+            self.attributes,
+            connections_by_handle,
+        )
+
+    def __setstate__(self, state):
+        (
+            self.parent,
+            self._layer,
+            self.obj_id,
+            self.obj_type,
+            self.version,
+            self.attributes,
+            connections_by_handle,
+        ) = state
+        self.connections_by_handle = connections_by_handle or _NO_CONNECTIONS
+        self._z = 0
+        self._line = None
 
     def __repr__(self):
         return '<Object id="{}" type="{}" is_line={}>'.format(
@@ -171,6 +249,8 @@ class Object(Node):
 
         if not self.is_line:
             raise ValueError('object is not a line')
+        if self._line is None:
+            self._line = LineComponent(self)
         return self._line
 
     @property
@@ -192,47 +272,31 @@ class Object(Node):
     def outbound_lines(self):
         '''A list of lines connected to this object via their tails'''
 
-        return [
-            line_obj
-            for line_obj in self.diagram.objects.filter_lines()
-            if line_obj.as_line.connected_from == self
-        ]
+        return self.diagram.graph.outbound_lines(self)
 
     @property
     def inbound_lines(self):
         '''A list of lines connected to this object via their heads'''
 
-        return [
-            line_obj
-            for line_obj in self.diagram.objects.filter_lines()
-            if line_obj.as_line.connected_to == self
-        ]
+        return self.diagram.graph.inbound_lines(self)
 
     @property
     def outbound(self):
         '''A list of (line, to_obj) tuples where line connects from this object to to_obj'''
 
-        return [
-            (line_obj, line_obj.as_line.connected_to) for line_obj in self.outbound_lines
-        ]
+        return self.diagram.graph.outbound(self)
 
     @property
     def inbound(self):
         '''A list of (line, from_obj) tuples where line connects from from_obj to this object'''
 
-        return [
-            (line_obj, line_obj.as_line.connected_from) for line_obj in self.inbound_lines
-        ]
+        return self.diagram.graph.inbound(self)
 
     @property
     def connected_to_this(self):
         '''The list of objects connected to this object'''
 
-        return [
-            obj
-            for obj in self.diagram.objects
-            if self in (conn.to for conn in obj.connections)
-        ]
+        return self.diagram.graph.connected_to(self)
 
 
 class Connection:
@@ -243,15 +307,15 @@ class Connection:
     handle -- the handle number of of this connection, used to identify where on the source object the connection is
     to_id -- the (target) object ID to which this connection is attached
     connection -- the connection point (number) on the attached object
+    target -- the attached object, once the diagram has been linked (see link_connections)
     '''
 
-    obj = None
-    handle = None
-    to_id = ''
-    connection = 0
+    __slots__ = ('obj', 'handle', 'to_id', 'connection', 'target')
 
     def __init__(self, handle=None, to_id='', connection=0):
         assert handle != None and type(handle) == int
+        self.obj = None
+        self.target = None
         self.handle = handle
         self.to_id = to_id
         self.connection = connection
@@ -260,6 +324,8 @@ class Connection:
     def to(self):
         '''The object instance pointed to by this connection'''
 
+        if self.target is not None:
+            return self.target
         return self.obj.diagram.objects[self.to_id]
 
 
@@ -282,12 +348,12 @@ def parse_connections(obj_node):
     ]
 
 
-def parse_object(obj_node):
+def parse_object(obj_node, options=None):
     return Object(
         obj_id=obj_node.attrib['id'],
         obj_type=obj_node.attrib['type'],
         version=obj_node.attrib['version'],
-        attributes=parse_attributes(obj_node),
+        attributes=decode_attributes(obj_node, options),
         connections=parse_connections(obj_node),
     )
 
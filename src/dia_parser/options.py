@@ -0,0 +1,93 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import copy
+
+# The attributes that identify a line (see Object.is_line). These are always
+# decoded, even when attributes are projected, so line detection keeps working.
+LINE_ATTRIBUTES = frozenset((
+    'conn_endpoints',
+    'orth_points',
+    'bez_points',
+    'poly_points',
+))
+
+class ParseOptions:
+    '''Settings that control how a diagram is parsed.
+
+    Attributes:
+    lazy -- if true, attribute values are decoded the first time they are read
+            rather than while parsing (see LazyAttributes)
+    attributes -- if given, the names of the attributes to decode (eg
+                  ['text', 'obj_bb']). Any others are skipped without being
+                  decoded. The line attributes (LINE_ATTRIBUTES) are always kept.
+    types -- if given, the object types to create (eg ['Flowchart - Box']).
+             Objects of any other type are skipped. Groups are always kept.
+    stats -- if true, the time and memory of each parse phase are measured
+             and the diagram contents counted, in a ParseStats instance
+             stored as Diagram.stats
+    on_stats -- if given, a function called with the ParseStats instance
+                once each parse is done (implies stats)
+    '''
+
+    # The ParseStats instance being filled in, set only on the copy of the
+    # options made for each measured parse (see collecting)
+    collector = None
+
+    def __init__(self, lazy=False, attributes=None, types=None, stats=False, on_stats=None):
+        self.lazy = lazy
+        self.attributes = None
+        self.types = None
+        self.stats = bool(stats or on_stats)
+        self.on_stats = on_stats
+        if attributes is not None:
+            self.attributes = frozenset(attributes) | LINE_ATTRIBUTES
+        if types is not None:
+            self.types = frozenset(types)
+
+    def __repr__(self):
+        return '<ParseOptions lazy={} attributes={} types={} stats={}>'.format(
+            self.lazy,
+            self.attributes and sorted(self.attributes),
+            self.types and sorted(self.types),
+            self.stats,
+        )
+
+    def cache_key(self):
+        '''Returns a hashable value that differs whenever the parsed result would'''
+
+        return (
+            self.lazy,
+            self.attributes and tuple(sorted(self.attributes)),
+            self.types and tuple(sorted(self.types)),
+        )
+
+    def collecting(self, stats):
+        '''Returns a copy of these options that records into the given ParseStats instance'''
+
+        options = copy.copy(self)
+        options.collector = stats
+        return options
+
+    def wants_type(self, obj_type):
+        '''Returns true iff objects of the given type should be created'''
+
+        return self.types is None or obj_type in self.types
+
+
+DEFAULT_OPTIONS = ParseOptions()
@@ -21,6 +21,10 @@ from xml.etree import ElementTree
 
 from .ns import NS
 from .diagram import parse_diagram
+from .options import ParseOptions
+from .source import iter_xml_chunks
+from .stats import ParseStats
+from .stream import stream_diagram
 
 def read_gzip_file(src):
     return gzip.open(src).read()
@@ -28,19 +32,67 @@ def read_gzip_file(src):
 def read_dia_file(src):
     '''Reads a .dia file (compressed or uncompressed) and returns the XML data as a string'''
 
-    try:
-        xml_data = read_gzip_file(src)
-    except OSError:
-        xml_data = open(src, 'rb').read()
+    return b''.join(iter_xml_chunks(src)).decode('utf-8')
 
-    xml_data = xml_data.decode('utf-8')
-    assert xml_data.lower().startswith('<?xml'), 'not a valid xml file'
-    return xml_data
+def parse_dia_xml(src, stats=None):
+    '''Parses a .dia source (see iter_xml_chunks) and returns the root XML element.
+    The raw bytes are fed straight to the XML parser, without decoding to a string first.
+    If a ParseStats instance is given, the read and xml phases are recorded in it.'''
 
-def parse_dia_file(src):
-    xml_data = read_dia_file(src)
-
-    root = ElementTree.fromstring(xml_data)
+    parser = ElementTree.XMLParser()
+    if stats is None:
+        for chunk in iter_xml_chunks(src):
+            parser.feed(chunk)
+        root = parser.close()
+    else:
+        for chunk in stats.timed('read', iter_xml_chunks(src)):
+            with stats.phase('xml'):
+                parser.feed(chunk)
+        with stats.phase('xml'):
+            root = parser.close()
     assert root.tag == NS + 'diagram'
+    return root
+
+def parse_dia_file(src, stream=False, options=None, cache=None, **kwargs):
+    '''Parses a .dia file and returns a Diagram instance.
+
+    The source can be a filename, a bytes-like object (including an mmap) or a
+    binary file object, and may be gzip compressed or not.
+
+    Parsing is controlled by a ParseOptions instance, or by passing its
+    settings as keyword arguments (eg lazy=True).
+
+    If a cache (eg DiskCache) is given, the diagram is loaded from it when
+    the source has not changed since it was cached. The cache is not used when
+    stats are requested, since a cached load does not parse anything.
+
+    If stream is true the diagram is built incrementally while the file is
+    read, rather than from a complete XML tree. This keeps peak memory close to
+    the size of the finished model, which matters for very large diagrams.
+
+    With stats=True (or an on_stats callback) the cost of each parse phase is
+    measured and stored as Diagram.stats (see ParseStats).'''
+
+    if options is None:
+        options = ParseOptions(**kwargs)
+
+    if cache is not None and not options.stats:
+        return cache.load(src, options, lambda: parse_dia_file(src, stream, options))
+
+    if not options.stats:
+        if stream:
+            return stream_diagram(src, options)
+        return parse_diagram(parse_dia_xml(src), options)
 
-    return parse_diagram(root)
+    stats = ParseStats()
+    measured = options.collecting(stats)
+    with stats.phase('total'):
+        if stream:
+            diagram = stream_diagram(src, measured)
+        else:
+            diagram = parse_diagram(parse_dia_xml(src, stats), measured)
+    stats.count_nodes(diagram)
+    diagram.stats = stats
+    if options.on_stats is not None:
+        options.on_stats(stats)
+    return diagram
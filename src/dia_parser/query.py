@@ -0,0 +1,240 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from .spatial import object_bbox, _normalize
+from .text import object_text
+
+
+def attribute_path(obj, path):
+    '''Returns the attribute value found by following a dotted path (eg
+    "text.string") through the attributes of an object, or None'''
+
+    value = obj.attributes
+    for name in path.split('.'):
+        if not value:
+            return None
+        try:
+            value = value.get(name)
+        except AttributeError:
+            return None
+    return value
+
+
+class Selector:
+    '''A query for objects in a diagram, checked once and reusable against
+    any number of diagrams. See Diagram.select.
+
+    Criteria (all optional, and all must hold):
+    type -- an object type, or a collection of types
+    layer -- a Layer instance or layer name containing the objects
+    group -- a Group instance the objects must be inside (at any depth)
+    where -- a dictionary mapping dotted attribute paths (eg "text.string")
+             to a value to compare with, or to a function taking the value
+    text -- the exact object text (see Object.text)
+    search -- words that must all appear in the object text (ignoring case)
+    within -- a (left, top, right, bottom) rectangle the bounding box must intersect
+    is_line -- true for only lines, false for everything else
+    linked_from -- an object the results are reached from by one line
+    linked_to -- an object the results reach by one line
+    connected -- true for objects with at least one line attached, false for none
+
+    The planner starts from the smallest candidate list offered by an index
+    (object types and lines, text, connections, and the spatial grid if it is
+    built already or nothing else applies), and checks the remaining criteria
+    on each candidate. Without any of those it walks the group, the layer or
+    the whole diagram. Results are in diagram order.
+    '''
+
+    def __init__(
+        self,
+        type=None,
+        layer=None,
+        group=None,
+        where=None,
+        text=None,
+        search=None,
+        within=None,
+        is_line=None,
+        linked_from=None,
+        linked_to=None,
+        connected=None
+    ):
+        if isinstance(type, str):
+            type = (type,)
+        self.types = None if type is None else tuple(dict.fromkeys(type))
+        self.layer = layer
+        self.group = group
+        self.where = dict(where or {})
+        self.text = text
+        self.search = search
+        self.within = within
+        self.is_line = is_line
+        self.linked_from = linked_from
+        self.linked_to = linked_to
+        self.connected = connected
+
+    def select(self, diagram):
+        '''Returns the list of objects in the diagram matching every criterion'''
+
+        _, candidates, checks, ordered = self._plan(diagram)
+        found = [
+            obj for obj in candidates
+            if all(check(obj) for _, check in checks)
+        ]
+        if not ordered:
+            found.sort(key=diagram.objects.position)
+        return found
+
+    def explain(self, diagram):
+        '''Returns a short description of how select would run, eg
+        "type index (12 candidates), then check layer, where"'''
+
+        source, candidates, checks, _ = self._plan(diagram)
+        if isinstance(candidates, list):
+            text = '{} ({} candidates)'.format(source, len(candidates))
+        else:
+            text = source
+        if checks:
+            text += ', then check ' + ', '.join(criterion for criterion, _ in checks)
+        return text
+
+    def _plan(self, diagram):
+        '''Returns (source description, candidate objects, list of (criterion,
+        check) tuples, true if the candidates are in diagram order)'''
+
+        objects = diagram.objects
+        graph = diagram.graph
+        layer = diagram[self.layer] if isinstance(self.layer, str) else self.layer
+
+        # Each entry is (name, candidates, in diagram order, criteria fully covered)
+        sources = []
+        if self.types is not None:
+            candidates = [obj for obj_type in self.types for obj in objects.by_type(obj_type)]
+            sources.append(('type index', candidates, len(self.types) == 1, {'type'}))
+        if self.is_line is not None:
+            candidates = objects.filter_lines() if self.is_line else objects.filter_non_lines()
+            sources.append(('line index', candidates, True, {'is_line'}))
+        if self.text is not None:
+            sources.append(('text index', diagram.text.exact(self.text), True, {'text'}))
+        if self.search is not None:
+            sources.append(('text index', diagram.text.search(self.search), True, {'search'}))
+        if self.linked_from is not None:
+            sources.append(('graph', graph.successors(self.linked_from), False, {'linked_from'}))
+        if self.linked_to is not None:
+            sources.append(('graph', graph.predecessors(self.linked_to), False, {'linked_to'}))
+
+        # The spatial index is used when it exists already, or when there is
+        # no cheaper index to start from
+        if self.within is not None and (not sources or diagram.spatial.has_index(layer)):
+            candidates = diagram.spatial.intersecting(self.within, layer)
+            sources.append(('spatial index', candidates, True, {'within', 'layer'}))
+
+        if sources:
+            name, candidates, ordered, covered = min(sources, key=lambda source: len(source[1]))
+        elif self.group is not None:
+            name, candidates, ordered, covered = 'group scan', list(self.group.iter_objects()), True, {'group'}
+        elif layer is not None:
+            name, candidates, ordered, covered = 'layer scan', list(layer.iter_objects()), True, {'layer'}
+        else:
+            name, candidates, ordered, covered = 'scan', objects, True, set()
+
+        checks = [
+            (criterion, check)
+            for criterion, check in self._checks(diagram, layer)
+            if criterion not in covered
+        ]
+        return name, candidates, checks, ordered
+
+    def _checks(self, diagram, layer):
+        '''Yields a (criterion, check function) pair for every criterion given'''
+
+        if self.types is not None:
+            types = frozenset(self.types)
+            yield 'type', lambda obj: obj.obj_type in types
+
+        if self.is_line is not None:
+            is_line = bool(self.is_line)
+            yield 'is_line', lambda obj: obj.is_line == is_line
+
+        if self.text is not None:
+            text = self.text
+            yield 'text', lambda obj: object_text(obj) == text
+
+        if self.search is not None:
+            matches = set(diagram.text.search(self.search))
+            yield 'search', matches.__contains__
+
+        if self.linked_from is not None:
+            yield 'linked_from', set(diagram.graph.successors(self.linked_from)).__contains__
+
+        if self.linked_to is not None:
+            yield 'linked_to', set(diagram.graph.predecessors(self.linked_to)).__contains__
+
+        if self.within is not None:
+            left, top, right, bottom = _normalize(self.within)
+            def within(obj):
+                bb = object_bbox(obj)
+                return (
+                    bb is not None and
+                    bb[0] <= right and left <= bb[2] and bb[1] <= bottom and top <= bb[3]
+                )
+            yield 'within', within
+
+        if self.group is not None:
+            group = self.group
+            def inside(obj):
+                node = obj.parent
+                while node is not None and node is not group:
+                    node = getattr(node, 'parent', None)
+                return node is group
+            yield 'group', inside
+
+        if layer is not None:
+            # Membership of the layer's tree as it is now, rather than the
+            # layer each object remembers (see Node.layer)
+            members = None
+            def in_layer(obj):
+                nonlocal members
+                if members is None:
+                    members = set(layer.iter_objects())
+                return obj in members
+            yield 'layer', in_layer
+
+        if self.where:
+            where = [
+                (path, value if callable(value) else _equals(value))
+                for path, value in self.where.items()
+            ]
+            def matches_where(obj):
+                for path, predicate in where:
+                    value = attribute_path(obj, path)
+                    if value is None or not predicate(value):
+                        return False
+                return True
+            yield 'where', matches_where
+
+        if self.connected is not None:
+            graph = diagram.graph
+            connected = bool(self.connected)
+            yield 'connected', lambda obj: bool(graph.outbound(obj) or graph.inbound(obj)) == connected
+
+
+def _equals(expected):
+    def equals(value):
+        return value == expected
+    return equals
@@ -0,0 +1,460 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import hashlib
+import html
+import re
+from xml.etree import ElementTree
+
+from .ns import NS
+from .options import DEFAULT_OPTIONS
+from .source import iter_xml_chunks
+from .attributes import decode_attributes
+from .obj import parse_object
+from .layer import Layer, Group
+from .diagram import DiagramData, parse_diagram, parse_diagramdata
+
+# The start and end tags of the elements that get a fingerprint. Dia always
+# writes the namespace with the "dia" prefix; other documents fall back to a
+# full parse (see _scan).
+_TAG_RE = re.compile(rb'<(/?)dia:(diagramdata|layer|group|object)\b([^>]*?)(/?)>')
+_ATTR_RE = re.compile(rb'([\w:.-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+_ENCODING_RE = re.compile(rb'<\?xml[^>]*encoding\s*=\s*["\']([^"\']+)')
+_NS_DECLARATION = ('xmlns:dia="' + NS[1:-1] + '"').encode('utf-8')
+
+_FRAGMENT_START = ('<dia:fragment ' + _NS_DECLARATION.decode('utf-8') + '>').encode('utf-8')
+_FRAGMENT_END = b'</dia:fragment>'
+
+
+class ReparseReport:
+    '''The outcome of reparsing a diagram.
+
+    Attributes:
+    added -- list of new objects whose ID was not in the diagram before
+    removed -- list of old objects whose ID is no longer in the diagram
+    modified -- list of (old, new) object tuples for IDs whose content changed
+    unchanged -- the number of objects kept as they were
+    '''
+
+    def __init__(self, added=None, removed=None, modified=None, unchanged=0):
+        self.added = added or []
+        self.removed = removed or []
+        self.modified = modified or []
+        self.unchanged = unchanged
+
+    def __bool__(self):
+        '''True iff any object changed'''
+
+        return bool(self.added or self.removed or self.modified)
+
+    def __repr__(self):
+        return '<ReparseReport added={} removed={} modified={} unchanged={}>'.format(
+            len(self.added),
+            len(self.removed),
+            len(self.modified),
+            self.unchanged
+        )
+
+
+def reparse(diagram, src, options=None):
+    '''Updates a diagram in place from a new version of its .dia source, and
+    returns a ReparseReport.
+
+    Unchanged objects keep their identity (so do unchanged groups and layers,
+    and layers are updated in place when their name is kept). Each layer,
+    group and object is fingerprinted by hashing its XML, and only the parts
+    whose fingerprint changed are decoded again, so the cost after a small
+    edit is mostly reading and hashing the file. The fingerprints are kept on
+    the diagram for the next call; the first call compares the decoded
+    content of every object instead.
+
+    Pass the same options that the diagram was parsed with. Connections are
+    relinked and the graph, geometry and spatial indexes are rebuilt on next
+    use.'''
+
+    if options is None: options = DEFAULT_OPTIONS
+
+    data = b''.join(iter_xml_chunks(src))
+    old_objects = list(diagram.objects)
+
+    root = _scan(data)
+    if root is None:
+        builder = None
+        diagram_data, layers = _reparse_tree(diagram, data, options)
+    else:
+        builder = _Builder(diagram, data, options)
+        diagram_data, layers = builder.build(root)
+
+    diagram.set_content(diagram_data, layers)
+    diagram.fingerprints = builder.fingerprints if builder else None
+
+    return _report(old_objects, list(diagram.objects))
+
+
+def _report(old_objects, new_objects):
+    old_by_id = {}
+    for obj in old_objects:
+        old_by_id[obj.obj_id] = obj
+    kept = set(map(id, old_objects))
+    new_ids = set()
+
+    report = ReparseReport()
+    for obj in new_objects:
+        new_ids.add(obj.obj_id)
+        if id(obj) in kept:
+            report.unchanged += 1
+            continue
+        old = old_by_id.get(obj.obj_id)
+        if old is None:
+            report.added.append(obj)
+        else:
+            report.modified.append((old, obj))
+
+    kept = set(map(id, new_objects))
+    report.removed = [
+        obj for obj in old_objects
+        if id(obj) not in kept and obj.obj_id not in new_ids
+    ]
+    return report
+
+
+class _Span:
+    '''The location of an element in the XML data'''
+
+    __slots__ = ('kind', 'start', 'end', 'attrib', 'children', 'digest')
+
+    def __init__(self, kind, start, attrib):
+        self.kind = kind
+        self.start = start
+        self.end = None
+        self.attrib = attrib
+        self.children = []
+        self.digest = None
+
+    def attributes(self):
+        attributes = {}
+        for match in _ATTR_RE.finditer(self.attrib):
+            name, value1, value2 = match.groups()
+            value = value1 if value1 is not None else value2
+            attributes[name.decode('utf-8')] = html.unescape(value.decode('utf-8'))
+        return attributes
+
+
+def _scan(data):
+    '''Returns the tree of layer, group and object spans in the data, or None
+    if the document cannot be scanned reliably'''
+
+    # Markup inside comments or CDATA would confuse the tag scan, and
+    # fragments are parsed on their own so they must be UTF-8.
+    if b'<!--' in data or b'<![CDATA[' in data:
+        return None
+    if data.count(b'xmlns:dia=') != 1 or _NS_DECLARATION not in data:
+        return None
+    match = _ENCODING_RE.match(data)
+    if match and match.group(1).lower() not in (b'utf-8', b'utf8'):
+        return None
+
+    root = _Span('diagram', 0, b'')
+    stack = [root]
+    for match in _TAG_RE.finditer(data):
+        closing, kind, attrib, empty = match.groups()
+        kind = kind.decode('ascii')
+        if closing:
+            span = stack.pop()
+            if span.kind != kind or not stack:
+                return None
+            span.end = match.end()
+            continue
+
+        parent = stack[-1]
+        if parent.kind == 'object' or parent.kind == 'diagramdata':
+            return None
+        if (kind == 'layer' or kind == 'diagramdata') != (parent is root):
+            return None
+
+        span = _Span(kind, match.start(), attrib)
+        parent.children.append(span)
+        if empty:
+            span.end = match.end()
+        else:
+            stack.append(span)
+
+    if len(stack) != 1:
+        return None
+    return root
+
+
+def _digest_spans(view, root):
+    '''Fingerprints every span below root by hashing its XML, with the data
+    of each nested span replaced by that span's own fingerprint, so that each
+    byte is hashed once however deeply the groups are nested'''
+
+    # Children are fingerprinted before their parent (entries are (span,
+    # whether its children are done))
+    stack = [(span, False) for span in root.children]
+    while stack:
+        span, ready = stack.pop()
+        if span.children and not ready:
+            stack.append((span, True))
+            stack.extend((child, False) for child in span.children)
+            continue
+
+        hasher = hashlib.blake2b(digest_size=16)
+        start = span.start
+        for child in span.children:
+            hasher.update(view[start:child.start])
+            hasher.update(child.digest)
+            start = child.end
+        hasher.update(view[start:span.end])
+        span.digest = hasher.digest()
+
+
+def _parse_fragment(pieces):
+    '''Parses pieces of the XML data and returns the first element in them'''
+
+    parser = ElementTree.XMLParser()
+    parser.feed(_FRAGMENT_START)
+    for piece in pieces:
+        parser.feed(piece)
+    parser.feed(_FRAGMENT_END)
+    return parser.close()[0]
+
+
+def _walk(nodes):
+    '''Returns an iterator over the given nodes and everything below them'''
+
+    stack = list(reversed(nodes))
+    while stack:
+        node = stack.pop()
+        children = getattr(node, 'children', None)
+        if children is not None:
+            stack.extend(reversed(children))
+        if not isinstance(node, Layer):
+            yield node
+
+
+def _same_object(old, new):
+    if (old.obj_type, old.version) != (new.obj_type, new.version):
+        return False
+    if dict(old.attributes or {}) != dict(new.attributes or {}):
+        return False
+    return _connection_keys(old) == _connection_keys(new)
+
+
+def _connection_keys(obj):
+    return sorted(
+        (conn.handle, conn.to_id, conn.connection)
+        for conn in obj.connections_by_handle.values()
+    )
+
+
+class _Builder:
+    '''Builds the new layers from the scanned spans, reusing the nodes of the
+    old diagram whose fingerprint is unchanged'''
+
+    def __init__(self, diagram, data, options):
+        self.view = memoryview(data)
+        self.options = options
+        self.fingerprints = {}
+
+        old = diagram.fingerprints
+        self.compare = old is None
+        self.old_fingerprints = old or {}
+        self.old_layers = {layer.name : layer for layer in diagram.layers}
+        self.old_diagram_data = diagram.diagram_data
+        # The ids of the old nodes placed in the new tree so far
+        self.used = set()
+
+        # Old nodes available for reuse, keyed by fingerprint
+        self.objects = {}
+        self.groups = {}
+        self.objects_by_id = {}
+        for node in _walk(diagram.layers):
+            digest = self.old_fingerprints.get(node)
+            if isinstance(node, Group):
+                if digest is not None:
+                    self.groups.setdefault(digest, []).append(node)
+            elif digest is not None:
+                self.objects.setdefault((node.obj_id, digest), []).append(node)
+            else:
+                self.objects_by_id.setdefault(node.obj_id, []).append(node)
+
+    def element(self, span):
+        return _parse_fragment((self.view[span.start:span.end],))
+
+    def build(self, root):
+        _digest_spans(self.view, root)
+        diagram_data = None
+        layers = []
+        for span in root.children:
+            if span.kind == 'layer':
+                layers.append(self.build_layer(span))
+            else:
+                diagram_data = self.build_diagram_data(span)
+        return (diagram_data or DiagramData({})), layers
+
+    def build_diagram_data(self, span):
+        digest = span.digest
+        diagram_data = self.old_diagram_data
+        if diagram_data is None or self.old_fingerprints.get(diagram_data) != digest:
+            diagram_data = parse_diagramdata(self.element(span), self.options)
+        self.fingerprints[diagram_data] = digest
+        return diagram_data
+
+    def build_layer(self, span):
+        digest = span.digest
+        attributes = span.attributes()
+        layer = self.old_layers.pop(attributes['name'], None)
+
+        if layer is not None and self.old_fingerprints.get(layer) == digest:
+            if self.keep(layer, digest):
+                return layer
+
+        children = self.build_children(span)
+        if layer is None:
+            layer = Layer(children, name=attributes['name'])
+        else:
+            layer.set_children(children)
+        layer.visible = (attributes['visible'] == 'true')
+        layer.connectable = (attributes['connectable'] == 'true')
+        layer.active = (attributes.get('active', None) == 'true')
+        self.fingerprints[layer] = digest
+        return layer
+
+    def build_children(self, span):
+        '''Returns the children of a layer or group span, in document order (as
+        parse_group_base). Nested groups are built with an explicit stack
+        rather than by recursion.'''
+
+        children = []
+        # Each entry is (iterator over the remaining child spans, the children
+        # built so far, the group span or None for the top level)
+        stack = [(iter(span.children), children, None)]
+        while stack:
+            spans, found, group_span = stack[-1]
+            for child in spans:
+                if child.kind == 'object':
+                    obj = self.build_object(child)
+                    if obj is not None:
+                        found.append(obj)
+                elif child.kind == 'group':
+                    group = self.reuse_group(child)
+                    if group is None:
+                        stack.append((iter(child.children), [], child))
+                        break
+                    found.append(group)
+            else:
+                stack.pop()
+                if group_span is not None:
+                    stack[-1][1].append(self.build_group(group_span, found))
+        return children
+
+    def reuse_group(self, span):
+        '''Returns an unchanged old group for a span, or None if there is none'''
+
+        digest = span.digest
+        reusable = self.groups.get(digest, [])
+        while reusable:
+            group = reusable.pop()
+            if self.keep(group, digest):
+                return group
+        return None
+
+    def build_group(self, span, children):
+        # Parse the group element with the child elements cut out, leaving
+        # just its own attributes
+        pieces = []
+        start = span.start
+        for child in span.children:
+            pieces.append(self.view[start:child.start])
+            start = child.end
+        pieces.append(self.view[start:span.end])
+        group = Group(
+            children=children,
+            attributes=decode_attributes(_parse_fragment(pieces), self.options),
+        )
+        self.fingerprints[group] = span.digest
+        return group
+
+    def build_object(self, span):
+        attributes = span.attributes()
+        if not self.options.wants_type(attributes['type']):
+            return None
+
+        obj_id = attributes['id']
+        digest = span.digest
+        obj = self.reuse(self.objects.get((obj_id, digest), []))
+        if obj is None:
+            obj = parse_object(self.element(span), self.options)
+            if self.compare:
+                obj = self.reuse(self.objects_by_id.get(obj_id, []), obj)
+
+        self.fingerprints[obj] = digest
+        return obj
+
+    def reuse(self, candidates, new=None):
+        '''Takes an unused old object from the candidates (one with the same
+        content as new, if given). Returns new, or None, if there is none.'''
+
+        for n, old in enumerate(candidates):
+            if id(old) in self.used:
+                continue
+            if new is None or _same_object(old, new):
+                del candidates[n]
+                self.used.add(id(old))
+                return old
+        return new
+
+    def keep(self, node, digest):
+        '''Reuses an old layer or group as it is, carrying the fingerprints of
+        everything in it over. Returns false if part of it is used elsewhere.'''
+
+        nodes = list(_walk(node.children))
+        used = self.used
+        if any(id(child) in used for child in nodes):
+            return False
+
+        used.add(id(node))
+        self.fingerprints[node] = digest
+        old_fingerprints = self.old_fingerprints
+        for child in nodes:
+            used.add(id(child))
+            self.fingerprints[child] = old_fingerprints[child]
+        return True
+
+
+def _reparse_tree(diagram, data, options):
+    '''Reparses the whole document, then puts back the old objects whose content is unchanged'''
+
+    new = parse_diagram(ElementTree.fromstring(data), options)
+
+    old_by_id = {}
+    for obj in diagram.objects:
+        old_by_id.setdefault(obj.obj_id, []).append(obj)
+
+    for node in list(_walk(new.layers)):
+        if isinstance(node, Group):
+            continue
+        candidates = old_by_id.get(node.obj_id, [])
+        for n, old in enumerate(candidates):
+            if _same_object(old, node):
+                del candidates[n]
+                node.parent.replace_child(node, old)
+                break
+
+    return new.diagram_data, new.layers
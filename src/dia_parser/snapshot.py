@@ -0,0 +1,411 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import gc
+import gzip
+import marshal
+import mmap
+import os
+import struct
+import sys
+from array import array
+from itertools import accumulate
+
+from .attributes import LazyAttributes
+from .obj import Object, Connection
+from .layer import Layer, Group
+from .diagram import Diagram, DiagramData, LinkReport
+from .source import is_gzip_data
+
+SNAPSHOT_MAGIC = b'DIASNAP\x00'
+
+# Bump whenever the layout changes. Older snapshots are refused rather than misread.
+SNAPSHOT_VERSION = 2
+
+# The magic, the snapshot version, the major and minor Python version (since
+# the values are stored with marshal, whose format is only stable within one
+# Python version) and the number of sections
+_HEADER = struct.Struct('<8sIHHI')
+_PYTHON_VERSION = sys.version_info[:2]
+_SECTION = struct.Struct('<4sQQ')
+
+# Tokens of the TREE section. Values of zero or more are object indexes.
+_LAYER = -1
+_GROUP = -2
+_END = -3
+
+# Layer flags
+_VISIBLE = 1
+_CONNECTABLE = 2
+_ACTIVE = 4
+
+# Each section starts on a multiple of this, so the arrays are aligned
+_ALIGN = 8
+
+_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+class _ValueTable:
+    '''Numbers each distinct value once, keeping 1, 1.0 and True apart'''
+
+    def __init__(self):
+        self.values = []
+        self._index = {}
+
+    def add(self, value):
+        key = (type(value), value)
+        index = self._index.get(key)
+        if index is None:
+            index = self._index[key] = len(self.values)
+            self.values.append(value)
+        return index
+
+    def canonical(self, value):
+        '''Returns the stored instance equal to value, so that marshal writes
+        each distinct string once and refers back to it afterwards'''
+
+        return self.values[self.add(value)]
+
+
+def _plain(attributes, table):
+    '''Returns a copy of an attribute dictionary (decoding lazy attributes)
+    made of plain dicts, lists and tuples, with its strings deduplicated'''
+
+    if attributes is None:
+        return None
+
+    canonical = table.canonical
+    result = {}
+    stack = [(attributes, result)]
+    while stack:
+        source, target = stack.pop()
+        if isinstance(source, LazyAttributes):
+            source = dict(source)
+        for name, value in source.items():
+            if isinstance(value, (dict, LazyAttributes)):
+                copy = {}
+                stack.append((value, copy))
+                value = copy
+            elif isinstance(value, str):
+                value = canonical(value)
+            elif isinstance(value, tuple):
+                value = tuple(canonical(item) if isinstance(item, str) else item for item in value)
+            elif isinstance(value, list):
+                # The values of a list attribute (eg the points of a line)
+                value = [
+                    tuple(canonical(part) if isinstance(part, str) else part for part in item)
+                    if isinstance(item, tuple) else item
+                    for item in value
+                ]
+            target[canonical(name)] = value
+    return result
+
+
+def _array_bytes(values):
+    if not _LITTLE_ENDIAN:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _encode(diagram):
+    '''Returns the list of (name, bytes) sections describing a diagram'''
+
+    table = _ValueTable()
+    objects = list(diagram.objects)
+    number = {obj: n for n, obj in enumerate(objects)}
+
+    attributes = [_plain(diagram.diagram_data.attributes if diagram.diagram_data else None, table)]
+    attributes.extend(_plain(obj.attributes, table) for obj in objects)
+
+    object_rows = array('i')
+    connection_rows = array('i')
+    for obj in objects:
+        connections = obj.connections_by_handle
+        object_rows.extend((
+            table.add(obj.obj_id),
+            table.add(obj.obj_type),
+            table.add(obj.version),
+            len(connections),
+        ))
+        for conn in connections.values():
+            target = conn.target if conn.target is not None else diagram.object_map.get(conn.to_id)
+            connection_rows.extend((
+                conn.handle,
+                number.get(target, -1),
+                table.add(conn.to_id),
+                table.add(conn.connection),
+            ))
+
+    tree = array('i')
+    for layer in diagram.layers:
+        tree.extend((
+            _LAYER,
+            table.add(layer.name),
+            (
+                (_VISIBLE if layer.visible else 0) |
+                (_CONNECTABLE if layer.connectable else 0) |
+                (_ACTIVE if layer.active else 0)
+            ),
+        ))
+        stack = [iter(layer.children)]
+        while stack:
+            for child in stack[-1]:
+                if hasattr(child, 'children'):
+                    tree.extend((_GROUP, len(attributes)))
+                    attributes.append(_plain(child.attributes, table))
+                    stack.append(iter(child.children))
+                    break
+                tree.append(number[child])
+            else:
+                stack.pop()
+                tree.append(_END)
+
+    geometry = diagram.geometry
+    return [
+        # One marshal stream, so each string is written once and referred
+        # back to everywhere else
+        (b'VALS', marshal.dumps((tuple(table.values), attributes))),
+        (b'OBJS', _array_bytes(object_rows)),
+        (b'CONN', _array_bytes(connection_rows)),
+        (b'TREE', _array_bytes(tree)),
+        (b'GIDX', _array_bytes(array('q', geometry.index))),
+        (b'GPOS', _array_bytes(array('d', geometry.positions))),
+        (b'GBOX', _array_bytes(array('d', geometry.bboxes))),
+        (b'GWID', _array_bytes(array('d', geometry.widths))),
+        (b'GHGT', _array_bytes(array('d', geometry.heights))),
+    ]
+
+
+def _pad(offset):
+    return -offset % _ALIGN
+
+
+def save_snapshot(diagram, dst, compress=False, level=6):
+    '''Writes a diagram to a binary snapshot, which load_snapshot reads back
+    much faster than the .dia file can be parsed.
+
+    The destination is a filename or a binary file object. Uncompressed
+    snapshots (the default) can be memory-mapped when loaded; compress trades
+    that for size, with level from 1 to 9. Snapshots can only be loaded by
+    the Python version (eg 3.11) that wrote them.
+
+    Attribute values must be of the types produced by the attribute decoders
+    (numbers, strings, bytes, tuples and dictionaries of those). Lazy
+    attributes are decoded first.'''
+
+    if isinstance(dst, (str, bytes, os.PathLike)):
+        with open(dst, 'wb') as fp:
+            save_snapshot(diagram, fp, compress, level)
+        return
+
+    sections = _encode(diagram)
+
+    offset = _HEADER.size + _SECTION.size * len(sections)
+    table = []
+    for name, data in sections:
+        offset += _pad(offset)
+        table.append(_SECTION.pack(name, offset, len(data)))
+        offset += len(data)
+
+    sink = gzip.GzipFile(fileobj=dst, mode='wb', compresslevel=level) if compress else dst
+    try:
+        sink.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, *_PYTHON_VERSION, len(sections)))
+        offset = _HEADER.size
+        for entry in table:
+            sink.write(entry)
+            offset += len(entry)
+        for name, data in sections:
+            sink.write(b'\x00' * _pad(offset))
+            offset += _pad(offset)
+            sink.write(data)
+            offset += len(data)
+    finally:
+        if compress:
+            sink.close()
+
+
+def _read_source(src):
+    '''Returns the (uncompressed) snapshot data as a bytes-like object, mapping
+    uncompressed files rather than reading them'''
+
+    if isinstance(src, (str, os.PathLike)):
+        with open(src, 'rb') as fp:
+            try:
+                data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                data = fp.read()
+    elif isinstance(src, (bytes, bytearray, memoryview, mmap.mmap)):
+        data = src
+    elif hasattr(src, 'read'):
+        data = src.read()
+    else:
+        raise TypeError('unsupported snapshot source: {!r}'.format(src))
+
+    if is_gzip_data(data):
+        data = gzip.decompress(data)
+    return data
+
+
+def _sections(view):
+    if len(view) < _HEADER.size:
+        raise ValueError('not a dia_parser snapshot')
+    magic, version, major, minor, count = _HEADER.unpack_from(view, 0)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError('not a dia_parser snapshot')
+    if version != SNAPSHOT_VERSION:
+        raise ValueError('unsupported snapshot version {} (expected {})'.format(version, SNAPSHOT_VERSION))
+    if (major, minor) != _PYTHON_VERSION:
+        raise ValueError('snapshot written by Python {}.{} cannot be loaded by Python {}.{}'.format(
+            major, minor, *_PYTHON_VERSION
+        ))
+
+    sections = {}
+    for n in range(count):
+        name, offset, length = _SECTION.unpack_from(view, _HEADER.size + n * _SECTION.size)
+        if offset + length > len(view):
+            raise ValueError('truncated snapshot')
+        sections[name] = view[offset:offset + length]
+    return sections
+
+
+def _cast(view, typecode):
+    '''Returns the section as a sequence of the given item type, sharing
+    memory with it where the byte order allows'''
+
+    if _LITTLE_ENDIAN:
+        return view.cast('B').cast(typecode)
+    values = array(typecode, view)
+    values.byteswap()
+    return values
+
+
+def load_snapshot(src):
+    '''Returns the Diagram instance stored in a snapshot (see save_snapshot).
+
+    The source can be a filename, a bytes-like object or a binary file
+    object. Uncompressed files are memory-mapped, and the geometry arrays
+    (see Diagram.geometry) are used straight from the mapping without being
+    copied. Only load snapshots from sources you trust.'''
+
+    view = memoryview(_read_source(src))
+    sections = _sections(view)
+
+    # The model is full of reference cycles (objects and their connections,
+    # groups and their children, layers and the diagram), but none of it is
+    # garbage while loading, so collection is deferred until the end rather
+    # than running many times over the new objects
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _decode(sections)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _decode(sections):
+    values, attributes = marshal.loads(sections[b'VALS'])
+
+    rows = _cast(sections[b'OBJS'], 'i').tolist()
+    ids = [values[n] for n in rows[0::4]]
+    types = [values[n] for n in rows[1::4]]
+    versions = [values[n] for n in rows[2::4]]
+    counts = rows[3::4]
+
+    rows = _cast(sections[b'CONN'], 'i').tolist()
+    targets = rows[1::4]
+    links = [
+        Connection(handle=handle, to_id=values[to_id], connection=values[point])
+        for handle, to_id, point in zip(rows[0::4], rows[2::4], rows[3::4])
+    ]
+
+    # The connections are stored in object order, count of them per object
+    ends = list(accumulate(counts))
+    objects = [
+        Object(
+            obj_id=obj_id,
+            obj_type=obj_type,
+            version=version,
+            attributes=obj_attributes,
+            connections=links[end - count:end] if count else None,
+        )
+        for obj_id, obj_type, version, obj_attributes, count, end in zip(
+            ids, types, versions, attributes[1:], counts, ends
+        )
+    ]
+
+    # Connections are stored with the index of the object they attach to, so
+    # linking needs no lookups by ID
+    dangling = []
+    for conn, target in zip(links, targets):
+        if target < 0:
+            dangling.append(conn)
+        else:
+            conn.target = objects[target]
+
+    layers = []
+    # Each entry is (list of children, Layer arguments or group attributes)
+    stack = []
+    tokens = iter(_cast(sections[b'TREE'], 'i').tolist())
+    for token in tokens:
+        if token >= 0:
+            stack[-1][0].append(objects[token])
+        elif token == _LAYER:
+            name = values[next(tokens)]
+            flags = next(tokens)
+            stack.append(([], (name, flags)))
+        elif token == _GROUP:
+            stack.append(([], attributes[next(tokens)]))
+        else:
+            children, extra = stack.pop()
+            if stack:
+                stack[-1][0].append(Group(children, attributes=extra))
+            else:
+                name, flags = extra
+                layers.append(Layer(
+                    children,
+                    name=name,
+                    visible=bool(flags & _VISIBLE),
+                    connectable=bool(flags & _CONNECTABLE),
+                    active=bool(flags & _ACTIVE),
+                ))
+
+    diagram = Diagram(DiagramData(attributes[0]), [])
+    object_map = diagram.object_map
+    object_map.update(zip(ids, objects))
+    duplicate_ids = {}
+    if len(object_map) < len(objects):
+        seen = {}
+        for obj in objects:
+            other = seen.get(obj.obj_id)
+            if other is not None:
+                duplicate_ids.setdefault(obj.obj_id, [other]).append(obj)
+            seen[obj.obj_id] = obj
+    diagram.set_content(diagram.diagram_data, layers, LinkReport(dangling, duplicate_ids))
+
+    index = _cast(sections[b'GIDX'], 'q')
+    diagram.geometry.set_arrays(
+        [objects[n] for n in index.tolist()],
+        index,
+        _cast(sections[b'GPOS'], 'd'),
+        _cast(sections[b'GBOX'], 'd'),
+        _cast(sections[b'GWID'], 'd'),
+        _cast(sections[b'GHGT'], 'd'),
+    )
+    return diagram
@@ -0,0 +1,139 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import mmap
+import os
+import zlib
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+# Size of the pieces handed to the XML parser. Kept fairly small so that the
+# streaming parser can discard elements before the next piece is parsed.
+CHUNK_SIZE = 256 * 1024
+
+_XML_PREFIX = b'<?xml'
+
+
+def iter_xml_chunks(src, chunk_size=CHUNK_SIZE):
+    '''Returns an iterator over the XML data of a .dia source, as bytes-like chunks.
+
+    The source may be a filename (str or os.PathLike), a bytes-like object
+    (bytes, bytearray, memoryview or mmap) or a binary file-like object. Gzip
+    compression is detected from the magic bytes at the start of the data and
+    decompressed incrementally. Uncompressed files are memory-mapped and passed
+    through without copying. Throws AssertionError if the data is not XML.'''
+
+    head, chunks = _read_head(_iter_raw_chunks(src, chunk_size), len(_XML_PREFIX))
+    if is_gzip_data(head):
+        head, chunks = _read_head(_gunzip(chunks, chunk_size), len(_XML_PREFIX))
+
+    assert head.lower() == _XML_PREFIX, 'not a valid xml file'
+
+    return chunks
+
+
+def is_gzip_data(data):
+    '''Returns true iff the given bytes start with the gzip magic number'''
+
+    return bytes(data[:len(GZIP_MAGIC)]) == GZIP_MAGIC
+
+
+def _iter_raw_chunks(src, chunk_size):
+    if isinstance(src, (bytes, bytearray, memoryview, mmap.mmap)):
+        yield from _iter_buffer(src, chunk_size)
+
+    elif isinstance(src, (str, os.PathLike)):
+        with open(src, 'rb') as fp:
+            view = _map_file(fp)
+            if view is None:
+                yield from _iter_file(fp, chunk_size)
+                return
+        yield from _iter_buffer(view, chunk_size)
+
+    elif hasattr(src, 'read'):
+        yield from _iter_file(src, chunk_size)
+
+    else:
+        raise TypeError('unsupported dia source: {!r}'.format(src))
+
+
+def _map_file(fp):
+    '''Returns a read-only mmap over the given file, or None if it cannot be mapped'''
+
+    try:
+        if os.fstat(fp.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+
+def _iter_buffer(data, chunk_size):
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
+
+
+def _iter_file(fp, chunk_size):
+    while True:
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _read_head(chunks, size):
+    '''Returns (head, chunks) where head is a copy of the first size bytes (or
+    fewer if the data is shorter) and chunks yields the complete data again'''
+
+    consumed = []
+    head = b''
+    for chunk in chunks:
+        consumed.append(chunk)
+        head += bytes(chunk[:size - len(head)])
+        if len(head) >= size:
+            break
+
+    return head, _chain(consumed, chunks)
+
+
+def _chain(head, chunks):
+    yield from head
+    yield from chunks
+
+
+def _gunzip(chunks, chunk_size):
+    '''Decompresses a stream of gzip chunks (possibly multi-member) incrementally'''
+
+    decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = chunk
+        while data:
+            out = decomp.decompress(data, chunk_size)
+            if out:
+                yield out
+            if decomp.eof:
+                # gzip allows zero padding after the last member
+                data = decomp.unused_data.lstrip(b'\x00')
+                if data:
+                    decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            else:
+                data = decomp.unconsumed_tail
+
+    if not decomp.eof:
+        raise EOFError('Compressed file ended before the end-of-stream marker was reached')
@@ -0,0 +1,286 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import heapq
+import math
+
+from .options import LINE_ATTRIBUTES
+
+
+def object_bbox(obj):
+    '''Returns the (left, top, right, bottom) bounding box of an object, or None.
+
+    The obj_bb attribute is used when present. Otherwise the box is taken
+    from the points of a line, or from obj_pos as an empty box.'''
+
+    attributes = obj.attributes
+    if not attributes:
+        return None
+
+    bb = attributes.get('obj_bb')
+    if bb is not None:
+        return _normalize(bb)
+
+    for name in LINE_ATTRIBUTES:
+        points = attributes.get(name)
+        if not points:
+            continue
+        if name == 'bez_points':
+            # (type, p1, p2, p3) tuples, taking the control points as well
+            points = [point for bez in points for point in bez[1:] if point is not None]
+        xs = [point[0] for point in points]
+        ys = [point[1] for point in points]
+        return (min(xs), min(ys), max(xs), max(ys))
+
+    pos = attributes.get('obj_pos')
+    if pos is not None:
+        return (pos[0], pos[1], pos[0], pos[1])
+
+    return None
+
+
+def _normalize(bb):
+    left, top, right, bottom = bb
+    return (min(left, right), min(top, bottom), max(left, right), max(top, bottom))
+
+
+def _box_distance(bb, x, y):
+    dx = max(bb[0] - x, 0.0, x - bb[2])
+    dy = max(bb[1] - y, 0.0, y - bb[3])
+    return math.hypot(dx, dy)
+
+
+class GridIndex:
+    '''A uniform grid over bounding boxes, for region, point and nearest
+    neighbour queries.
+
+    Each entry is an (item, (left, top, right, bottom)) tuple. Query results
+    are returned in entry order.
+    '''
+
+    def __init__(self, entries):
+        self.items = []
+        self.bboxes = []
+        for item, bb in entries:
+            self.items.append(item)
+            self.bboxes.append(_normalize(bb))
+
+        self.cells = {}
+        if not self.bboxes:
+            self.cell_size = 1.0
+            self.extent = None
+            return
+
+        left = min(bb[0] for bb in self.bboxes)
+        top = min(bb[1] for bb in self.bboxes)
+        right = max(bb[2] for bb in self.bboxes)
+        bottom = max(bb[3] for bb in self.bboxes)
+        self.extent = (left, top, right, bottom)
+
+        # Aim for about one entry per cell, but keep cells at least as large
+        # as the typical entry so that entries rarely span many cells.
+        count = len(self.bboxes)
+        area = (right - left) * (bottom - top)
+        if area > 0:
+            size = math.sqrt(area / count)
+        else:
+            size = max(right - left, bottom - top) / count
+        mean_size = sum(max(bb[2] - bb[0], bb[3] - bb[1]) for bb in self.bboxes) / count
+        self.cell_size = max(size, mean_size) or 1.0
+
+        for n, bb in enumerate(self.bboxes):
+            for key in self._cells_covering(bb):
+                self.cells.setdefault(key, []).append(n)
+
+    def __len__(self):
+        return len(self.items)
+
+    def _cell(self, x, y):
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def _cells_covering(self, bb):
+        left, top = self._cell(bb[0], bb[1])
+        right, bottom = self._cell(bb[2], bb[3])
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                yield (cx, cy)
+
+    def intersecting(self, rect):
+        '''Returns the items whose box intersects (or touches) the given
+        (left, top, right, bottom) rectangle'''
+
+        if self.extent is None:
+            return []
+        left, top, right, bottom = _normalize(rect)
+        # Clip the query to the indexed area so huge rectangles stay cheap
+        clipped = (
+            max(left, self.extent[0]),
+            max(top, self.extent[1]),
+            min(right, self.extent[2]),
+            min(bottom, self.extent[3]),
+        )
+        if clipped[0] > clipped[2] or clipped[1] > clipped[3]:
+            return []
+
+        found = set()
+        cells = self.cells
+        bboxes = self.bboxes
+        for key in self._cells_covering(clipped):
+            for n in cells.get(key, ()):
+                if n in found:
+                    continue
+                bb = bboxes[n]
+                if bb[0] <= right and left <= bb[2] and bb[1] <= bottom and top <= bb[3]:
+                    found.add(n)
+        return [self.items[n] for n in sorted(found)]
+
+    def at_point(self, x, y):
+        '''Returns the items whose box contains the given point'''
+
+        found = []
+        bboxes = self.bboxes
+        for n in self.cells.get(self._cell(x, y), ()):
+            bb = bboxes[n]
+            if bb[0] <= x <= bb[2] and bb[1] <= y <= bb[3]:
+                found.append(n)
+        return [self.items[n] for n in sorted(found)]
+
+    def nearest(self, x, y, k=1):
+        '''Returns up to k (distance, item) tuples, closest first. The distance
+        is measured to the edge of each box (zero when inside it).'''
+
+        if self.extent is None or k <= 0:
+            return []
+
+        cx, cy = self._cell(x, y)
+        left, top = self._cell(self.extent[0], self.extent[1])
+        right, bottom = self._cell(self.extent[2], self.extent[3])
+        bounds = (left, top, right, bottom)
+        max_ring = max(abs(cx - left), abs(cx - right), abs(cy - top), abs(cy - bottom))
+        # The rings before the indexed area are empty, so start at its edge
+        min_ring = max(left - cx, cx - right, top - cy, cy - bottom, 0)
+
+        seen = set()
+        best = []
+        for ring in range(min_ring, max_ring + 1):
+            for key in self._ring(cx, cy, ring, bounds):
+                for n in self.cells.get(key, ()):
+                    if n in seen:
+                        continue
+                    seen.add(n)
+                    entry = (-_box_distance(self.bboxes[n], x, y), -n)
+                    if len(best) < k:
+                        heapq.heappush(best, entry)
+                    elif entry > best[0]:
+                        heapq.heapreplace(best, entry)
+
+            # Anything not seen yet is at least this far away
+            if len(best) == k and -best[0][0] <= ring * self.cell_size:
+                break
+
+        return [
+            (-distance, self.items[-n])
+            for distance, n in sorted(best, reverse=True)
+        ]
+
+    @staticmethod
+    def _ring(cx, cy, ring, bounds):
+        '''Yields the cells of the square ring around (cx, cy) that lie within
+        the (left, top, right, bottom) cell bounds'''
+
+        left, top, right, bottom = bounds
+        if ring == 0:
+            if left <= cx <= right and top <= cy <= bottom:
+                yield (cx, cy)
+            return
+        x0, x1 = max(cx - ring, left), min(cx + ring, right)
+        for y in (cy - ring, cy + ring):
+            if top <= y <= bottom:
+                for x in range(x0, x1 + 1):
+                    yield (x, y)
+        y0, y1 = max(cy - ring + 1, top), min(cy + ring - 1, bottom)
+        for x in (cx - ring, cx + ring):
+            if left <= x <= right:
+                for y in range(y0, y1 + 1):
+                    yield (x, y)
+
+
+class SpatialComponent:
+    '''Spatial queries over the objects in a diagram, using grid indexes built
+    from their bounding boxes (see object_bbox).
+
+    Queries take an optional layer (a Layer instance or a layer name) to limit
+    the search to that layer. Indexes are built on first use, one for the
+    whole diagram and one per queried layer. Call invalidate() after changing
+    the diagram.
+    '''
+
+    def __init__(self, diagram):
+        self.diagram = diagram
+        self._indexes = {}
+
+    def invalidate(self):
+        '''Discards the indexes so they are rebuilt on next use'''
+
+        self._indexes = {}
+
+    def has_index(self, layer=None):
+        '''True iff the index for the given layer (or the whole diagram) has been built'''
+
+        if isinstance(layer, str):
+            layer = self.diagram[layer]
+        return layer in self._indexes
+
+    def index(self, layer=None):
+        '''Returns the GridIndex for the given layer, or for the whole diagram'''
+
+        if isinstance(layer, str):
+            layer = self.diagram[layer]
+
+        try:
+            return self._indexes[layer]
+        except KeyError:
+            pass
+
+        objects = self.diagram.objects if layer is None else layer.iter_objects()
+        entries = []
+        for obj in objects:
+            bb = object_bbox(obj)
+            if bb is not None:
+                entries.append((obj, bb))
+
+        index = GridIndex(entries)
+        self._indexes[layer] = index
+        return index
+
+    def intersecting(self, rect, layer=None):
+        '''Returns the objects whose bounding box intersects the given (left,
+        top, right, bottom) rectangle, in stacking order (bottom first)'''
+
+        return self.index(layer).intersecting(rect)
+
+    def at_point(self, x, y, layer=None):
+        '''Returns the objects whose bounding box contains the given point, in
+        stacking order, so the last one is the object drawn on top'''
+
+        return self.index(layer).at_point(x, y)
+
+    def nearest(self, x, y, k=1, layer=None):
+        '''Returns the (up to) k objects closest to the given point, closest first'''
+
+        return [obj for _, obj in self.index(layer).nearest(x, y, k)]
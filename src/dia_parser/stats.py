@@ -0,0 +1,227 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+from .ns import NS
+from .attributes import ATTRIBUTE_DECODERS
+
+
+class PhaseStats:
+    '''The cost of one parse phase.
+
+    Attributes:
+    seconds -- wall time spent in the phase
+    blocks -- net number of memory blocks allocated (see sys.getallocatedblocks),
+              or 0 for the attributes phase, which is entered once per node
+    bytes -- net bytes allocated, or None unless tracemalloc was tracing
+    calls -- the number of times the phase was entered
+    '''
+
+    __slots__ = ('seconds', 'blocks', 'bytes', 'calls')
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.blocks = 0
+        self.bytes = None
+        self.calls = 0
+
+    def __repr__(self):
+        return '<PhaseStats seconds={:.6f} blocks={} bytes={} calls={}>'.format(
+            self.seconds,
+            self.blocks,
+            self.bytes,
+            self.calls
+        )
+
+
+def _traced_bytes():
+    if tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[0]
+    return None
+
+
+class ParseStats:
+    '''Measurements taken while parsing a diagram, when enabled with
+    ParseOptions(stats=True). Found on Diagram.stats afterwards.
+
+    The phases are:
+    read -- reading the source and decompressing it
+    xml -- parsing the XML
+    build -- creating the layers, groups and objects (including attributes)
+    attributes -- decoding attribute values, or indexing them when lazy
+    link -- linking connections and building the lookup tables (see link_connections)
+    total -- the whole parse
+
+    Attributes:
+    phases -- dictionary mapping phase names to PhaseStats instances
+    objects_by_type -- Counter of the objects created, by type
+    groups -- the number of groups
+    layers -- the number of layers
+    attributes_by_type -- Counter of the attribute values found, by value tag (eg "real")
+    unknown_tags -- Counter of attribute value tags with no decoder
+    '''
+
+    def __init__(self):
+        self.phases = {}
+        self.objects_by_type = Counter()
+        self.groups = 0
+        self.layers = 0
+        self.attributes_by_type = Counter()
+        self.unknown_tags = Counter()
+
+    @property
+    def objects(self):
+        '''The total number of objects'''
+
+        return sum(self.objects_by_type.values())
+
+    def seconds(self, name):
+        '''Returns the time spent in the given phase (0 if it never ran)'''
+
+        phase = self.phases.get(name)
+        return phase.seconds if phase else 0.0
+
+    def record(self, name, seconds, blocks=0, nbytes=None):
+        '''Adds a measurement to the given phase'''
+
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = PhaseStats()
+        phase.seconds += seconds
+        phase.blocks += blocks
+        if nbytes is not None:
+            phase.bytes = (phase.bytes or 0) + nbytes
+        phase.calls += 1
+
+    @contextmanager
+    def phase(self, name, blocks=True):
+        '''A context manager measuring the code inside it as part of the given
+        phase. Counting the allocated blocks takes time in proportion to the
+        size of the heap, so pass blocks=False for phases entered once per
+        node, or the measurements would make the parse quadratic.'''
+
+        start_bytes = _traced_bytes()
+        start_blocks = sys.getallocatedblocks() if blocks else 0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if blocks:
+                blocks = sys.getallocatedblocks() - start_blocks
+            else:
+                blocks = 0
+            end_bytes = _traced_bytes()
+            nbytes = None
+            if start_bytes is not None and end_bytes is not None:
+                nbytes = end_bytes - start_bytes
+            self.record(name, seconds, blocks, nbytes)
+
+    def timed(self, name, iterable):
+        '''Returns an iterator over iterable, measuring the time spent
+        producing each item as part of the given phase'''
+
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count_attributes(self, parent_node):
+        '''Counts the attribute values under an XML node, by value tag'''
+
+        for attrib_node in parent_node.findall(NS + 'attribute'):
+            # Several values for list attributes (eg the points of a line)
+            for value_node in attrib_node:
+                tag = value_node.tag
+                name = tag[len(NS):] if tag.startswith(NS) else tag
+                self.attributes_by_type[name] += 1
+                if tag not in ATTRIBUTE_DECODERS:
+                    self.unknown_tags[name] += 1
+
+    def count_nodes(self, diagram):
+        '''Counts the layers, groups and objects in a diagram'''
+
+        self.layers += len(diagram.layers)
+        stack = [child for layer in diagram.layers for child in layer.children]
+        while stack:
+            node = stack.pop()
+            children = getattr(node, 'children', None)
+            if children is not None:
+                stack.extend(children)
+                self.groups += 1
+            else:
+                self.objects_by_type[node.obj_type] += 1
+
+    def as_dict(self):
+        '''Returns the measurements as a dictionary of plain values'''
+
+        return {
+            'phases' : {
+                name : {
+                    'seconds' : phase.seconds,
+                    'blocks' : phase.blocks,
+                    'bytes' : phase.bytes,
+                    'calls' : phase.calls,
+                }
+                for name, phase in self.phases.items()
+            },
+            'objects' : self.objects,
+            'objects_by_type' : dict(self.objects_by_type),
+            'groups' : self.groups,
+            'layers' : self.layers,
+            'attributes_by_type' : dict(self.attributes_by_type),
+            'unknown_tags' : dict(self.unknown_tags),
+        }
+
+    def summary(self):
+        '''Returns a short human readable report'''
+
+        lines = []
+        for name, phase in self.phases.items():
+            lines.append('{:<12} {:>10.4f}s {:>10} blocks{}'.format(
+                name,
+                phase.seconds,
+                phase.blocks,
+                '' if phase.bytes is None else ' {:>12} bytes'.format(phase.bytes),
+            ))
+        lines.append('{} objects, {} groups, {} layers, {} attributes'.format(
+            self.objects,
+            self.groups,
+            self.layers,
+            sum(self.attributes_by_type.values()),
+        ))
+        if self.unknown_tags:
+            lines.append('unknown tags: ' + ', '.join(sorted(self.unknown_tags)))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return '<ParseStats objects={} groups={} layers={} seconds={:.4f}>'.format(
+            self.objects,
+            self.groups,
+            self.layers,
+            self.seconds('total'),
+        )
@@ -0,0 +1,148 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import time
+from xml.etree import ElementTree
+
+from .ns import NS
+from .options import DEFAULT_OPTIONS
+from .source import iter_xml_chunks
+from .attributes import decode_attributes
+from .obj import parse_object
+from .layer import Layer, Group
+from .diagram import Diagram, DiagramData, parse_diagramdata
+
+_DIAGRAM_TAG = NS + 'diagram'
+_DIAGRAMDATA_TAG = NS + 'diagramdata'
+_LAYER_TAG = NS + 'layer'
+_GROUP_TAG = NS + 'group'
+_OBJECT_TAG = NS + 'object'
+
+
+def stream_diagram(src, options=None):
+    '''Return a Diagram instance built incrementally from the given .dia source.
+
+    The source is anything accepted by iter_xml_chunks (a filename, bytes or a
+    binary file object, compressed or not). Objects, groups and layers are
+    created as soon as their closing tag is read, and the XML subtree is
+    discarded straight afterwards, so the full element tree never exists in
+    memory. With lazy attributes (see ParseOptions) the attribute nodes are
+    kept until their values are read.'''
+
+    if options is None: options = DEFAULT_OPTIONS
+
+    stats = options.collector
+    chunks = iter_xml_chunks(src)
+    if stats is not None:
+        start = time.perf_counter()
+        chunks = stats.timed('read', chunks)
+
+    diagram_data = None
+    layers = []
+    # The chain of open XML elements from the root down to the current one
+    elements = []
+    # One list of built children for each open layer/group element
+    children_stack = []
+
+    parser = ElementTree.XMLPullParser(events=('start', 'end'))
+    for event, elem in _iter_events(parser, chunks, stats):
+        tag = elem.tag
+
+        if event == 'start':
+            if not elements:
+                assert tag == _DIAGRAM_TAG, 'not a dia diagram'
+            elements.append(elem)
+            if tag == _LAYER_TAG or tag == _GROUP_TAG:
+                children_stack.append([])
+            continue
+
+        elements.pop()
+        parent = elements[-1] if elements else None
+
+        if tag == _OBJECT_TAG and children_stack:
+            if options.wants_type(elem.attrib['type']):
+                children_stack[-1].append(parse_object(elem, options))
+
+        elif tag == _GROUP_TAG:
+            children = children_stack.pop()
+            # The group attributes are the only children left on the element
+            children_stack[-1].append(
+                Group(
+                    children=children,
+                    attributes=decode_attributes(elem, options),
+                )
+            )
+
+        elif tag == _LAYER_TAG:
+            children = children_stack.pop()
+            layers.append(
+                Layer(
+                    children=children,
+                    name=elem.attrib['name'],
+                    visible=(elem.attrib['visible'] == 'true'),
+                    connectable=(elem.attrib['connectable'] == 'true'),
+                    active=(elem.attrib.get('active', None) == 'true'),
+                )
+            )
+
+        elif tag == _DIAGRAMDATA_TAG and parent is not None and parent.tag == _DIAGRAM_TAG:
+            diagram_data = parse_diagramdata(elem, options)
+
+        else:
+            # Attributes, connections etc are consumed when their owning
+            # object closes, so keep them around until then.
+            continue
+
+        elem.clear()
+        if parent is not None:
+            parent.remove(elem)
+
+    assert not elements, 'truncated dia diagram'
+
+    if stats is None:
+        return Diagram(
+            diagram_data or DiagramData({}),
+            layers
+        )
+
+    # Building is interleaved with reading and XML parsing, so it is
+    # whatever time is left over
+    stats.record('build', time.perf_counter() - start - stats.seconds('read') - stats.seconds('xml'))
+    with stats.phase('link'):
+        return Diagram(
+            diagram_data or DiagramData({}),
+            layers
+        )
+
+
+def _iter_events(parser, chunks, stats=None):
+    if stats is None:
+        for chunk in chunks:
+            parser.feed(chunk)
+            yield from parser.read_events()
+        parser.close()
+        yield from parser.read_events()
+        return
+
+    for chunk in chunks:
+        with stats.phase('xml'):
+            parser.feed(chunk)
+        yield from parser.read_events()
+    with stats.phase('xml'):
+        parser.close()
+    yield from parser.read_events()
@@ -0,0 +1,148 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import re
+from bisect import bisect_left
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    '''Returns the list of (case folded) words in the given text'''
+
+    return _TOKEN_RE.findall(text.casefold())
+
+
+def object_text(obj):
+    '''Returns the text of an object (see Object.text), or None if it has none'''
+
+    if not obj.attributes:
+        return None
+    try:
+        text = obj.text
+    except (KeyError, TypeError):
+        return None
+    return text if isinstance(text, str) else None
+
+
+class TextComponent:
+    '''An index over the text of the objects in a diagram (see Object.text),
+    for exact, prefix, case-insensitive and word searches.
+
+    The index is built in a single pass the first time it is used, after
+    which exact and word lookups cost a dictionary lookup, and prefix lookups
+    a binary search. Results are lists of objects in diagram order. Call
+    invalidate() after changing the diagram.
+    '''
+
+    def __init__(self, diagram):
+        self.diagram = diagram
+        self._exact = None
+
+    def invalidate(self):
+        '''Discards the index so it is rebuilt on next use'''
+
+        self._exact = None
+
+    def _build(self):
+        exact = {}
+        folded = {}
+        tokens = {}
+        rank = {}
+
+        for obj in self.diagram.objects:
+            text = object_text(obj)
+            if text is None:
+                continue
+            rank[obj] = len(rank)
+            exact.setdefault(text, []).append(obj)
+            folded.setdefault(text.casefold(), []).append(obj)
+            for token in set(tokenize(text)):
+                tokens.setdefault(token, []).append(obj)
+
+        self._exact = exact
+        self._folded = folded
+        self._tokens = tokens
+        self._rank = rank
+        self._sorted = sorted(exact)
+        self._sorted_folded = sorted(folded)
+
+    def _get(self, name):
+        if self._exact is None:
+            self._build()
+        return getattr(self, name)
+
+    def __len__(self):
+        '''The number of objects having text'''
+
+        return len(self._get('_rank'))
+
+    def texts(self):
+        '''Returns the sorted list of distinct texts'''
+
+        return list(self._get('_sorted'))
+
+    def exact(self, text, ignore_case=False):
+        '''Returns the objects whose text equals the given text'''
+
+        if ignore_case:
+            return list(self._get('_folded').get(text.casefold(), ()))
+        return list(self._get('_exact').get(text, ()))
+
+    def prefix(self, prefix, ignore_case=False):
+        '''Returns the objects whose text starts with the given prefix'''
+
+        if ignore_case:
+            prefix = prefix.casefold()
+            keys = self._get('_sorted_folded')
+            table = self._folded
+        else:
+            keys = self._get('_sorted')
+            table = self._exact
+
+        found = []
+        for n in range(bisect_left(keys, prefix), len(keys)):
+            if not keys[n].startswith(prefix):
+                break
+            found.extend(table[keys[n]])
+        return self._in_order(found)
+
+    def word(self, word):
+        '''Returns the objects whose text contains the given word (ignoring case)'''
+
+        return list(self._get('_tokens').get(word.casefold(), ()))
+
+    def search(self, query):
+        '''Returns the objects whose text contains every word in the query (ignoring case)'''
+
+        words = set(tokenize(query))
+        if not words:
+            return []
+        tokens = self._get('_tokens')
+        # Start from the rarest word, then check the rest against it
+        matches = sorted((tokens.get(word, ()) for word in words), key=len)
+        found = set(matches[0])
+        for objects in matches[1:]:
+            if not found:
+                break
+            found.intersection_update(objects)
+        return self._in_order(found)
+
+    def _in_order(self, objects):
+        rank = self._rank
+        return sorted(objects, key=rank.__getitem__)
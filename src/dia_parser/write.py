@@ -0,0 +1,371 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import base64
+import gzip
+import os
+import re
+from collections.abc import Mapping
+from itertools import repeat
+from xml.sax.saxutils import escape, quoteattr
+
+from .ns import NS
+from .attributes import LazyAttributes
+
+# Integer attributes written as <dia:enum> rather than <dia:int>. Both decode
+# to an int, so the tag is chosen by attribute name.
+ENUM_ATTRIBUTES = {
+    'alignment',
+    'aspect',
+    'corner_types',
+    'end_arrow',
+    'line_caps',
+    'line_join',
+    'line_style',
+    'orth_orient',
+    'start_arrow',
+    'text_alignment',
+    'text_fitting',
+    'valign',
+}
+
+# The type of the <dia:composite> written for a dictionary attribute (or for
+# each item of a list attribute), where it differs from the attribute name (eg
+# "text" is written as type="text")
+COMPOSITE_TYPES = {
+    'meta' : 'dict',
+    'attributes' : 'umlattribute',
+    'operations' : 'umloperation',
+    'parameters' : 'umlparameter',
+    'templates' : 'umlformalparameter',
+}
+
+# The number of characters collected before encoding and writing them out
+CHUNK_SIZE = 64 * 1024
+
+# Groups nested deeper than this are not indented any further, so that the
+# size of the output stays proportional to the number of nodes
+MAX_GROUP_INDENT = 64
+
+_COLOR_RE = re.compile(r'#[0-9a-fA-F]{6}(?:[0-9a-fA-F]{2})?\Z')
+_SPECIAL_RE = re.compile(r'[&<>"\n\r\t]')
+
+# Maps namespaced tags to their prefixed names (eg "dia:point")
+_TAG_NAMES = {}
+
+
+def _quote(value):
+    '''A faster quoteattr for the common case of nothing to escape'''
+
+    if _SPECIAL_RE.search(value) is None:
+        return '"' + value + '"'
+    return quoteattr(value)
+
+
+def _escape(text):
+    if _SPECIAL_RE.search(text) is None:
+        return text
+    return escape(text)
+
+
+def _format_real(value):
+    text = repr(float(value))
+    if text.endswith('.0'):
+        text = text[:-2]
+    return text
+
+
+def _format_point(point):
+    return '{},{}'.format(_format_real(point[0]), _format_real(point[1]))
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def encode_attribute_value(name, value):
+    '''Returns the XML value element (eg '<dia:real val="1"/>') for an
+    attribute value, as decoded by parse_attribute_value. Dictionaries are
+    composites and lists hold several values, and both are written by the
+    caller.'''
+
+    if isinstance(value, bool):
+        return '<dia:boolean val="{}"/>'.format('true' if value else 'false')
+
+    if isinstance(value, int):
+        tag = 'enum' if name in ENUM_ATTRIBUTES else 'int'
+        return '<dia:{} val="{}"/>'.format(tag, value)
+
+    if isinstance(value, float):
+        return '<dia:real val="{}"/>'.format(_format_real(value))
+
+    if isinstance(value, str):
+        if _COLOR_RE.match(value):
+            return '<dia:color val="{}"/>'.format(value)
+        return '<dia:string>{}</dia:string>'.format(_escape(value))
+
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return '<dia:pixbuf data={}/>'.format(_quote(base64.b64encode(value).decode('ascii')))
+
+    if isinstance(value, tuple):
+        if len(value) == 2 and all(map(_is_number, value)):
+            return '<dia:point val="{}"/>'.format(_format_point(value))
+
+        if len(value) == 4 and all(map(_is_number, value)):
+            return '<dia:rectangle val="{};{}"/>'.format(
+                _format_point(value[:2]),
+                _format_point(value[2:]),
+            )
+
+        if len(value) == 3 and all(isinstance(item, str) for item in value):
+            return '<dia:font family={} style={} name={}/>'.format(*map(_quote, value))
+
+        if len(value) == 4 and isinstance(value[0], str):
+            points = ''.join(
+                ' {}="{}"'.format(point_name, _format_point(point))
+                for point_name, point in zip(('p1', 'p2', 'p3'), value[1:])
+                if point is not None
+            )
+            return '<dia:bezpoint type={}{}/>'.format(_quote(value[0]), points)
+
+    raise TypeError('cannot write attribute {} with value {!r}'.format(name, value))
+
+
+def _tag_name(tag):
+    try:
+        return _TAG_NAMES[tag]
+    except KeyError:
+        pass
+    name = 'dia:' + tag[len(NS):] if tag.startswith(NS) else tag
+    _TAG_NAMES[tag] = name
+    return name
+
+
+def _write_element(out, elem, indent):
+    '''Appends an XML element from a parsed file (and its descendants) to out'''
+
+    stack = [(elem, indent)]
+    while stack:
+        elem, indent = stack.pop()
+        if isinstance(elem, str):
+            # The closing tag of an element written earlier
+            out.append(' ' * indent + elem)
+            continue
+
+        pad = ' ' * indent
+        start = pad + '<' + _tag_name(elem.tag) + ''.join(
+            ' ' + _tag_name(key) + '=' + _quote(value)
+            for key, value in elem.attrib.items()
+        )
+        if len(elem):
+            out.append(start + '>\n')
+            stack.append(('</{}>\n'.format(_tag_name(elem.tag)), indent))
+            stack.extend((child, indent + 2) for child in reversed(elem))
+        elif elem.text is not None:
+            out.append('{}>{}</{}>\n'.format(start, _escape(elem.text), _tag_name(elem.tag)))
+        else:
+            out.append(start + '/>\n')
+
+
+def _iter_attribute_items(attributes):
+    '''Yields (name, value, raw XML node) for each attribute. The raw node is
+    given instead of the value for lazy attributes that were never read.'''
+
+    if isinstance(attributes, LazyAttributes):
+        for name in attributes:
+            node = attributes.raw_node(name)
+            if node is not None:
+                yield name, None, node
+            else:
+                yield name, attributes[name], None
+        return
+
+    for name, value in attributes.items():
+        yield name, value, None
+
+
+def _write_attributes(out, attributes, indent):
+    '''Appends the <dia:attribute> elements for a dictionary of attributes to out'''
+
+    if not attributes:
+        return
+
+    # Composites are written with an explicit stack rather than by recursion.
+    # Each entry is (iterator over (name, value, raw node), indent, closing
+    # tags, whether the values are the items of a list attribute).
+    stack = [(_iter_attribute_items(attributes), indent, None, False)]
+    while stack:
+        items, indent, closing, in_list = stack[-1]
+        pad = ' ' * indent
+        for name, value, node in items:
+            if node is not None:
+                _write_element(out, node, indent)
+            elif isinstance(value, Mapping):
+                composite = '<dia:composite type={}>'.format(_quote(COMPOSITE_TYPES.get(name, name)))
+                if in_list:
+                    out.append(pad + composite + '\n')
+                    stack.append((_iter_attribute_items(value), indent + 2, pad + '</dia:composite>\n', False))
+                else:
+                    out.append('{0}<dia:attribute name={1}>\n{0}  {2}\n'.format(pad, _quote(name), composite))
+                    stack.append((
+                        _iter_attribute_items(value),
+                        indent + 4,
+                        '{0}  </dia:composite>\n{0}</dia:attribute>\n'.format(pad),
+                        False,
+                    ))
+                break
+            elif in_list:
+                out.append(pad + encode_attribute_value(name, value) + '\n')
+            elif value is None or (isinstance(value, list) and not value):
+                out.append('{}<dia:attribute name={}/>\n'.format(pad, _quote(name)))
+            elif isinstance(value, list):
+                out.append('{}<dia:attribute name={}>\n'.format(pad, _quote(name)))
+                stack.append((
+                    # The name is bound now, since the loop rebinds it while
+                    # writing any composite items
+                    zip(repeat(name), value, repeat(None)),
+                    indent + 2,
+                    pad + '</dia:attribute>\n',
+                    True,
+                ))
+                break
+            else:
+                out.append('{0}<dia:attribute name={1}>\n{0}  {2}\n{0}</dia:attribute>\n'.format(
+                    pad,
+                    _quote(name),
+                    encode_attribute_value(name, value),
+                ))
+        else:
+            stack.pop()
+            if closing:
+                out.append(closing)
+
+
+def _object_xml(obj, indent):
+    if obj.obj_id is None:
+        raise ValueError('cannot write an object without an ID ({!r})'.format(obj))
+
+    pad = ' ' * indent
+    out = ['{}<dia:object type={} version={} id={}>\n'.format(
+        pad,
+        _quote(obj.obj_type or ''),
+        _quote(str(obj.version if obj.version is not None else 0)),
+        _quote(str(obj.obj_id)),
+    )]
+    _write_attributes(out, obj.attributes, indent + 2)
+    connections = obj.connections_by_handle
+    if connections:
+        out.append(pad + '  <dia:connections>\n')
+        for conn in connections.values():
+            out.append('{}    <dia:connection handle="{}" to={} connection={}/>\n'.format(
+                pad,
+                conn.handle,
+                _quote(str(conn.to_id)),
+                _quote(str(conn.connection)),
+            ))
+        out.append(pad + '  </dia:connections>\n')
+    out.append(pad + '</dia:object>\n')
+    return ''.join(out)
+
+
+def iter_dia_xml(diagram):
+    '''Returns an iterator over the pieces of the Dia XML document for a
+    diagram (as strings). Each object is produced as it is reached, so the
+    whole document never exists in memory at once.
+
+    Attribute value types are taken from the Python values (see
+    encode_attribute_value), with ENUM_ATTRIBUTES and COMPOSITE_TYPES
+    deciding between tags that decode to the same thing. Lazy attributes
+    that were never read are copied from the original XML unchanged. Groups
+    are indented by nesting depth, up to MAX_GROUP_INDENT spaces.'''
+
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<dia:diagram xmlns:dia={}>\n'.format(
+        _quote(NS[1:-1])
+    )
+
+    out = ['  <dia:diagramdata>\n']
+    if diagram.diagram_data is not None:
+        _write_attributes(out, diagram.diagram_data.attributes, 4)
+    out.append('  </dia:diagramdata>\n')
+    yield ''.join(out)
+
+    for layer in diagram.layers:
+        yield '  <dia:layer name={} visible="{}" connectable="{}"{}>\n'.format(
+            _quote(layer.name or ''),
+            'true' if layer.visible else 'false',
+            'true' if layer.connectable else 'false',
+            ' active="true"' if layer.active else '',
+        )
+
+        # Each entry is (iterator over the remaining children, their indent,
+        # the closing tag of the group or None for the layer)
+        stack = [(iter(layer.children), 4, None)]
+        while stack:
+            children, indent, closing = stack[-1]
+            for child in children:
+                if hasattr(child, 'children'):
+                    pad = ' ' * indent
+                    out = [pad + '<dia:group>\n']
+                    _write_attributes(out, child.attributes, indent + 2)
+                    yield ''.join(out)
+                    stack.append((
+                        iter(child.children),
+                        min(indent + 2, MAX_GROUP_INDENT),
+                        pad + '</dia:group>\n',
+                    ))
+                    break
+                yield _object_xml(child, indent)
+            else:
+                stack.pop()
+                if closing:
+                    yield closing
+
+        yield '  </dia:layer>\n'
+
+    yield '</dia:diagram>\n'
+
+
+def write_dia_file(diagram, dst, compress=True, level=6):
+    '''Writes a diagram as a .dia file.
+
+    The destination is a filename or a binary file object. The file is gzip
+    compressed (as Dia saves it) unless compress is false, with level
+    trading speed against size (1 to 9). The XML is encoded and written out
+    in chunks while the diagram is walked (see iter_dia_xml).'''
+
+    if isinstance(dst, (str, bytes, os.PathLike)):
+        with open(dst, 'wb') as fp:
+            write_dia_file(diagram, fp, compress, level)
+        return
+
+    sink = gzip.GzipFile(fileobj=dst, mode='wb', compresslevel=level) if compress else dst
+    try:
+        pieces = []
+        size = 0
+        for piece in iter_dia_xml(diagram):
+            pieces.append(piece)
+            size += len(piece)
+            if size >= CHUNK_SIZE:
+                sink.write(''.join(pieces).encode('utf-8'))
+                pieces = []
+                size = 0
+        sink.write(''.join(pieces).encode('utf-8'))
+    finally:
+        if compress:
+            # Flushes the compressed data, leaving the destination open
+            sink.close()
@@ -0,0 +1,80 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import gc
+import os
+import pickle
+import weakref
+import pytest
+import site
+site.addsitedir('src')
+
+from dia_parser import parse_dia_files, parse_dia_file
+
+SRCS = [
+    os.path.join('tests', 'data', 'Diagram1.dia'),
+    os.path.join('tests', 'data', 'connections.dia'),
+    os.path.join('tests', 'data', 'missing.dia'),
+    os.path.join('tests', 'data', 'lines.dia'),
+]
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_it_parses_every_file_and_captures_errors(workers):
+    results = {result.src : result for result in parse_dia_files(SRCS, workers=workers)}
+
+    assert set(results) == set(SRCS)
+    assert not results[SRCS[2]]
+    assert isinstance(results[SRCS[2]].error, FileNotFoundError)
+    assert 'FileNotFoundError' in results[SRCS[2]].traceback
+
+    diagram = results[SRCS[0]].diagram
+    assert results[SRCS[0]]
+    assert [layer.name for layer in diagram.layers] == ['Background', 'Second']
+    assert diagram.objects['O5'].as_line.connected_to is diagram.objects['O3']
+
+def test_it_keeps_the_input_order_when_asked():
+    results = list(parse_dia_files(SRCS, workers=2, ordered=True, lazy=True))
+    assert [result.src for result in results] == SRCS
+    assert results[1].diagram.objects['O0'].text == 'Box has a line from its center'
+
+def test_diagrams_survive_pickling():
+    diagram = pickle.loads(pickle.dumps(parse_dia_file(SRCS[1])))
+    box = diagram.objects['O0']
+    assert box.outbound_lines == [diagram.objects['O2']]
+    assert box.connections == []
+
+@pytest.mark.parametrize('ordered', [False, True])
+def test_it_keeps_few_files_in_flight(ordered):
+    taken = []
+    def sources():
+        for n in range(12):
+            taken.append(n)
+            yield SRCS[n % 2]
+
+    results = parse_dia_files(sources(), workers=2, ordered=ordered)
+    diagrams = []
+    for result in results:
+        # The files taken but not yet yielded are in flight (at most two per
+        # worker) or finished and waiting to be yielded (as many again)
+        assert len(taken) - len(diagrams) <= 8
+        diagrams.append(weakref.ref(result.diagram))
+        del result
+        gc.collect()
+        # Nothing is kept of the results already yielded
+        assert all(ref() is None for ref in diagrams)
+    assert len(diagrams) == 12
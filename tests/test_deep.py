@@ -0,0 +1,151 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import io
+import pickle
+import site
+import sys
+site.addsitedir('src')
+
+import pytest
+
+from dia_parser import (
+    parse_dia_file,
+    parse_attributes,
+    reparse,
+    write_dia_file,
+    save_snapshot,
+    load_snapshot,
+    approximate_size,
+    Group,
+)
+from dia_parser.ns import NS
+from xml.etree import ElementTree
+
+# Well past the recursion limit
+DEPTH = max(10000, sys.getrecursionlimit() * 2)
+
+def box(n):
+    return '''<dia:object type="Standard - Box" version="0" id="O{0}">
+<dia:attribute name="obj_bb"><dia:rectangle val="{0},0;{1},1"/></dia:attribute>
+</dia:object>
+'''.format(n, n + 1)
+
+# A box followed by a group at every level, the innermost group holding the last box
+SRC = ('''<?xml version="1.0" encoding="UTF-8"?>
+<dia:diagram xmlns:dia="http://www.lysator.liu.se/~alla/dia/">
+<dia:layer name="Background" visible="true" connectable="true" active="true">
+''' + ''.join(box(n) + '<dia:group>\n' for n in range(DEPTH)) + box(DEPTH) +
+    '</dia:group>\n' * DEPTH + '''</dia:layer>
+</dia:diagram>
+''').encode('utf-8')
+
+def tokens(layer):
+    '''The tree as a flat list (object IDs, "(" and ")" around groups)'''
+
+    result = []
+    stack = [iter(layer.children)]
+    while stack:
+        for child in stack[-1]:
+            if isinstance(child, Group):
+                result.append('(')
+                stack.append(iter(child.children))
+                break
+            result.append(child.obj_id)
+        else:
+            stack.pop()
+            result.append(')')
+    return result[:-1]
+
+EXPECTED = (
+    [token for n in range(DEPTH) for token in ('O{}'.format(n), '(')] +
+    ['O{}'.format(DEPTH)] +
+    [')'] * DEPTH
+)
+
+def check(diagram):
+    layer = diagram.layers[0]
+    assert tokens(layer) == EXPECTED
+    innermost = diagram.objects['O{}'.format(DEPTH)]
+    assert innermost.layer is layer
+    assert innermost.attributes['obj_bb'] == (DEPTH, 0, DEPTH + 1, 1)
+    assert innermost.z_index == 0
+    assert diagram.objects['O1'].z_index == 0
+    assert diagram.objects['O1'].parent.z_index == 1
+
+@pytest.mark.parametrize('kwargs', [{}, {'lazy' : True}, {'stream' : True}, {'stats' : True}])
+def test_parse_deep_nesting(kwargs):
+    check(parse_dia_file(SRC, **kwargs))
+
+def test_pickle_deep_nesting():
+    diagram = pickle.loads(pickle.dumps(parse_dia_file(SRC)))
+    check(diagram)
+    # The groups know their layer, and the layer its diagram
+    group = diagram.objects['O{}'.format(DEPTH)].parent
+    assert group.layer is diagram.layers[0]
+    assert diagram.layers[0].diagram is diagram
+
+def test_pickle_object_first():
+    # Pickling starts from an object deep inside, rather than from the layer
+    diagram = parse_dia_file(SRC)
+    obj = pickle.loads(pickle.dumps(diagram.objects['O{}'.format(DEPTH)]))
+    assert tokens(obj.layer) == EXPECTED
+    assert obj.z_index == 0
+
+def test_reparse_deep_nesting():
+    diagram = parse_dia_file(SRC)
+    outer = diagram.objects['O0']
+    report = reparse(diagram, SRC)
+    assert not report
+    assert diagram.objects['O0'] is outer
+
+    report = reparse(diagram, SRC.replace('id="O{}"'.format(DEPTH).encode('utf-8'), b'id="X"'))
+    assert [obj.obj_id for obj in report.added] == ['X']
+    assert report.unchanged == DEPTH
+    assert diagram.objects['O0'] is outer
+
+    report = reparse(diagram, SRC)
+    assert [obj.obj_id for obj in report.added] == ['O{}'.format(DEPTH)]
+    check(diagram)
+
+def test_write_deep_nesting():
+    out = io.BytesIO()
+    write_dia_file(parse_dia_file(SRC), out, compress=False)
+    data = out.getvalue()
+    # The indentation stops growing, so the output does not grow with the square of the depth
+    assert len(data) < len(SRC) * 4
+    check(parse_dia_file(data))
+
+def test_snapshot_deep_nesting():
+    out = io.BytesIO()
+    save_snapshot(parse_dia_file(SRC), out)
+    check(load_snapshot(out.getvalue()))
+
+def test_approximate_size_deep_nesting():
+    assert approximate_size(parse_dia_file(SRC)) > 0
+
+def test_deeply_nested_composites():
+    xml = '<dia:object xmlns:dia="{}">{}<dia:attribute name="x"><dia:int val="1"/></dia:attribute>{}</dia:object>'.format(
+        NS[1:-1],
+        '<dia:attribute name="a"><dia:composite type="a">' * DEPTH,
+        '</dia:composite></dia:attribute>' * DEPTH,
+    )
+    attributes = parse_attributes(ElementTree.fromstring(xml))
+    for _ in range(DEPTH):
+        attributes = attributes['a']
+    assert attributes == {'x' : 1}
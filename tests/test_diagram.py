@@ -180,3 +180,40 @@ def test_diagram_iterates_over_nodes():
     )
 
     assert list(diagram.nodes) == [group, obj1, obj2, obj]
+
+def test_objects_are_bucketed_by_type():
+    box1 = Object(obj_id='1', obj_type='Flowchart - Box')
+    box2 = Object(obj_id='2', obj_type='Flowchart - Box')
+    text = Object(obj_id='3', obj_type='Standard - Text')
+    line = Object(
+        obj_id='4',
+        obj_type='Standard - Line',
+        attributes={'conn_endpoints' : [(0, 0), (1, 1)]},
+    )
+    diagram = Diagram(
+        DiagramData(),
+        layers=[
+            Layer([box1, line]),
+            Layer([text, box2]),
+        ]
+    )
+
+    assert diagram.objects.by_type('Flowchart - Box') == [box1, box2]
+    assert diagram.objects.by_type('UML - Class') == []
+    assert diagram.objects.types() == ['Flowchart - Box', 'Standard - Line', 'Standard - Text']
+    assert diagram.objects.filter_lines() == [line]
+    assert diagram.objects.filter_non_lines() == [box1, text, box2]
+    assert diagram.objects.filter_lines() is diagram.objects.filter_lines()
+
+def test_object_buckets_rebuild_after_invalidate():
+    box = Object(obj_id='1', obj_type='Flowchart - Box')
+    layer = Layer([box])
+    diagram = Diagram(DiagramData(), layers=[layer])
+    assert diagram.objects.by_type('Flowchart - Box') == [box]
+
+    other = Object(obj_id='2', obj_type='Flowchart - Box')
+    layer.children.append(other)
+    other.parent = layer
+    diagram.objects.invalidate()
+
+    assert diagram.objects.by_type('Flowchart - Box') == [box, other]
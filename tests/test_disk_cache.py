@@ -0,0 +1,108 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import io
+import os
+import shutil
+import pytest
+import site
+site.addsitedir('src')
+
+from dia_parser import parse_dia_file, DiskCache, ParseOptions
+
+SRC = os.path.join('tests', 'data', 'Diagram1.dia')
+
+@pytest.fixture
+def src(tmp_path):
+    path = str(tmp_path / 'diagram.dia')
+    shutil.copy(SRC, path)
+    return path
+
+@pytest.fixture
+def cache(tmp_path):
+    return DiskCache(str(tmp_path / 'cache'))
+
+def test_it_stores_and_reloads_a_diagram(src, cache):
+    first = parse_dia_file(src, cache=cache)
+    assert len(cache.entries()) == 1
+
+    second = parse_dia_file(src, cache=cache)
+    assert second is not first
+    assert [obj.obj_id for obj in second.objects] == [obj.obj_id for obj in first.objects]
+    assert second.objects['O5'].as_line.connected_to is second.objects['O3']
+
+def test_it_reparses_a_changed_file(src, cache, tmp_path):
+    parse_dia_file(src, cache=cache)
+    shutil.copy(os.path.join('tests', 'data', 'lines.dia'), src)
+    os.utime(src, ns=(1, 1))
+
+    diagram = parse_dia_file(src, cache=cache)
+    assert len(cache.entries()) == 2
+    assert len(diagram.layers) == 1
+
+def test_options_are_part_of_the_key(src, cache):
+    parse_dia_file(src, cache=cache)
+    diagram = parse_dia_file(src, cache=cache, types=['Flowchart - Box'])
+    assert len(cache.entries()) == 2
+    assert {obj.type for obj in diagram.objects} == {'Flowchart - Box'}
+
+def test_it_can_key_by_content(src, cache, tmp_path):
+    cache.use_hash = True
+    other = str(tmp_path / 'copy.dia')
+    shutil.copy(src, other)
+
+    parse_dia_file(src, cache=cache)
+    parse_dia_file(other, cache=cache)
+    parse_dia_file(open(src, 'rb').read(), cache=cache)
+    assert len(cache.entries()) == 1
+
+def test_it_does_not_cache_file_objects(src, cache):
+    parse_dia_file(io.BytesIO(open(src, 'rb').read()), cache=cache)
+    assert cache.entries() == []
+
+def test_it_evicts_least_recently_used_entries(src, cache):
+    parse_dia_file(src, cache=cache, types=['A'])
+    parse_dia_file(src, cache=cache, types=['B'])
+    entries = cache.entries()
+    os.utime(entries[0][2], ns=(1, 1))
+    os.utime(entries[1][2], ns=(2, 2))
+    # Using the first entry makes the second one the oldest
+    parse_dia_file(src, cache=cache, types=['A'])
+    kept = cache.entries()[-1][2]
+
+    cache.max_bytes = max(size for _, size, _ in cache.entries())
+    cache.evict()
+    assert [path for _, _, path in cache.entries()] == [kept]
+
+def test_it_replaces_damaged_entries(src, cache):
+    parse_dia_file(src, cache=cache)
+    path = cache.entries()[0][2]
+    with open(path, 'wb') as fp:
+        fp.write(b'garbage')
+
+    diagram = parse_dia_file(src, cache=cache)
+    assert len(diagram.layers) == 2
+    assert os.path.getsize(path) > len(b'garbage')
+
+def test_stats_bypass_the_cache(src, cache):
+    parse_dia_file(src, cache=cache)
+    reported = []
+    diagram = parse_dia_file(src, cache=cache, on_stats=reported.append)
+    assert reported == [diagram.stats]
+    assert diagram.stats.objects > 0
+    assert len(cache.entries()) == 1
@@ -0,0 +1,94 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import site
+site.addsitedir('src')
+
+import pytest
+
+from dia_parser import parse_dia_file, reparse, load_snapshot, save_snapshot, Group, Object, Layer
+
+def box(obj_id, left, top, right, bottom):
+    return '''
+    <dia:object type="Standard - Box" version="0" id="{}">
+      <dia:attribute name="obj_bb">
+        <dia:rectangle val="{},{};{},{}"/>
+      </dia:attribute>
+    </dia:object>'''.format(obj_id, left, top, right, bottom)
+
+# Objects and groups interleaved, overlapping at (1, 1)
+SRC = '''<?xml version="1.0" encoding="UTF-8"?>
+<dia:diagram xmlns:dia="http://www.lysator.liu.se/~alla/dia/">
+  <dia:layer name="Background" visible="true" connectable="true" active="true">
+    {}
+    <dia:group>
+      {}
+      <dia:group>{}</dia:group>
+      {}
+    </dia:group>
+    {}
+  </dia:layer>
+</dia:diagram>
+'''.format(
+    box('O0', 0, 0, 2, 2),
+    box('O1', 0, 0, 2, 2),
+    box('O2', 5, 5, 6, 6),
+    box('O3', 0, 0, 2, 2),
+    box('O4', 0, 0, 2, 2),
+).encode('utf-8')
+
+def shape(node):
+    return [
+        shape(child) if isinstance(child, Group) else child.obj_id
+        for child in node.children
+    ]
+
+EXPECTED = ['O0', ['O1', ['O2'], 'O3'], 'O4']
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_children_keep_document_order(stream):
+    diagram = parse_dia_file(SRC, stream=stream)
+    assert shape(diagram.layers[0]) == EXPECTED
+    assert [obj.obj_id for obj in diagram.objects] == ['O0', 'O1', 'O2', 'O3', 'O4']
+
+def test_reparse_keeps_document_order():
+    diagram = parse_dia_file(SRC)
+    reparse(diagram, SRC.replace(b'5,5;6,6', b'5,5;7,7'))
+    assert shape(diagram.layers[0]) == EXPECTED
+
+def test_snapshots_keep_document_order(tmp_path):
+    path = str(tmp_path / 'diagram.snapshot')
+    save_snapshot(parse_dia_file(SRC), path)
+    assert shape(load_snapshot(path).layers[0]) == EXPECTED
+
+def test_nodes_know_their_stacking_position():
+    diagram = parse_dia_file(SRC)
+    layer = diagram.layers[0]
+    assert [child.z_index for child in layer.children] == [0, 1, 2]
+    assert diagram.objects['O3'].z_index == 2
+    assert Object().z_index is None
+
+    # Still right after the children are changed by hand
+    group = layer.children[1]
+    group.children.reverse()
+    assert diagram.objects['O3'].z_index == 0
+
+def test_hits_come_in_stacking_order():
+    diagram = parse_dia_file(SRC)
+    hits = diagram.spatial.at_point(1, 1)
+    assert [obj.obj_id for obj in hits] == ['O0', 'O1', 'O3', 'O4']
@@ -0,0 +1,84 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import pytest
+import site
+site.addsitedir('src')
+site.addsitedir('benchmarks')
+
+from dia_parser import parse_dia_file, is_gzip_data, Group
+from generate_diagram import write_diagram, iter_diagram_xml
+
+def generate(**kwargs):
+    return ''.join(iter_diagram_xml(**kwargs)).encode('utf-8')
+
+def depth(node):
+    count = 0
+    while isinstance(node.parent, Group):
+        count += 1
+        node = node.parent
+    return count
+
+def test_it_generates_boxes_and_lines():
+    diagram = parse_dia_file(generate(objects=50, line_density=2.0))
+
+    assert len(diagram.objects.by_type('Flowchart - Box')) == 50
+    assert len(diagram.objects.filter_lines()) == 100
+    assert diagram.link_report
+    for line in diagram.objects.filter_lines():
+        assert line.as_line.connected_to is not None
+        assert line.as_line.connected_from is not None
+
+def test_it_nests_groups():
+    diagram = parse_dia_file(generate(objects=25, group_depth=3, group_size=10))
+
+    boxes = diagram.objects.by_type('Flowchart - Box')
+    assert len(boxes) == 25
+    assert {depth(box) for box in boxes} == {3}
+    assert len(diagram.layers[0].children) == 3 + 25
+
+def test_it_spreads_objects_over_layers():
+    diagram = parse_dia_file(generate(objects=10, layers=3))
+
+    assert [layer.name for layer in diagram] == ['Background', 'Layer 1', 'Layer 2']
+    assert [len(layer.children) for layer in diagram] == [8, 8, 4]
+    assert diagram.link_report
+
+def test_it_varies_attribute_richness():
+    minimal = parse_dia_file(generate(objects=1, line_density=0, attributes='minimal'))
+    rich = parse_dia_file(generate(objects=1, line_density=0, attributes='rich'))
+
+    assert minimal.objects['O0'].text is None
+    assert rich.objects['O0'].text == 'Box 0'
+    assert rich.objects['O0'].attributes['meta'] == {'owner' : '#team 0#', 'step' : '#0#'}
+    assert len(rich.objects['O0'].attributes) > len(minimal.objects['O0'].attributes)
+
+    with pytest.raises(ValueError):
+        generate(attributes='lavish')
+
+def test_it_is_repeatable():
+    assert generate(objects=20, seed=3) == generate(objects=20, seed=3)
+    assert generate(objects=20, seed=3) != generate(objects=20, seed=4)
+
+def test_it_writes_compressed_files(tmp_path):
+    path = str(tmp_path / 'big.dia')
+    write_diagram(path, compress=True, objects=20)
+
+    with open(path, 'rb') as fp:
+        assert is_gzip_data(fp.read(2))
+    assert len(list(parse_dia_file(path).objects)) == 40
@@ -0,0 +1,81 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import math
+import os
+import pytest
+import site
+site.addsitedir('src')
+
+from dia_parser import parse_dia_file, Diagram, DiagramData, Layer, Object
+
+def make_diagram():
+    return Diagram(
+        DiagramData(),
+        layers=[
+            Layer([
+                Object(obj_id='1', attributes={
+                    'obj_pos' : (1.0, 2.0),
+                    'obj_bb' : (1.0, 2.0, 3.0, 4.0),
+                    'elem_width' : 2.0,
+                    'elem_height' : 2.0,
+                }),
+                Object(obj_id='2', attributes={}),
+                Object(obj_id='3', attributes={
+                    'obj_bb' : (0.0, 5.0, 10.0, 6.0),
+                }),
+            ])
+        ]
+    )
+
+def test_it_builds_parallel_arrays():
+    diagram = make_diagram()
+    geometry = diagram.geometry
+
+    assert len(geometry) == 2
+    assert [obj.obj_id for obj in geometry.objects] == ['1', '3']
+    assert list(geometry.index) == [0, 2]
+    assert list(geometry.bboxes) == [1.0, 2.0, 3.0, 4.0, 0.0, 5.0, 10.0, 6.0]
+    assert list(geometry.positions)[:2] == [1.0, 2.0]
+    assert all(math.isnan(value) for value in geometry.positions[2:])
+    assert geometry.widths[0] == 2.0 and math.isnan(geometry.widths[1])
+
+def test_it_queries_bounds_and_areas():
+    geometry = make_diagram().geometry
+
+    assert geometry.bbox(1) == (0.0, 5.0, 10.0, 6.0)
+    assert geometry.bounds() == (0.0, 2.0, 10.0, 6.0)
+    assert list(geometry.areas()) == [4.0, 10.0]
+    assert [obj.obj_id for obj in geometry.filter_area(min_area=5)] == ['3']
+
+def test_it_handles_diagrams_without_geometry():
+    geometry = Diagram(DiagramData(), layers=[]).geometry
+    assert len(geometry) == 0
+    assert geometry.bounds() is None
+
+def test_it_reads_geometry_from_a_file():
+    diagram = parse_dia_file(os.path.join('tests', 'data', 'Diagram1.dia'))
+    geometry = diagram.geometry
+    assert len(geometry) == len(list(diagram.objects))
+    assert geometry.bbox(0) == diagram.objects['O0'].attributes['obj_bb']
+
+def test_it_wraps_arrays_for_numpy():
+    numpy = pytest.importorskip('numpy')
+    arrays = make_diagram().geometry.as_numpy()
+    assert arrays['bboxes'].shape == (2, 4)
+    assert numpy.all(arrays['bboxes'][:, 2] == [3.0, 10.0])
@@ -0,0 +1,172 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import pytest
+import site
+site.addsitedir('src')
+
+from dia_parser import Diagram, DiagramData, Layer, Object, Connection, CycleError
+
+def make_line(obj_id, from_id, to_id):
+    return Object(
+        obj_id=obj_id,
+        attributes={
+            'conn_endpoints' : [
+                (0, 0),
+                (1, 1),
+            ]
+        },
+        connections=(
+            Connection(handle=0, to_id=from_id),
+            Connection(handle=1, to_id=to_id),
+        )
+    )
+
+def make_diagram(*objects):
+    return Diagram(
+        DiagramData(),
+        layers=[
+            Layer(list(objects))
+        ]
+    )
+
+def test_it_indexes_outbound_and_inbound_lines():
+    box1 = Object(obj_id='1')
+    box2 = Object(obj_id='2')
+    box3 = Object(obj_id='3')
+    line1 = make_line('L1', '1', '2')
+    line2 = make_line('L2', '1', '3')
+    diagram = make_diagram(box1, box2, box3, line1, line2)
+
+    assert diagram.graph.outbound(box1) == [(line1, box2), (line2, box3)]
+    assert diagram.graph.inbound(box3) == [(line2, box1)]
+    assert box1.outbound_lines == [line1, line2]
+    assert box2.inbound_lines == [line1]
+    assert box2.outbound == []
+
+def test_it_indexes_objects_connected_to_an_object():
+    box1 = Object(obj_id='1')
+    box2 = Object(obj_id='2')
+    line = make_line('L1', '1', '1')
+    text = Object(
+        obj_id='T',
+        connections=(
+            Connection(handle=0, to_id='1'),
+        )
+    )
+    diagram = make_diagram(box1, box2, line, text)
+
+    assert box1.connected_to_this == [line, text]
+    assert box2.connected_to_this == []
+
+def test_it_ignores_dangling_connections():
+    box1 = Object(obj_id='1')
+    line = make_line('L1', '1', 'missing')
+    diagram = make_diagram(box1, line)
+
+    assert box1.outbound == [(line, None)]
+
+def test_it_rebuilds_after_invalidate():
+    box1 = Object(obj_id='1')
+    box2 = Object(obj_id='2')
+    layer = Layer([box1, box2])
+    diagram = Diagram(DiagramData(), layers=[layer])
+    assert box1.outbound == []
+
+    line = make_line('L1', '1', '2')
+    layer.children.append(line)
+    line.parent = layer
+    diagram.object_map[line.obj_id] = line
+    diagram.graph.invalidate()
+
+    assert box1.outbound == [(line, box2)]
+
+def make_workflow(edges, count):
+    boxes = [Object(obj_id=str(n)) for n in range(count)]
+    lines = [
+        make_line('L%d' % n, str(a), str(b))
+        for n, (a, b) in enumerate(edges)
+    ]
+    return make_diagram(*(boxes + lines)), boxes
+
+def test_it_traverses_breadth_and_depth_first():
+    diagram, boxes = make_workflow([(0, 1), (0, 2), (1, 3), (2, 3), (3, 4)], 6)
+    graph = diagram.graph
+
+    assert list(graph.bfs(boxes[0])) == [boxes[0], boxes[1], boxes[2], boxes[3], boxes[4]]
+    assert list(graph.dfs(boxes[0])) == [boxes[0], boxes[1], boxes[3], boxes[4], boxes[2]]
+    assert list(graph.bfs(boxes[3], reverse=True)) == [boxes[3], boxes[1], boxes[2], boxes[0]]
+    assert graph.successors(boxes[0]) == [boxes[1], boxes[2]]
+    assert graph.predecessors(boxes[3]) == [boxes[1], boxes[2]]
+    assert graph.nodes() == boxes
+
+def test_it_answers_reachability():
+    diagram, boxes = make_workflow([(0, 1), (1, 2), (3, 2)], 5)
+    graph = diagram.graph
+
+    assert graph.descendants(boxes[0]) == {boxes[1], boxes[2]}
+    assert graph.ancestors(boxes[2]) == {boxes[0], boxes[1], boxes[3]}
+    assert graph.has_path(boxes[0], boxes[2])
+    assert not graph.has_path(boxes[2], boxes[0])
+    assert graph.has_path(boxes[4], boxes[4])
+
+def test_it_finds_shortest_paths():
+    diagram, boxes = make_workflow([(0, 1), (1, 2), (2, 3), (0, 4), (4, 3)], 5)
+    graph = diagram.graph
+
+    assert graph.shortest_path(boxes[0], boxes[3]) == [boxes[0], boxes[4], boxes[3]]
+    assert graph.shortest_path(boxes[3], boxes[0]) is None
+    assert graph.shortest_path(boxes[1], boxes[1]) == [boxes[1]]
+
+def test_it_sorts_topologically():
+    diagram, boxes = make_workflow([(2, 1), (1, 0), (3, 0)], 4)
+
+    order = diagram.graph.topological_sort()
+    assert order == [boxes[2], boxes[3], boxes[1], boxes[0]]
+    assert diagram.graph.find_cycle() is None
+
+def test_it_detects_cycles():
+    diagram, boxes = make_workflow([(0, 1), (1, 2), (2, 3), (3, 1)], 5)
+
+    with pytest.raises(CycleError) as info:
+        diagram.graph.topological_sort()
+
+    cycle = info.value.cycle
+    assert set(cycle) == {boxes[1], boxes[2], boxes[3]}
+    for n, obj in enumerate(cycle):
+        assert cycle[(n + 1) % len(cycle)] in diagram.graph.successors(obj)
+    assert set(diagram.graph.find_cycle()) == set(cycle)
+
+def test_it_finds_connected_components():
+    diagram, boxes = make_workflow([(0, 1), (2, 1), (3, 4)], 6)
+
+    assert diagram.graph.connected_components() == [
+        [boxes[0], boxes[1], boxes[2]],
+        [boxes[3], boxes[4]],
+        [boxes[5]],
+    ]
+
+def test_it_handles_long_chains_without_recursion():
+    count = 20000
+    diagram, boxes = make_workflow([(n, n + 1) for n in range(count - 1)], count)
+    graph = diagram.graph
+
+    assert graph.topological_sort() == boxes
+    assert len(list(graph.dfs(boxes[0]))) == count
+    assert len(graph.shortest_path(boxes[0], boxes[-1])) == count
+    assert len(graph.connected_components()) == 1
@@ -19,7 +19,10 @@
 import site
 site.addsitedir('src')
 
-from dia_parser import Group, Object, Layer
+import pickle
+
+from dia_parser import Group, Object, Layer, Diagram, DiagramData
+from dia_parser.layer import GroupBase
 
 def test_group_iterates_all_objects():
     obj1 = Object()
@@ -82,3 +85,88 @@ def test_it_iterates_over_nodes():
     ])
 
     assert list(group1.iter_nodes()) == [obj1, obj2, group2, obj3]
+
+def test_it_iterates_over_nested_groups():
+    obj1 = Object()
+    obj2 = Object()
+    group3 = Group([obj2])
+    group2 = Group([group3])
+    group1 = Group([obj1, group2])
+
+    assert list(group1.iter_nodes()) == [obj1, group2, group3, obj2]
+    assert list(group1.iter_objects()) == [obj1, obj2]
+
+def test_it_walks_deep_nesting():
+    obj = Object()
+    node = obj
+    for _ in range(5000):
+        node = Group([node])
+    layer = Layer([node])
+
+    assert list(layer.iter_objects()) == [obj]
+    assert sum(1 for _ in layer.iter_nodes()) == 5001
+    assert obj.layer is layer
+
+def test_nodes_point_at_their_layer():
+    obj1 = Object()
+    obj2 = Object()
+    group = Group([obj2])
+    assert obj2.layer is None
+
+    layer = Layer([obj1, group])
+    diagram = Diagram(DiagramData(), [layer])
+    assert obj1.layer is layer
+    assert group.layer is layer
+    assert obj2.layer is layer
+    assert obj2.diagram is diagram
+
+    # Moving a group moves everything in it
+    other = Layer([])
+    layer.set_children([obj1])
+    other.set_children([group])
+    assert obj2.layer is other
+    assert obj1.layer is layer
+
+    obj3 = Object()
+    group.replace_child(obj2, obj3)
+    assert obj3.parent is group
+    assert obj3.layer is other
+    assert group.children == [obj3]
+
+def test_nodes_added_by_hand_find_their_layer():
+    layer = Layer([])
+    obj = Object()
+    layer.children.append(obj)
+    obj.parent = layer
+    assert obj.layer is layer
+
+def test_nodes_moved_by_hand_find_their_new_layer():
+    obj = Object()
+    group = Group([])
+    l1 = Layer([obj])
+    l2 = Layer([group])
+    assert obj.layer is l1
+
+    l1.children.remove(obj)
+    l2.children.append(obj)
+    obj.parent = l2
+    assert obj.layer is l2
+
+    l2.children.remove(obj)
+    group.children.append(obj)
+    obj.parent = group
+    assert obj.layer is l2
+
+def test_a_bare_group_base_holds_children():
+    obj = Object()
+    node = GroupBase([obj])
+    assert obj.parent is node
+    assert obj.layer is None
+    node.replace_child(obj, Object())
+    assert node.children[0].parent is node
+
+def test_the_layer_survives_pickling():
+    obj = Object(obj_id='1')
+    layer = Layer([Group([obj])], name='Background')
+    copy = pickle.loads(pickle.dumps(layer))
+    assert copy.children[0].children[0].layer is copy
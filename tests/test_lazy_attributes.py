@@ -0,0 +1,86 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import os
+import pickle
+import pytest
+import site
+site.addsitedir('src')
+
+from dia_parser import parse_dia_file, LazyAttributes, ParseOptions, attributes
+
+from test_parse_attr_value import parse_dia_element
+
+SRC = os.path.join('tests', 'data', 'connections.dia')
+
+ELEMENT = '''
+  <dia:composite type="grid">
+    <dia:attribute name="dynamic">
+      <dia:boolean val="true"/>
+    </dia:attribute>
+    <dia:attribute name="width_x">
+      <dia:real val="1"/>
+    </dia:attribute>
+    <dia:attribute name="broken">
+      <dia:real val="not a number"/>
+    </dia:attribute>
+  </dia:composite>
+'''
+
+def test_it_lists_names_without_decoding():
+    attrs = LazyAttributes(parse_dia_element(ELEMENT))
+    assert list(attrs) == ['dynamic', 'width_x', 'broken']
+    assert len(attrs) == 3
+    assert 'broken' in attrs
+    assert 'missing' not in attrs
+
+def test_it_decodes_values_on_access():
+    attrs = LazyAttributes(parse_dia_element(ELEMENT))
+    assert attrs['dynamic'] is True
+    assert attrs.get('width_x') == 1.0
+    assert attrs.get('missing') is None
+    with pytest.raises(ValueError):
+        attrs['broken']
+
+def test_it_supports_assignment_and_deletion():
+    attrs = LazyAttributes(parse_dia_element(ELEMENT))
+    attrs['width_x'] = 5.0
+    attrs['extra'] = 'value'
+    del attrs['broken']
+    assert dict(attrs) == {'dynamic': True, 'width_x': 5.0, 'extra': 'value'}
+
+def test_it_pickles_as_a_dictionary():
+    attrs = LazyAttributes(parse_dia_element(ELEMENT))
+    del attrs['broken']
+    assert pickle.loads(pickle.dumps(attrs)) == {'dynamic': True, 'width_x': 1.0}
+
+def test_lazy_diagram_matches_eager_diagram():
+    eager = parse_dia_file(SRC)
+    lazy = parse_dia_file(SRC, lazy=True)
+
+    for obj in eager.objects:
+        other = lazy.objects[obj.obj_id]
+        assert isinstance(other.attributes, LazyAttributes)
+        assert other.is_line == obj.is_line
+        assert other.text == obj.text
+        assert other.attributes == obj.attributes
+    assert lazy.objects['O2'].as_line.connected_to == lazy.objects['O1']
+
+def test_lazy_streamed_diagram_keeps_attribute_nodes():
+    diagram = parse_dia_file(SRC, stream=True, options=ParseOptions(lazy=True))
+    assert diagram.objects['O0'].text == 'Box has a line from its center'
@@ -0,0 +1,66 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import os
+import pytest
+import site
+site.addsitedir('src')
+
+from dia_parser import parse_dia_file, Diagram, DiagramData, Layer, Object, Connection
+
+def test_it_links_connections_to_objects():
+    obj1 = Object(obj_id='1')
+    obj2 = Object(
+        obj_id='2',
+        connections=(
+            Connection(handle=0, to_id='1'),
+        )
+    )
+    diagram = Diagram(DiagramData(), layers=[Layer([obj1, obj2])])
+
+    assert obj2.connections[0].target is obj1
+    assert obj2.connections[0].to is obj1
+    assert diagram.link_report
+    assert diagram.link_report.dangling == []
+    assert diagram.link_report.duplicate_ids == {}
+
+def test_it_reports_dangling_connections():
+    conn = Connection(handle=0, to_id='missing')
+    obj = Object(obj_id='1', connections=(conn,))
+    diagram = Diagram(DiagramData(), layers=[Layer([obj])])
+
+    assert not diagram.link_report
+    assert diagram.link_report.dangling == [conn]
+    assert conn.target is None
+    with pytest.raises(KeyError):
+        conn.to
+
+def test_it_reports_duplicate_ids():
+    obj1 = Object(obj_id='1')
+    obj2 = Object(obj_id='1')
+    diagram = Diagram(DiagramData(), layers=[Layer([obj1]), Layer([obj2])])
+
+    assert diagram.link_report.duplicate_ids == {'1': [obj1, obj2]}
+    assert diagram.objects['1'] is obj2
+
+def test_parsed_diagrams_are_linked():
+    diagram = parse_dia_file(os.path.join('tests', 'data', 'Diagram1.dia'))
+
+    assert diagram.link_report
+    line = diagram.objects['O5']
+    assert line.as_line.connection_from.target is diagram.objects['O0']
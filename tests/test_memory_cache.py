@@ -0,0 +1,95 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import os
+import shutil
+import pytest
+import site
+site.addsitedir('src')
+
+from dia_parser import parse_dia_file, MemoryCache, approximate_size
+
+DATA = os.path.join('tests', 'data')
+
+@pytest.fixture
+def srcs(tmp_path):
+    paths = []
+    for name in ('Diagram1.dia', 'connections.dia', 'lines.dia'):
+        path = str(tmp_path / name)
+        shutil.copy(os.path.join(DATA, name), path)
+        paths.append(path)
+    return paths
+
+def test_it_returns_the_same_diagram_while_unchanged(srcs):
+    cache = MemoryCache()
+    first = parse_dia_file(srcs[0], cache=cache)
+    assert parse_dia_file(srcs[0], cache=cache) is first
+    assert cache.stats() == {
+        'entries' : 1,
+        'bytes' : 0,
+        'hits' : 1,
+        'misses' : 1,
+        'reloads' : 0,
+        'evictions' : 0,
+    }
+
+def test_it_reloads_a_changed_file(srcs):
+    cache = MemoryCache()
+    first = parse_dia_file(srcs[0], cache=cache)
+    shutil.copy(srcs[2], srcs[0])
+    os.utime(srcs[0], ns=(1, 1))
+
+    second = parse_dia_file(srcs[0], cache=cache)
+    assert second is not first
+    assert len(second.layers) == 1
+    assert cache.reloads == 1
+    assert len(cache) == 1
+
+def test_it_evicts_by_entry_count(srcs):
+    cache = MemoryCache(max_entries=2)
+    first = parse_dia_file(srcs[0], cache=cache)
+    parse_dia_file(srcs[1], cache=cache)
+    parse_dia_file(srcs[0], cache=cache)
+    parse_dia_file(srcs[2], cache=cache)
+
+    assert cache.evictions == 1
+    assert parse_dia_file(srcs[0], cache=cache) is first
+    assert cache.misses == 3
+
+def test_it_evicts_by_size(srcs):
+    cache = MemoryCache(max_bytes=1, sizeof=lambda diagram: 1)
+    parse_dia_file(srcs[0], cache=cache)
+    parse_dia_file(srcs[1], cache=cache)
+    assert len(cache) == 1
+    assert cache.evictions == 1
+    assert cache.stats()['bytes'] == 1
+
+def test_it_keys_by_options(srcs):
+    cache = MemoryCache()
+    full = parse_dia_file(srcs[0], cache=cache)
+    boxes = parse_dia_file(srcs[0], cache=cache, types=['Flowchart - Box'])
+    assert full is not boxes
+    assert len(cache) == 2
+
+def test_approximate_size_grows_with_the_diagram(srcs):
+    small = approximate_size(parse_dia_file(srcs[2]))
+    large = approximate_size(parse_dia_file(srcs[1]))
+    assert 0 < small < large
+    lazy = parse_dia_file(srcs[1], lazy=True)
+    approximate_size(lazy)
+    assert lazy.objects['O0'].attributes.decoded() == {}
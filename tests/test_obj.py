@@ -193,3 +193,24 @@ def test_property_connected_to_this():
     )
 
     assert obj1.connected_to_this == [obj]
+
+def test_model_classes_have_no_instance_dict():
+    obj = Object(
+        connections=(
+            Connection(handle=0, to_id='1'),
+        )
+    )
+    for instance in (obj, obj.connections[0], Group([]), Layer([])):
+        assert not hasattr(instance, '__dict__')
+
+def test_line_component_is_created_on_demand():
+    obj = Object(
+        attributes={
+            'conn_endpoints' : [
+                (0, 0),
+                (1, 1),
+            ]
+        },
+    )
+    assert obj.as_line is obj.as_line
+    assert obj.as_line.obj is obj
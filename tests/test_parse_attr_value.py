@@ -95,3 +95,61 @@ def test_it_parses_a_list_of_attributes():
     attrs = attributes.parse_attributes(el)
     assert attrs == {'dynamic': True, 'width_x': 1.0, 'width_y': 1.0, 'visible_x': 1, 'visible_y': 1}
 
+
+def test_it_parses_font():
+    el = parse_dia_element('<dia:font family="sans" style="0" name="Helvetica"/>')
+    assert attributes.parse_font(el) == ('sans', '0', 'Helvetica')
+
+def test_it_parses_bezpoint():
+    el = parse_dia_element('<dia:bezpoint type="curveto" p1="1,2" p2="3,4" p3="5,6"/>')
+    assert attributes.parse_bezpoint(el) == ('curveto', (1.0, 2.0), (3.0, 4.0), (5.0, 6.0))
+
+    el = parse_dia_element('<dia:bezpoint type="moveto" p1="1,2"/>')
+    assert attributes.parse_bezpoint(el) == ('moveto', (1.0, 2.0), None, None)
+
+def test_it_parses_pixbuf():
+    el = parse_dia_element('<dia:pixbuf data="aGVsbG8="/>')
+    assert attributes.parse_pixbuf(el) == b'hello'
+
+def test_it_dispatches_on_the_value_tag():
+    el = parse_dia_element('<dia:attribute name="pos"><dia:point val="1,2"/></dia:attribute>')
+    assert attributes.parse_attribute_value(el) == (1.0, 2.0)
+
+def test_it_returns_empty_string_for_unknown_tags():
+    el = parse_dia_element('<dia:attribute name="x"><dia:mystery val="1"/></dia:attribute>')
+    assert attributes.parse_attribute_value(el) == ''
+
+def test_it_uses_registered_decoders():
+    el = parse_dia_element('<dia:attribute name="x"><dia:custom val="abc"/></dia:attribute>')
+    attributes.register_attribute_decoder('custom', lambda node: node.attrib['val'].upper())
+    try:
+        assert attributes.parse_attribute_value(el) == 'ABC'
+    finally:
+        del attributes.ATTRIBUTE_DECODERS[attributes.NS + 'custom']
+
+def test_it_parses_a_single_uml_operation_as_a_list():
+    data = '''
+  <dia:object type="UML - Class">
+    <dia:attribute name="operations">
+      <dia:composite type="umloperation">
+        <dia:attribute name="name">
+          <dia:string>#run#</dia:string>
+        </dia:attribute>
+        <dia:attribute name="parameters">
+          <dia:composite type="umlparameter">
+            <dia:attribute name="name">
+              <dia:string>#arg#</dia:string>
+            </dia:attribute>
+          </dia:composite>
+        </dia:attribute>
+      </dia:composite>
+    </dia:attribute>
+    <dia:attribute name="attributes"/>
+  </dia:object>
+    '''
+
+    el = parse_dia_element(data)
+    expected = [{'name' : '#run#', 'parameters' : [{'name' : '#arg#'}]}]
+    assert attributes.parse_attributes(el) == {'operations' : expected, 'attributes' : []}
+    assert attributes.parse_attribute_value(el[0]) == expected
+    assert dict(attributes.LazyAttributes(el)) == {'operations' : expected, 'attributes' : []}
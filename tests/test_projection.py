@@ -0,0 +1,59 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import os
+import pytest
+import site
+site.addsitedir('src')
+
+from dia_parser import parse_dia_file, ParseOptions, LINE_ATTRIBUTES
+
+SRC = os.path.join('tests', 'data', 'connections.dia')
+
+@pytest.mark.parametrize('stream', [False, True])
+@pytest.mark.parametrize('lazy', [False, True])
+def test_it_only_decodes_the_requested_attributes(stream, lazy):
+    diagram = parse_dia_file(SRC, stream=stream, lazy=lazy, attributes=['text', 'obj_bb'])
+
+    box = diagram.objects['O0']
+    assert set(box.attributes) == {'text', 'obj_bb'}
+    assert box.text == 'Box has a line from its center'
+
+    line = diagram.objects['O2']
+    assert set(line.attributes) <= {'text', 'obj_bb'} | LINE_ATTRIBUTES
+    assert line.is_line
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_it_only_creates_the_requested_types(stream):
+    diagram = parse_dia_file(SRC, stream=stream, types=['Flowchart - Box', 'Standard - Line'])
+
+    types = {obj.type for obj in diagram.objects}
+    assert types == {'Flowchart - Box', 'Standard - Line'}
+    assert diagram.objects['O2'].as_line.connected_to == diagram.objects['O1']
+    with pytest.raises(KeyError):
+        diagram.objects['O4']
+
+def test_skipped_objects_are_reported_as_dangling():
+    diagram = parse_dia_file(SRC, types=['Standard - Text'])
+    assert {conn.to_id for conn in diagram.link_report.dangling} >= {'O2', 'O3'}
+
+def test_default_options_keep_everything():
+    options = ParseOptions()
+    assert options.attributes is None
+    assert options.types is None
+    assert options.wants_type('anything')
@@ -0,0 +1,148 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import os
+import site
+site.addsitedir('src')
+
+from dia_parser import (
+    parse_dia_file, Diagram, DiagramData, Layer, Group, Object, Connection, Selector
+)
+
+def make_box(obj_id, text, x, y, obj_type='Flowchart - Box'):
+    return Object(
+        obj_id=obj_id,
+        obj_type=obj_type,
+        attributes={
+            'obj_bb' : (x, y, x + 1, y + 1),
+            'text' : {'string' : '#' + text + '#'},
+        }
+    )
+
+def make_line(obj_id, from_id, to_id):
+    return Object(
+        obj_id=obj_id,
+        obj_type='Standard - Line',
+        attributes={'conn_endpoints' : [(0, 0), (1, 1)]},
+        connections=(
+            Connection(handle=0, to_id=from_id),
+            Connection(handle=1, to_id=to_id),
+        )
+    )
+
+def make_diagram():
+    start = make_box('1', 'Start', 0, 0)
+    check = make_box('2', 'Check order', 2, 0)
+    note = make_box('3', 'A note', 10, 10, obj_type='UML - Note')
+    ship = make_box('4', 'Ship order', 4, 0)
+    grouped = make_box('5', 'Check stock', 6, 0)
+    group = Group([grouped])
+    diagram = Diagram(
+        DiagramData(),
+        layers=[
+            Layer([start, check, note, make_line('L1', '1', '2'), make_line('L2', '2', '4')], name='Background'),
+            Layer([ship, group, make_line('L3', '1', '5')], name='Second'),
+        ]
+    )
+    return diagram, group
+
+def ids(objects):
+    return [obj.id for obj in objects]
+
+def test_it_selects_by_type_and_layer():
+    diagram, _ = make_diagram()
+
+    assert ids(diagram.select(type='Flowchart - Box')) == ['1', '2', '4', '5']
+    assert ids(diagram.select(type=['UML - Note', 'Flowchart - Box'])) == ['1', '2', '3', '4', '5']
+    assert ids(diagram.select(type='Flowchart - Box', layer='Second')) == ['4', '5']
+    assert ids(diagram.select(layer=diagram['Background'], is_line=False)) == ['1', '2', '3']
+    assert ids(diagram.select(is_line=True)) == ['L1', 'L2', 'L3']
+
+
+def test_layer_criterion_follows_groups_moved_by_hand():
+    diagram, group = make_diagram()
+    diagram['Second'].children.remove(group)
+    diagram['Background'].children.append(group)
+    group.parent = diagram['Background']
+
+    assert ids(diagram.select(type='Flowchart - Box', layer='Background')) == ['1', '2', '5']
+    assert ids(diagram.select(type='Flowchart - Box', layer='Second')) == ['4']
+
+def test_it_selects_by_group():
+    diagram, group = make_diagram()
+
+    assert ids(diagram.select(group=group)) == ['5']
+    assert ids(diagram.select(type='Flowchart - Box', group=group)) == ['5']
+
+def test_it_selects_by_attributes():
+    diagram, _ = make_diagram()
+
+    assert ids(diagram.select(where={'text.string' : '#Start#'})) == ['1']
+    assert ids(diagram.select(where={'obj_bb' : lambda bb: bb[0] >= 4})) == ['3', '4', '5']
+    assert diagram.select(where={'missing.path' : 1}) == []
+
+def test_it_selects_by_text():
+    diagram, _ = make_diagram()
+
+    assert ids(diagram.select(text='Check order')) == ['2']
+    assert ids(diagram.select(search='order')) == ['2', '4']
+    assert ids(diagram.select(search='check', layer='Second')) == ['5']
+
+def test_it_selects_by_region():
+    diagram, _ = make_diagram()
+
+    assert ids(diagram.select(within=(1.5, -1, 4.5, 2))) == ['2', '4']
+    assert ids(diagram.select(within=(1.5, -1, 4.5, 2), layer='Second')) == ['4']
+    assert ids(diagram.select(within=(1.5, -1, 4.5, 2), type='UML - Note')) == []
+
+def test_it_selects_by_connections():
+    diagram, _ = make_diagram()
+    start = diagram.objects['1']
+    ship = diagram.objects['4']
+
+    assert ids(diagram.select(linked_from=start)) == ['2', '5']
+    assert ids(diagram.select(linked_from=start, layer='Second')) == ['5']
+    assert ids(diagram.select(linked_to=ship)) == ['2']
+    assert ids(diagram.select(connected=False, is_line=False)) == ['3']
+
+def test_it_plans_from_the_smallest_index():
+    diagram, _ = make_diagram()
+    start = diagram.objects['1']
+
+    assert Selector(type='Flowchart - Box', text='Start').explain(diagram) == (
+        'text index (1 candidates), then check type'
+    )
+    assert Selector(type='Flowchart - Box', linked_from=start).explain(diagram) == (
+        'graph (2 candidates), then check type'
+    )
+    assert Selector(layer='Second', where={'text.string' : '#Start#'}).explain(diagram) == (
+        'layer scan (3 candidates), then check where'
+    )
+    assert Selector(where={'text.string' : '#Start#'}).explain(diagram).startswith('scan')
+
+    # The spatial grid is only preferred to other indexes once it exists
+    selector = Selector(is_line=False, within=(1.5, -1, 4.5, 2))
+    assert selector.explain(diagram).startswith('line index')
+    diagram.spatial.index()
+    assert selector.explain(diagram).startswith('spatial index')
+
+def test_it_selects_from_a_file():
+    diagram = parse_dia_file(os.path.join('tests', 'data', 'connections.dia'))
+
+    boxes = diagram.select(type='Flowchart - Box', search='center')
+    assert ids(boxes) == ['O0', 'O1', 'O20', 'O22']
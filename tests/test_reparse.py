@@ -0,0 +1,132 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import os
+import re
+import pytest
+import site
+site.addsitedir('src')
+
+from dia_parser import parse_dia_file, read_dia_file, reparse
+
+DATA = os.path.join('tests', 'data')
+
+@pytest.fixture(params=['scan', 'tree'])
+def xml(request):
+    text = read_dia_file(os.path.join(DATA, 'connections.dia'))
+    if request.param == 'tree':
+        # A comment makes reparse fall back to parsing the whole tree
+        text = text.replace('<dia:layer ', '<!-- comment --><dia:layer ', 1)
+    return text
+
+def object_xml(text, obj_id):
+    return re.search(r'<dia:object [^>]*id="%s">.*?</dia:object>' % obj_id, text, re.S).group(0)
+
+def test_it_keeps_unchanged_objects(xml):
+    diagram = parse_dia_file(xml.encode('utf-8'))
+    objects = list(diagram.objects)
+    layer = diagram.layers[0]
+
+    report = reparse(diagram, xml.encode('utf-8'))
+
+    assert not report
+    assert report.unchanged == len(objects)
+    assert list(diagram.objects) == objects
+    assert all(a is b for a, b in zip(diagram.objects, objects))
+    assert diagram.layers[0].name == layer.name
+
+def test_it_reports_modified_objects(xml):
+    diagram = parse_dia_file(xml.encode('utf-8'))
+    box = diagram.objects['O0']
+    other = diagram.objects['O1']
+
+    changed = xml.replace(
+        object_xml(xml, 'O0'),
+        object_xml(xml, 'O0').replace('Box has a line from its center', 'Changed')
+    )
+    report = reparse(diagram, changed.encode('utf-8'))
+
+    assert report.added == []
+    assert report.removed == []
+    assert len(report.modified) == 1
+    old, new = report.modified[0]
+    assert old is box
+    assert new is diagram.objects['O0']
+    assert new.text == 'Changed'
+    assert diagram.objects['O1'] is other
+    assert report.unchanged == len(list(diagram.objects)) - 1
+
+def test_it_reports_added_and_removed_objects(xml):
+    diagram = parse_dia_file(xml.encode('utf-8'))
+    removed = diagram.objects['O17']
+
+    note = object_xml(xml, 'O17')
+    changed = xml.replace(note, note.replace('id="O17"', 'id="O99"'))
+    report = reparse(diagram, changed.encode('utf-8'))
+
+    assert report.removed == [removed]
+    assert [obj.id for obj in report.added] == ['O99']
+    assert report.modified == []
+    assert 'O17' not in diagram.object_map
+    assert diagram.objects['O99'].layer is diagram.layers[0]
+
+def test_it_relinks_connections(xml):
+    diagram = parse_dia_file(xml.encode('utf-8'))
+    line = diagram.objects['O2']
+    target = line.as_line.connected_to
+
+    changed = xml.replace(
+        object_xml(xml, target.id),
+        object_xml(xml, target.id).replace('<dia:real val="', '<dia:real val="1', 1)
+    )
+    reparse(diagram, changed.encode('utf-8'))
+
+    assert diagram.objects['O2'] is line
+    assert line.as_line.connected_to is diagram.objects[target.id]
+    assert line.as_line.connected_to is not target
+    assert line in diagram.objects[target.id].inbound_lines
+
+def test_it_reuses_fingerprints_across_reparses():
+    xml = read_dia_file(os.path.join(DATA, 'connections.dia'))
+    diagram = parse_dia_file(xml.encode('utf-8'))
+    reparse(diagram, xml.encode('utf-8'))
+    assert diagram.fingerprints
+    box = diagram.objects['O0']
+    layer = diagram.layers[0]
+
+    changed = xml.replace(object_xml(xml, 'O1'), '')
+    report = reparse(diagram, changed.encode('utf-8'))
+    assert [obj.id for obj in report.removed] == ['O1']
+    assert diagram.objects['O0'] is box
+    assert diagram.layers[0] is layer
+
+    # Unchanged layers are reused whole
+    report = reparse(diagram, changed.encode('utf-8'))
+    assert not report
+    assert diagram.layers[0] is layer
+
+def test_it_reparses_groups():
+    xml = read_dia_file(os.path.join(DATA, 'Diagram1.dia'))
+    diagram = parse_dia_file(xml.encode('utf-8'))
+    objects = list(diagram.objects)
+    reparse(diagram, xml.encode('utf-8'))
+    assert [id(obj) for obj in diagram.objects] == [id(obj) for obj in objects]
+
+    expected = parse_dia_file(xml.encode('utf-8'))
+    assert [obj.id for obj in diagram.objects] == [obj.id for obj in expected.objects]
+    assert [type(node).__name__ for node in diagram.nodes] == [type(node).__name__ for node in expected.nodes]
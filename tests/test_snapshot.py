@@ -0,0 +1,153 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import io
+import os
+import pickle
+import site
+site.addsitedir('src')
+site.addsitedir('benchmarks')
+
+import pytest
+
+from dia_parser import (
+    parse_dia_file,
+    save_snapshot,
+    load_snapshot,
+    is_gzip_data,
+    Diagram,
+    DiagramData,
+    Layer,
+    Group,
+    Object,
+    Connection,
+)
+from generate_diagram import iter_diagram_xml
+
+SRC = os.path.join('tests', 'data', 'Diagram1.dia')
+
+def generate(**kwargs):
+    return ''.join(iter_diagram_xml(**kwargs)).encode('utf-8')
+
+def describe(node):
+    children = []
+    for child in node.children:
+        if isinstance(child, Group):
+            children.append(('group', child.attributes, describe(child)))
+        else:
+            children.append((
+                child.obj_id,
+                child.obj_type,
+                child.version,
+                dict(child.attributes),
+                [(conn.handle, conn.to_id, conn.connection) for conn in child.connections],
+            ))
+    return children
+
+def assert_equivalent(diagram, other):
+    assert dict(diagram.diagram_data.attributes) == other.diagram_data.attributes
+    assert len(diagram.layers) == len(other.layers)
+    for layer, other_layer in zip(diagram.layers, other.layers):
+        assert (layer.name, layer.visible, layer.connectable, layer.active) == \
+            (other_layer.name, other_layer.visible, other_layer.connectable, other_layer.active)
+        assert describe(layer) == describe(other_layer)
+
+def snapshot(diagram, **kwargs):
+    fp = io.BytesIO()
+    save_snapshot(diagram, fp, **kwargs)
+    return fp.getvalue()
+
+def test_it_round_trips_a_file():
+    diagram = parse_dia_file(SRC)
+    copy = load_snapshot(snapshot(diagram))
+    assert_equivalent(diagram, copy)
+    assert copy.link_report
+    for obj in copy.objects:
+        for conn in obj.connections:
+            assert conn.to is copy.objects[conn.to_id]
+    assert [obj.id for obj in copy.objects.filter_lines()] == [obj.id for obj in diagram.objects.filter_lines()]
+
+def test_it_round_trips_lazy_and_grouped_diagrams():
+    src = generate(objects=40, line_density=2.0, group_depth=3, group_size=4, attributes='rich', layers=2)
+    diagram = parse_dia_file(src, lazy=True)
+    copy = load_snapshot(snapshot(diagram))
+    assert_equivalent(parse_dia_file(src), copy)
+
+def test_it_loads_compressed_snapshots():
+    diagram = parse_dia_file(SRC)
+    data = snapshot(diagram, compress=True, level=9)
+    assert is_gzip_data(data)
+    assert len(data) < len(snapshot(diagram))
+    assert_equivalent(diagram, load_snapshot(data))
+    assert_equivalent(diagram, load_snapshot(io.BytesIO(data)))
+
+def test_it_maps_files(tmp_path):
+    path = str(tmp_path / 'diagram.snapshot')
+    diagram = parse_dia_file(SRC)
+    save_snapshot(diagram, path)
+    copy = load_snapshot(path)
+    assert_equivalent(diagram, copy)
+    # The geometry is used from the mapping, not copied
+    assert isinstance(copy.geometry.bboxes, memoryview)
+    assert list(copy.geometry.bboxes) == list(diagram.geometry.bboxes)
+    assert [obj.id for obj in copy.geometry.objects] == [obj.id for obj in diagram.geometry.objects]
+    assert copy.spatial.at_point(*diagram.geometry.positions[:2])
+
+def test_it_stores_strings_once():
+    diagram = parse_dia_file(generate(objects=50, attributes='rich'))
+    data = snapshot(diagram)
+    assert data.count(b'Flowchart - Box') == 1
+    assert data.count(b'Helvetica') == 1
+    boxes = load_snapshot(data).objects.by_type('Flowchart - Box')
+    assert boxes[0].obj_type is boxes[1].obj_type
+    assert boxes[0].attributes['text']['font'][2] is boxes[1].attributes['text']['font'][2]
+
+def test_it_keeps_link_problems():
+    diagram = Diagram(DiagramData(), [Layer([
+        Object(obj_id='O0', obj_type='Box', version='0', attributes={}),
+        Object(obj_id='O0', obj_type='Box', version='0', attributes={}),
+        Object(obj_id='O1', obj_type='Line', version='0', attributes={'conn_endpoints' : (0.0, 0.0)},
+               connections=[Connection(handle=0, to_id='O0', connection='1'), Connection(handle=1, to_id='gone')]),
+    ], name='Background')])
+
+    copy = load_snapshot(snapshot(diagram))
+    assert [conn.to_id for conn in copy.link_report.dangling] == ['gone']
+    assert len(copy.link_report.duplicate_ids['O0']) == 2
+    assert copy.objects['O1'].as_line.connected_from is copy.objects['O0']
+    assert copy.objects['O1'].connections_by_handle[1].connection == 0
+
+def test_it_can_be_pickled():
+    copy = load_snapshot(snapshot(parse_dia_file(SRC)))
+    len(copy.geometry)
+    again = pickle.loads(pickle.dumps(copy))
+    assert len(again.geometry) == len(copy.geometry)
+
+def test_it_refuses_other_data():
+    with pytest.raises(ValueError):
+        load_snapshot(b'not a snapshot at all')
+    data = bytearray(snapshot(parse_dia_file(SRC)))
+    data[8] = 99
+    with pytest.raises(ValueError):
+        load_snapshot(bytes(data))
+
+def test_it_refuses_snapshots_from_other_python_versions():
+    data = bytearray(snapshot(parse_dia_file(SRC)))
+    # The minor Python version follows the magic, snapshot version and major version
+    data[14] ^= 1
+    with pytest.raises(ValueError, match='Python'):
+        load_snapshot(bytes(data))
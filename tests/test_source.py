@@ -0,0 +1,81 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import gzip
+import io
+import mmap
+import os
+import pathlib
+import pytest
+import site
+site.addsitedir('src')
+
+from dia_parser import iter_xml_chunks, is_gzip_data, parse_dia_file
+
+COMPRESSED = os.path.join('tests', 'data', 'Diagram1.dia')
+UNCOMPRESSED = os.path.join('tests', 'data', 'empty-uncompressed.dia')
+
+def read_xml(src, **kwargs):
+    return b''.join(bytes(chunk) for chunk in iter_xml_chunks(src, **kwargs))
+
+def test_it_sniffs_gzip_magic():
+    assert is_gzip_data(open(COMPRESSED, 'rb').read())
+    assert not is_gzip_data(open(UNCOMPRESSED, 'rb').read())
+
+def test_it_reads_compressed_data_from_a_path():
+    assert read_xml(COMPRESSED) == gzip.open(COMPRESSED).read()
+
+def test_it_reads_uncompressed_data_from_a_path():
+    assert read_xml(pathlib.Path(UNCOMPRESSED)) == open(UNCOMPRESSED, 'rb').read()
+
+def test_it_reads_compressed_bytes():
+    data = open(COMPRESSED, 'rb').read()
+    assert read_xml(data) == gzip.open(COMPRESSED).read()
+
+def test_it_reads_a_file_object():
+    with open(COMPRESSED, 'rb') as fp:
+        assert read_xml(fp, chunk_size=100) == gzip.open(COMPRESSED).read()
+
+def test_it_reads_an_mmap():
+    with open(UNCOMPRESSED, 'rb') as fp:
+        mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        assert read_xml(mm) == open(UNCOMPRESSED, 'rb').read()
+
+def test_it_reads_multi_member_gzip_data():
+    xml = open(UNCOMPRESSED, 'rb').read()
+    data = gzip.compress(xml[:100]) + gzip.compress(xml[100:])
+    assert read_xml(data, chunk_size=7) == xml
+
+def test_it_raises_an_assertion_error_for_non_xml_data():
+    with pytest.raises(AssertionError):
+        iter_xml_chunks(b'Hello world')
+    with pytest.raises(AssertionError):
+        iter_xml_chunks(gzip.compress(b'Hello world'))
+
+def test_it_raises_an_error_for_truncated_gzip_data():
+    data = gzip.compress(open(UNCOMPRESSED, 'rb').read())
+    with pytest.raises(EOFError):
+        read_xml(data[:len(data) // 2])
+
+def test_it_parses_diagrams_from_any_source():
+    data = open(COMPRESSED, 'rb').read()
+    for src in (COMPRESSED, data, io.BytesIO(data)):
+        diagram = parse_dia_file(src)
+        assert [layer.name for layer in diagram.layers] == ['Background', 'Second']
+        diagram = parse_dia_file(src if not hasattr(src, 'seek') else io.BytesIO(data), stream=True)
+        assert [layer.name for layer in diagram.layers] == ['Background', 'Second']
@@ -0,0 +1,118 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import math
+import os
+import random
+import site
+site.addsitedir('src')
+
+from dia_parser import Diagram, DiagramData, Layer, Object, GridIndex, object_bbox, parse_dia_file
+
+def make_box(obj_id, left, top, right, bottom):
+    return Object(obj_id=obj_id, attributes={'obj_bb' : (left, top, right, bottom)})
+
+def make_diagram():
+    return Diagram(
+        DiagramData(),
+        layers=[
+            Layer([
+                make_box('A', 0, 0, 2, 2),
+                make_box('B', 1, 1, 3, 3),
+                make_box('C', 10, 10, 12, 12),
+            ], name='Background'),
+            Layer([
+                make_box('D', 0, 0, 1, 1),
+            ], name='Top'),
+        ]
+    )
+
+def ids(objects):
+    return [obj.obj_id for obj in objects]
+
+def test_it_finds_objects_intersecting_a_rectangle():
+    diagram = make_diagram()
+    assert ids(diagram.spatial.intersecting((1.5, 1.5, 5, 5))) == ['A', 'B']
+    assert ids(diagram.spatial.intersecting((-100, -100, 100, 100))) == ['A', 'B', 'C', 'D']
+    assert ids(diagram.spatial.intersecting((50, 50, 60, 60))) == []
+
+def test_it_finds_objects_under_a_point():
+    diagram = make_diagram()
+    assert ids(diagram.spatial.at_point(0.5, 0.5)) == ['A', 'D']
+    assert ids(diagram.spatial.at_point(0.5, 0.5, layer='Background')) == ['A']
+    assert ids(diagram.spatial.at_point(5, 5)) == []
+
+def test_it_finds_nearest_objects():
+    diagram = make_diagram()
+    assert ids(diagram.spatial.nearest(9, 9)) == ['C']
+    assert ids(diagram.spatial.nearest(2.5, 2.5, k=2)) == ['B', 'A']
+    assert ids(diagram.spatial.nearest(100, 100, k=10, layer=diagram['Top'])) == ['D']
+
+def test_it_derives_boxes_from_line_points():
+    line = Object(attributes={'poly_points' : [(0, 5), (4, 1), (2, 3)]})
+    assert object_bbox(line) == (0, 1, 4, 5)
+    curve = Object(attributes={'bez_points' : [('moveto', (0, 0), None, None), ('curveto', (1, -2), (3, 2), (4, 1))]})
+    assert object_bbox(curve) == (0, -2, 4, 2)
+    assert object_bbox(Object(attributes={'obj_pos' : (1, 2)})) == (1, 2, 1, 2)
+    assert object_bbox(Object()) is None
+
+def test_it_derives_boxes_from_parsed_lines():
+    # Without obj_bb, lines fall back to their points (which are always decoded)
+    diagram = parse_dia_file(os.path.join('tests', 'data', 'lines.dia'), attributes=['obj_pos'])
+    lines = [obj for obj in diagram.objects if obj.obj_type == 'Standard - Line']
+    assert lines
+    for line in lines:
+        (x1, y1), (x2, y2) = line.attributes['conn_endpoints']
+        assert object_bbox(line) == (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+
+def test_grid_matches_brute_force():
+    rand = random.Random(1)
+    entries = []
+    for n in range(500):
+        x, y = rand.uniform(0, 100), rand.uniform(0, 100)
+        entries.append((n, (x, y, x + rand.uniform(0, 5), y + rand.uniform(0, 5))))
+    grid = GridIndex(entries)
+
+    for _ in range(50):
+        x, y = rand.uniform(-10, 110), rand.uniform(-10, 110)
+        rect = (x, y, x + 10, y + 10)
+        expected = [
+            n for n, bb in entries
+            if bb[0] <= rect[2] and rect[0] <= bb[2] and bb[1] <= rect[3] and rect[1] <= bb[3]
+        ]
+        assert grid.intersecting(rect) == expected
+
+        def distance(bb):
+            return math.hypot(max(bb[0] - x, 0, x - bb[2]), max(bb[1] - y, 0, y - bb[3]))
+        expected = sorted(distance(bb) for _, bb in entries)[:5]
+        assert [d for d, _ in grid.nearest(x, y, 5)] == expected
+
+def test_nearest_to_far_points():
+    rand = random.Random(2)
+    entries = []
+    for n in range(100):
+        x, y = rand.uniform(0, 100), rand.uniform(0, 100)
+        entries.append((n, (x, y, x + 2, y + 2)))
+    grid = GridIndex(entries)
+
+    # Points far outside the indexed area, which once walked every empty cell on the way
+    for x, y in ((3000, 3000), (-1e6, 50), (50, 1e7), (-5e5, -5e5)):
+        def distance(bb):
+            return math.hypot(max(bb[0] - x, 0, x - bb[2]), max(bb[1] - y, 0, y - bb[3]))
+        expected = sorted(distance(bb) for _, bb in entries)[:3]
+        assert [d for d, _ in grid.nearest(x, y, 3)] == expected
@@ -0,0 +1,119 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import os
+import site
+import sys
+site.addsitedir('src')
+site.addsitedir('benchmarks')
+
+import pytest
+
+from dia_parser import parse_dia_file, ParseOptions, ParseStats
+from generate_diagram import iter_diagram_xml
+
+SRC = os.path.join('tests', 'data', 'Diagram1.dia')
+
+UNKNOWN_TAG = b'''<?xml version="1.0" encoding="UTF-8"?>
+<dia:diagram xmlns:dia="http://www.lysator.liu.se/~alla/dia/">
+  <dia:layer name="Background" visible="true" connectable="true" active="true">
+    <dia:object type="Standard - Box" version="0" id="O0">
+      <dia:attribute name="obj_pos">
+        <dia:point val="1,2"/>
+      </dia:attribute>
+      <dia:attribute name="custom">
+        <dia:sparkle val="yes"/>
+      </dia:attribute>
+    </dia:object>
+    <dia:group>
+      <dia:object type="Standard - Box" version="0" id="O1"/>
+    </dia:group>
+  </dia:layer>
+</dia:diagram>
+'''
+
+def test_stats_disabled_by_default():
+    diagram = parse_dia_file(SRC)
+    assert diagram.stats is None
+
+def test_stats_phases():
+    diagram = parse_dia_file(SRC, stats=True)
+    stats = diagram.stats
+    assert isinstance(stats, ParseStats)
+    for name in ('read', 'xml', 'build', 'attributes', 'link', 'total'):
+        assert name in stats.phases
+        assert stats.seconds(name) >= 0
+    assert stats.seconds('total') >= stats.seconds('xml')
+    assert stats.seconds('missing') == 0
+
+def test_stats_stream_phases():
+    diagram = parse_dia_file(SRC, stream=True, stats=True)
+    stats = diagram.stats
+    for name in ('read', 'xml', 'build', 'attributes', 'link', 'total'):
+        assert name in stats.phases
+
+def test_stats_counts():
+    diagram = parse_dia_file(SRC, stats=True)
+    stats = diagram.stats
+    assert stats.objects == len(list(diagram.objects))
+    assert stats.layers == len(diagram.layers)
+    assert sum(stats.attributes_by_type.values()) > 0
+    assert stats.as_dict()['objects'] == stats.objects
+    assert 'objects' in stats.summary()
+
+def test_stats_unknown_tags():
+    for stream in (False, True):
+        stats = parse_dia_file(UNKNOWN_TAG, stream=stream, stats=True).stats
+        assert stats.objects_by_type == {'Standard - Box' : 2}
+        assert stats.groups == 1
+        assert stats.layers == 1
+        assert stats.attributes_by_type['point'] == 1
+        assert stats.unknown_tags == {'sparkle' : 1}
+
+def test_stats_callback():
+    seen = []
+    options = ParseOptions(on_stats=seen.append)
+    diagram = parse_dia_file(SRC, options=options)
+    assert seen == [diagram.stats]
+    # The options passed in are left alone
+    assert options.collector is None
+
+def test_stats_not_part_of_cache_key():
+    assert ParseOptions(stats=True).cache_key() == ParseOptions().cache_key()
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_stats_cost_does_not_grow_with_the_diagram(monkeypatch, stream):
+    # Counting the allocated blocks walks the whole heap, so it must not be
+    # done for every node
+    calls = []
+    getallocatedblocks = sys.getallocatedblocks
+    def counted():
+        calls.append(1)
+        return getallocatedblocks()
+    monkeypatch.setattr(sys, 'getallocatedblocks', counted)
+
+    counts = []
+    for objects in (10, 150):
+        src = ''.join(iter_diagram_xml(objects=objects, attributes='minimal')).encode('utf-8')
+        # One read chunk either way
+        assert len(src) < 256 * 1024
+        del calls[:]
+        stats = parse_dia_file(src, stream=stream, stats=True).stats
+        assert stats.phases['attributes'].calls > objects
+        counts.append(len(calls))
+    assert counts[0] == counts[1]
@@ -0,0 +1,67 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import io
+import os
+import pytest
+import site
+site.addsitedir('src')
+
+from dia_parser import parse_dia_file, stream_diagram, Diagram, Group
+
+SRC = os.path.join('tests', 'data', 'Diagram1.dia')
+
+def test_it_streams_a_compressed_dia_file():
+    diagram = parse_dia_file(SRC, stream=True)
+    assert isinstance(diagram, Diagram)
+    assert [layer.name for layer in diagram.layers] == ['Background', 'Second']
+
+def test_it_streams_an_uncompressed_dia_file():
+    diagram = parse_dia_file(
+        os.path.join('tests', 'data', 'empty-uncompressed.dia'),
+        stream=True
+    )
+    assert len(diagram.layers) == 1
+
+def test_streamed_diagram_matches_parsed_diagram():
+    parsed = parse_dia_file(SRC)
+    streamed = parse_dia_file(SRC, stream=True)
+
+    assert [node.__class__ for node in streamed.nodes] == [node.__class__ for node in parsed.nodes]
+    assert [obj.obj_id for obj in streamed.objects] == [obj.obj_id for obj in parsed.objects]
+    for obj in parsed.objects:
+        other = streamed.objects[obj.obj_id]
+        assert other.attributes == obj.attributes
+        assert other.obj_type == obj.obj_type
+        assert [conn.to_id for conn in other.connections] == [conn.to_id for conn in obj.connections]
+
+def test_streamed_diagram_keeps_groups():
+    diagram = parse_dia_file(SRC, stream=True)
+    groups = [node for node in diagram.nodes if isinstance(node, Group)]
+    assert groups
+    assert diagram.objects['O9'].layer == diagram['Background']
+
+def test_streamed_diagram_resolves_connections():
+    diagram = parse_dia_file(SRC, stream=True)
+    line = diagram.objects['O5']
+    assert line.as_line.connected_from == diagram.objects['O0']
+    assert line.as_line.connected_to == diagram.objects['O3']
+
+def test_it_rejects_a_non_diagram_document():
+    with pytest.raises(AssertionError):
+        stream_diagram(io.BytesIO(b'<?xml version="1.0"?><other/>'))
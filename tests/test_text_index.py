@@ -0,0 +1,90 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import os
+import site
+site.addsitedir('src')
+
+from dia_parser import parse_dia_file, Diagram, DiagramData, Layer, Object, tokenize
+
+def make_text(obj_id, text):
+    return Object(
+        obj_id=obj_id,
+        attributes={
+            'text' : {
+                'string' : '#' + text + '#'
+            }
+        }
+    )
+
+def make_diagram():
+    objects = [
+        make_text('1', 'Start'),
+        make_text('2', 'Check order'),
+        make_text('3', 'check stock'),
+        make_text('4', 'Ship order'),
+        make_text('5', 'Start'),
+        Object(obj_id='6'),
+        Object(obj_id='7', attributes={'obj_pos' : (0, 0)}),
+    ]
+    return Diagram(DiagramData(), layers=[Layer(objects)]), objects
+
+def ids(objects):
+    return [obj.id for obj in objects]
+
+def test_it_finds_exact_text():
+    diagram, objects = make_diagram()
+
+    assert ids(diagram.text.exact('Start')) == ['1', '5']
+    assert diagram.text.exact('start') == []
+    assert ids(diagram.text.exact('start', ignore_case=True)) == ['1', '5']
+    assert len(diagram.text) == 5
+
+def test_it_finds_text_by_prefix():
+    diagram, objects = make_diagram()
+
+    assert ids(diagram.text.prefix('Check')) == ['2']
+    assert ids(diagram.text.prefix('check', ignore_case=True)) == ['2', '3']
+    assert ids(diagram.text.prefix('')) == ['1', '2', '3', '4', '5']
+    assert diagram.text.prefix('Zebra') == []
+
+def test_it_finds_text_by_words():
+    diagram, objects = make_diagram()
+
+    assert ids(diagram.text.word('ORDER')) == ['2', '4']
+    assert ids(diagram.text.search('order check')) == ['2']
+    assert diagram.text.search('order stock') == []
+    assert diagram.text.search('') == []
+    assert tokenize('Check  Order-2') == ['check', 'order', '2']
+
+def test_it_rebuilds_after_invalidate():
+    diagram, objects = make_diagram()
+    assert ids(diagram.text.exact('Start')) == ['1', '5']
+
+    objects[0].attributes['text']['string'] = '#Begin#'
+    diagram.text.invalidate()
+
+    assert ids(diagram.text.exact('Start')) == ['5']
+    assert ids(diagram.text.exact('Begin')) == ['1']
+
+def test_it_indexes_a_file():
+    diagram = parse_dia_file(os.path.join('tests', 'data', 'connections.dia'))
+
+    assert ids(diagram.text.prefix('Box has a line from')) == ['O0', 'O7', 'O20']
+    assert ids(diagram.text.exact('Some text here')) == ['O17']
+    assert ids(diagram.text.search('connected')) == ['O4', 'O5']
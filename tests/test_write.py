@@ -0,0 +1,237 @@
+#
+# dia_parser - A module for parsing dia diagram files
+# Copyright (C) 2020  Peter Rogers (peter.rogers@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import io
+import os
+import site
+site.addsitedir('src')
+site.addsitedir('benchmarks')
+
+import pytest
+
+from dia_parser import (
+    parse_dia_file,
+    write_dia_file,
+    iter_dia_xml,
+    encode_attribute_value,
+    is_gzip_data,
+    iter_xml_chunks,
+    ATTRIBUTE_DECODERS,
+    Diagram,
+    DiagramData,
+    Layer,
+    Group,
+    Object,
+    Connection,
+)
+from dia_parser.ns import NS
+from generate_diagram import iter_diagram_xml
+from xml.etree import ElementTree
+
+SRC = os.path.join('tests', 'data', 'Diagram1.dia')
+LINES = os.path.join('tests', 'data', 'lines.dia')
+
+def plain(attributes):
+    if attributes is None:
+        return None
+    return {
+        name : plain(value) if isinstance(value, dict) else value
+        for name, value in dict(attributes).items()
+    }
+
+def describe(node):
+    '''Returns a comparable description of a layer or group and everything in it'''
+
+    children = []
+    for child in node.children:
+        if isinstance(child, Group):
+            children.append(('group', plain(child.attributes), describe(child)))
+        else:
+            children.append((
+                child.obj_id,
+                child.obj_type,
+                child.version,
+                plain(child.attributes),
+                [(conn.handle, conn.to_id, str(conn.connection)) for conn in child.connections],
+            ))
+    return children
+
+def assert_equivalent(diagram, other):
+    assert plain(diagram.diagram_data.attributes) == plain(other.diagram_data.attributes)
+    assert len(diagram.layers) == len(other.layers)
+    for layer, other_layer in zip(diagram.layers, other.layers):
+        assert (layer.name, layer.visible, layer.connectable, layer.active) == \
+            (other_layer.name, other_layer.visible, other_layer.connectable, other_layer.active)
+        assert describe(layer) == describe(other_layer)
+
+def round_trip(diagram, **kwargs):
+    fp = io.BytesIO()
+    write_dia_file(diagram, fp, **kwargs)
+    return parse_dia_file(fp.getvalue())
+
+def test_it_round_trips_a_file():
+    diagram = parse_dia_file(SRC)
+    assert_equivalent(diagram, round_trip(diagram))
+    assert_equivalent(diagram, round_trip(diagram, compress=False))
+
+def value_nodes(data):
+    '''Maps each object ID to its attribute names and the (tag, decoded value)
+    of every value element under each, straight from the XML'''
+
+    root = ElementTree.fromstring(data)
+    result = {}
+    for obj in root.iter(NS + 'object'):
+        result[obj.attrib['id']] = {
+            attrib.attrib['name'] : [
+                (node.tag, ATTRIBUTE_DECODERS[node.tag](node)) for node in attrib
+            ]
+            for attrib in obj.findall(NS + 'attribute')
+        }
+    return result
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_it_writes_every_value_of_lines(lazy):
+    diagram = parse_dia_file(LINES, lazy=lazy)
+    fp = io.BytesIO()
+    write_dia_file(diagram, fp, compress=False)
+
+    expected = value_nodes(b''.join(iter_xml_chunks(LINES)))
+    assert value_nodes(fp.getvalue()) == expected
+    # The lines in the file really do have several points each
+    assert any(len(values.get('conn_endpoints', ())) == 2 for values in expected.values())
+    assert any(len(values.get('poly_points', ())) > 2 for values in expected.values())
+
+def test_it_round_trips_lazy_attributes():
+    diagram = parse_dia_file(SRC, lazy=True)
+    # Read some values, leaving the rest as XML
+    for obj in list(diagram.objects)[::2]:
+        obj.text
+    assert_equivalent(parse_dia_file(SRC), round_trip(diagram))
+
+def test_it_round_trips_generated_diagrams():
+    src = ''.join(iter_diagram_xml(
+        objects=30, line_density=2.0, group_depth=3, group_size=4, attributes='rich', layers=2
+    )).encode('utf-8')
+    diagram = parse_dia_file(src)
+    copy = round_trip(diagram)
+    assert_equivalent(diagram, copy)
+    assert [obj.id for obj in copy.objects] == [obj.id for obj in diagram.objects]
+    assert copy.link_report
+
+def test_it_compresses():
+    diagram = parse_dia_file(SRC)
+    compressed = io.BytesIO()
+    write_dia_file(diagram, compressed, level=9)
+    uncompressed = io.BytesIO()
+    write_dia_file(diagram, uncompressed, compress=False)
+    assert is_gzip_data(compressed.getvalue())
+    assert not is_gzip_data(uncompressed.getvalue())
+    assert len(compressed.getvalue()) < len(uncompressed.getvalue())
+
+def test_it_writes_to_a_path(tmp_path):
+    path = str(tmp_path / 'copy.dia')
+    diagram = parse_dia_file(SRC)
+    write_dia_file(diagram, path)
+    assert_equivalent(diagram, parse_dia_file(path))
+
+def test_it_writes_diagrams_built_in_code():
+    box1 = Object(obj_id='O0', obj_type='Flowchart - Box', version='0', attributes={
+        'obj_bb' : (1.0, 2.0, 3.5, 4.0),
+        'text' : {'string' : '#Start & <go>#', 'font' : ('sans', '0', 'Helvetica'), 'alignment' : 1},
+    })
+    box2 = Object(obj_id='O1', obj_type='Flowchart - Box', version='0', attributes={
+        'elem_corner' : (5.0, 6.0),
+        'inner_color' : '#ff0000ff',
+        'show_background' : True,
+        'numcp' : 3,
+        'bez_point' : ('curveto', (1.0, 2.0), (3.0, 4.0), None),
+        'image' : b'\x89PNG',
+        'empty' : None,
+    })
+    line = Object(
+        obj_id='O2',
+        obj_type='Standard - Line',
+        version='0',
+        attributes={'conn_endpoints' : [(2.0, 3.0), (4.0, 5.5)], 'corner_types' : []},
+        connections=[Connection(handle=0, to_id='O0', connection=8), Connection(handle=1, to_id='O1', connection=0)],
+    )
+    diagram = Diagram(
+        DiagramData({'background' : '#ffffffff'}),
+        [Layer([box1, Group([box2, line])], name='Background', visible=True, connectable=True, active=True)]
+    )
+
+    copy = round_trip(diagram)
+    assert_equivalent(diagram, copy)
+    assert copy.objects['O0'].text == 'Start & <go>'
+    assert copy.objects['O2'].as_line.connected_to is copy.objects['O1']
+    assert copy.objects['O2'].attributes['conn_endpoints'] == [(2.0, 3.0), (4.0, 5.5)]
+
+    xml = ''.join(iter_dia_xml(diagram))
+    assert '<dia:enum val="1"/>' in xml
+    assert '<dia:int val="3"/>' in xml
+    assert '<dia:composite type="text">' in xml
+    assert '<dia:color val="#ff0000ff"/>' in xml
+
+def test_it_writes_lists_of_composites():
+    operations = [
+        {
+            'name' : '#run#',
+            'visibility' : 0,
+            'parameters' : [{'name' : '#speed#', 'type' : '#int#'}, {'name' : '#limit#', 'type' : '#int#'}],
+        },
+        {
+            'name' : '#stop#',
+            'visibility' : 1,
+            'parameters' : [{'name' : '#force#', 'type' : '#bool#'}, {'name' : '#wait#', 'type' : '#bool#'}],
+        },
+    ]
+    uml = Object(obj_id='O0', obj_type='UML - Class', version='0', attributes={
+        'name' : '#Engine#',
+        'operations' : operations,
+        'line_style' : 1,
+    })
+    diagram = Diagram(DiagramData(), [Layer([uml], name='Background')])
+
+    copy = round_trip(diagram)
+    assert copy.objects['O0'].attributes['operations'] == operations
+
+    root = ElementTree.fromstring(''.join(iter_dia_xml(diagram)))
+    written = {
+        attrib.attrib['name'] : attrib
+        for attrib in next(root.iter(NS + 'object')).findall(NS + 'attribute')
+    }
+    assert [(node.tag, node.attrib['type']) for node in written['operations']] == \
+        [(NS + 'composite', 'umloperation')] * 2
+    for operation in written['operations']:
+        parameters = [attrib for attrib in operation if attrib.attrib['name'] == 'parameters']
+        assert [node.attrib['type'] for node in parameters[0]] == ['umlparameter'] * 2
+    assert written['line_style'][0].tag == NS + 'enum'
+
+def test_it_encodes_values():
+    assert encode_attribute_value('width', 1.0) == '<dia:real val="1"/>'
+    assert encode_attribute_value('width', 0.1) == '<dia:real val="0.1"/>'
+    assert encode_attribute_value('pos', (1.0, 2.5)) == '<dia:point val="1,2.5"/>'
+    assert encode_attribute_value('bb', (0, 1, 2, 3)) == '<dia:rectangle val="0,1;2,3"/>'
+    assert encode_attribute_value('flag', False) == '<dia:boolean val="false"/>'
+    with pytest.raises(TypeError):
+        encode_attribute_value('thing', object())
+
+def test_it_needs_object_ids():
+    diagram = Diagram(DiagramData(), [Layer([Object(obj_type='Flowchart - Box')])])
+    with pytest.raises(ValueError):
+        write_dia_file(diagram, io.BytesIO())